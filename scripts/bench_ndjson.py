@@ -0,0 +1,111 @@
+"""
+Microbenchmark for the transcript stream parse path.
+
+Compares the old line-by-line path (decode -> json.loads -> parse_obj) with
+NDJSONDecoder framing, with and without pydantic validation, and reports
+records/s and MB/s for each.
+
+    python scripts/bench_ndjson.py --records 20000 --turns 40 --chunk-size 65536
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# Make src/ importable without shadowing stdlib modules (src/queue).
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from api.models import Transcript  # noqa: E402
+from api.ndjson import JSON_BACKEND, NDJSONDecoder, validate_batch  # noqa: E402
+
+
+def make_payload(records: int, turns: int) -> bytes:
+    start = datetime(2025, 5, 1, tzinfo=timezone.utc)
+    lines = []
+    for i in range(records):
+        lines.append(json.dumps({
+            "transcript_id": f"t{i}",
+            "session_id": f"s{i // 3}",
+            "timestamp": start.isoformat(),
+            "agent_type": "customer_service",
+            "duration_seconds": 30 * turns,
+            "participants": {"agent": "Gandalf", "customer": "Frodo"},
+            "transcript_text": [
+                {
+                    "speaker": "agent" if t % 2 == 0 else "customer",
+                    "text": "One does not simply walk into Mordor without proper gear. " * 2,
+                    "timestamp": (start + timedelta(seconds=30 * t)).isoformat(),
+                }
+                for t in range(turns)
+            ],
+            "metadata": {
+                "questionnaire": {
+                    "purpose_of_visit_asked": True,
+                    "experience_assessed": i % 2 == 0,
+                    "risk_acknowledged": True,
+                    "gear_discussed": i % 3 == 0,
+                    "any_items_to_dispose_of_asked": False,
+                },
+                "visitor_interest_level": "high",
+                "potential_issue": "naive",
+                "mount_doom_permit_status": "pending",
+                "language": "en",
+            },
+        }))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def chunks(payload: bytes, size: int):
+    return [payload[i:i + size] for i in range(0, len(payload), size)]
+
+
+def line_by_line(parts, validate: bool) -> int:
+    # Mirrors the previous StreamReader iteration: re-split into lines, then decode + loads.
+    count = 0
+    for line in b"".join(parts).splitlines():
+        data = json.loads(line.decode())
+        if validate:
+            Transcript.parse_obj(data)
+        count += 1
+    return count
+
+
+def framed(parts, validate: bool) -> int:
+    decoder = NDJSONDecoder()
+    count = 0
+    for part in parts:
+        records = decoder.feed(part)
+        count += len(validate_batch(Transcript, records)) if validate else len(records)
+    return count + len(decoder.close())
+
+
+def run(name: str, fn, parts, validate: bool, size: int, repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = fn(parts, validate)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:<28} {count / best:>12,.0f} records/s {size / best / 1e6:>10.1f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payload = make_payload(args.records, args.turns)
+    parts = chunks(payload, args.chunk_size)
+    print(f"{args.records} records, {len(payload) / 1e6:.1f} MB, {len(parts)} chunks, backend={JSON_BACKEND}")
+    run("line-by-line decode", line_by_line, parts, False, len(payload), args.repeat)
+    run("ndjson decode", framed, parts, False, len(payload), args.repeat)
+    run("line-by-line decode+validate", line_by_line, parts, True, len(payload), args.repeat)
+    run("ndjson decode+validate", framed, parts, True, len(payload), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Microbenchmark for the in-memory transcript representation.
+
+Compares fully parsed pydantic Transcripts with LazyTranscripts (raw bytes
+plus validated header and metadata, turns parsed on first use): memory held
+per queued transcript, and CPU per transcript from stream bytes to the
+serialized raw_transcripts.data value, with and without a stage reading the turns.
+
+    python scripts/bench_transcript.py --records 5000 --turns 40
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+# Make src/ importable without shadowing stdlib modules (src/queue).
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+# storage.db builds its engine at import; an in-memory URL needs no server.
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from api.models import LazyTranscript, Transcript  # noqa: E402
+from api.ndjson import JSON_BACKEND, loads  # noqa: E402
+from bench_ndjson import make_payload  # noqa: E402
+from storage.db import _json_serializer  # noqa: E402
+
+
+def eager(line: bytes, read_turns: bool) -> str:
+    transcript = Transcript.parse_obj(loads(line))
+    if read_turns:
+        len(transcript.transcript_text)
+    return _json_serializer(transcript.dict())
+
+
+def lazy(line: bytes, read_turns: bool) -> str:
+    transcript = LazyTranscript.from_bytes(line)
+    if read_turns:
+        len(transcript.transcript_text)
+    return _json_serializer(transcript.raw)
+
+
+def held_bytes(build, lines) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # a fresh copy of each line, as the stream client makes, so a LazyTranscript is charged for its bytes
+    held = [build(bytes(bytearray(line))) for line in lines]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del held
+    return (after - before) / len(lines)
+
+
+def cpu_per_record(fn, lines, read_turns: bool, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        for line in lines:
+            fn(line, read_turns)
+        best = min(best, time.process_time() - started)
+    return best / len(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=5000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = make_payload(args.records, args.turns).splitlines()
+    print(f"{args.records} records, {sum(map(len, lines)) / len(lines):,.0f} bytes each, backend={JSON_BACKEND}")
+
+    eager_mem = held_bytes(lambda line: Transcript.parse_obj(loads(line)), lines)
+    lazy_mem = held_bytes(LazyTranscript.from_bytes, lines)
+    print(f"{'memory per queued transcript':<38} eager {eager_mem:>10,.0f} B   lazy {lazy_mem:>10,.0f} B")
+    for read_turns, label in ((False, "CPU bytes -> stored row"), (True, "CPU bytes -> turns read -> stored row")):
+        eager_cpu = cpu_per_record(eager, lines, read_turns, args.repeat)
+        lazy_cpu = cpu_per_record(lazy, lines, read_turns, args.repeat)
+        print(f"{label:<38} eager {eager_cpu * 1e6:>10,.1f} us  lazy {lazy_cpu * 1e6:>10,.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+End-to-end load test: runs ``app.main()`` against local fakes.
+
+A FakeTranscriptsAPI streams generated transcripts and records submissions,
+a FakeLLM answers completions with configurable latency, errors and 429s,
+and storage goes to a throwaway SQLite file (or ``--database-url``, e.g. a
+local Postgres). Reports sustained transcripts/s, p50/p95/p99 per-transcript
+latency (streamed until submitted) and peak RSS, and compares them with a
+stored baseline.
+
+    python scripts/loadtest.py --transcripts 2000 --llm-latency 0.2 --llm-throttle-rate 0.02
+    python scripts/loadtest.py --save-baseline     # record the current numbers
+    python scripts/loadtest.py --tolerance 0.15    # exit 1 on a >15% regression
+
+Peak RSS is the whole process, fakes included; compare it only with
+baselines recorded by this script.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import signal
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# Make src/ and the test fakes importable without shadowing stdlib modules.
+sys.path.append(os.path.join(ROOT, "src"))
+sys.path.append(os.path.join(ROOT, "tests"))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "loadtest_baseline.json")
+# Metric -> True if higher is better.
+COMPARED = {"throughput": True, "p50": False, "p95": False, "p99": False, "peak_rss_mb": False}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+async def run(args: argparse.Namespace) -> Dict[str, float]:
+    from aiohttp.test_utils import TestServer
+
+    import app
+    from fakes import FakeLLM, FakeTranscriptsAPI
+    from processing.llm import LLMClient
+    from processing.scheduler import llm_scheduler
+
+    logging.getLogger().setLevel(args.log_level)
+    rng = random.Random(args.seed)
+    api = FakeTranscriptsAPI(args.transcripts, turns=args.turns, rate=args.rate)
+    llm = FakeLLM(
+        latency=lambda: args.llm_latency * rng.uniform(0.5, 1.5),
+        error_rate=args.llm_error_rate,
+        throttle_rate=args.llm_throttle_rate,
+        max_concurrency=args.llm_max_concurrency,
+        seed=args.seed,
+    )
+    api_server = TestServer(api.app())
+    llm_server = TestServer(llm.app())
+    await api_server.start_server()
+    await llm_server.start_server()
+
+    app.BASE_URL = str(api_server.make_url(""))
+    llm_client = LLMClient(base_url=str(llm_server.make_url("")))
+    llm_scheduler.client = llm_client
+
+    main_task = asyncio.create_task(app.main())
+    done_task = asyncio.create_task(api.done.wait())
+    await asyncio.wait([main_task, done_task], timeout=args.timeout, return_when=asyncio.FIRST_COMPLETED)
+    if main_task.done():
+        done_task.cancel()
+        main_task.result()
+        raise RuntimeError("main() exited before the load test finished")
+    finished = done_task.done()
+    done_task.cancel()
+
+    # main() drains and returns on SIGTERM, exactly as in production
+    os.kill(os.getpid(), signal.SIGTERM)
+    await main_task
+    await llm_client.close()
+    await api_server.close()
+    await llm_server.close()
+
+    if not finished:
+        logging.warning(f"Timed out after {args.timeout}s with {len(api.submitted)}/{args.transcripts} submitted")
+    latencies = api.latencies()
+    if not latencies:
+        raise RuntimeError("No transcripts were submitted")
+    elapsed = max(api.submitted.values()) - min(api.emitted.values())
+    return {
+        "transcripts": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "peak_rss_mb": peak_rss_mb(),
+        "duplicates": api.duplicates,
+        "llm_requests": llm.requests,
+        "llm_throttled": llm.throttled,
+        "llm_errors": llm.errors,
+    }
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> List[str]:
+    """
+    Regressions of ``results`` against ``baseline`` beyond ``tolerance`` (a fraction).
+    """
+    regressions = []
+    for metric, higher_is_better in COMPARED.items():
+        old, new = baseline.get(metric), results.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=1000)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=0.0, help="stream rate in transcripts/s, 0 for unthrottled")
+    parser.add_argument("--llm-latency", type=float, default=0.1, help="mean fake LLM latency in seconds")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-throttle-rate", type=float, default=0.0)
+    parser.add_argument("--llm-max-concurrency", type=int, default=None)
+    parser.add_argument("--database-url", default=None, help="defaults to a temporary SQLite file")
+    parser.add_argument("--mode", choices=["combined", "separate"], default=None, help="PROCESSING_MODE")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # storage.db and app read these at import time
+    tmpdir: Optional[tempfile.TemporaryDirectory] = None
+    if args.database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite+aiosqlite:///{os.path.join(tmpdir.name, 'loadtest.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["METRICS_PORT"] = "0"
+    if args.mode:
+        os.environ["PROCESSING_MODE"] = args.mode
+
+    started = time.perf_counter()
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    print(f"{results['transcripts']} transcripts in {results['elapsed']:.1f}s (wall {time.perf_counter() - started:.1f}s)")
+    print(f"throughput   {results['throughput']:>10.1f} transcripts/s")
+    print(f"latency      p50 {results['p50']:.3f}s  p95 {results['p95']:.3f}s  p99 {results['p99']:.3f}s")
+    print(f"peak RSS     {results['peak_rss_mb']:>10.1f} MB")
+    print(
+        f"fake LLM     {results['llm_requests']} requests, {results['llm_throttled']} throttled, "
+        f"{results['llm_errors']} errors; {results['duplicates']} duplicate submissions"
+    )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({metric: results[metric] for metric in COMPARED}, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; record one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"Regressions beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    main()
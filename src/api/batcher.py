@@ -0,0 +1,171 @@
+"""
+Micro-batching of processed result submissions.
+"""
+import aiohttp
+import asyncio
+import logging
+from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_exception
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .client import APIClient, count_retry
+from .models import ProcessedResult
+
+logger = logging.getLogger(__name__)
+
+# Statuses meaning "this server has no batch endpoint"; we then post items individually.
+BATCH_UNSUPPORTED_STATUSES = {404, 405, 415, 501}
+# Statuses where one bad item may have sunk the batch; we retry items individually.
+BATCH_REJECTED_STATUSES = {400, 422}
+
+
+def _is_transient(error: BaseException) -> bool:
+    if isinstance(error, aiohttp.ClientResponseError):
+        if error.status == 429:
+            return True
+        return error.status >= 500 and error.status not in BATCH_UNSUPPORTED_STATUSES
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+class SubmissionBatcher:
+    """
+    Collects processed results and submits them to the API in micro-batches.
+
+    A batch is flushed when ``max_batch_size`` results are buffered or
+    ``max_delay`` seconds after the first result entered an empty buffer.
+    At most ``max_in_flight`` POSTs run at once and at most ``max_pending``
+    results may be buffered or in flight; ``submit`` waits beyond that.
+
+    ``submit`` returns a future resolving to the API response for that item,
+    or raising its final error once background retries are exhausted. Each
+    attempt holds an in-flight slot; the backoff before a retry holds none.
+    """
+
+    def __init__(
+        self,
+        client: APIClient,
+        max_batch_size: int = 50,
+        max_delay: float = 0.05,
+        max_in_flight: int = 8,
+        max_pending: int = 1000,
+        max_retries: int = 3,
+        use_batch_endpoint: bool = True,
+    ):
+        self.client = client
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.batch_supported = use_batch_endpoint
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._buffer: List[Tuple[ProcessedResult, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, result: ProcessedResult) -> asyncio.Future:
+        """
+        Queue a result for submission and return a future for its outcome.
+        """
+        await self._pending.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(lambda _: self._pending.release())
+        self._buffer.append((result, future))
+
+        if len(self._buffer) >= self.max_batch_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush_now)
+        return future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        task = asyncio.create_task(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        """
+        Send whatever is buffered and wait for all in-flight submissions to settle.
+        """
+        self._flush_now()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.flush()
+
+    async def _send(self, batch: List[Tuple[ProcessedResult, asyncio.Future]]) -> None:
+        if self.batch_supported and len(batch) > 1:
+            try:
+                results = [result for result, _ in batch]
+                response = await self._post("submit_batch", lambda: self.client.submit_processed_batch(results))
+                self._resolve_batch(batch, response)
+                return
+            except aiohttp.ClientResponseError as e:
+                if e.status in BATCH_UNSUPPORTED_STATUSES:
+                    logger.warning(f"Batch endpoint unavailable ({e.status}), falling back to single posts")
+                    self.batch_supported = False
+                elif e.status not in BATCH_REJECTED_STATUSES:
+                    self._fail_all(batch, e)
+                    return
+            except Exception as e:
+                self._fail_all(batch, e)
+                return
+
+        await asyncio.gather(*(self._send_one(result, future) for result, future in batch))
+
+    async def _post(self, operation: str, send: Callable[[], Awaitable[Any]]) -> Any:
+        # each attempt takes an in-flight slot; the backoff between attempts holds none
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries),
+            wait=wait_exponential(min=1, max=10),
+            retry=retry_if_exception(_is_transient),
+            before_sleep=count_retry(operation),
+            reraise=True,
+        ):
+            with attempt:
+                async with self._in_flight:
+                    return await send()
+
+    async def _send_one(self, result: ProcessedResult, future: asyncio.Future) -> None:
+        try:
+            response = await self._post("submit", lambda: self.client.post_processed(result))
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(response)
+
+    def _resolve_batch(self, batch: List[Tuple[ProcessedResult, asyncio.Future]], response: Any) -> None:
+        """
+        Map a batch response onto per-item futures.
+
+        The server may answer with ``{"results": [...]}`` or a bare list, whose
+        entries carry ``transcript_id`` and optionally ``error``; items without
+        an entry are considered accepted.
+        """
+        entries = response.get("results", []) if isinstance(response, dict) else response
+        by_id: Dict[str, Dict[str, Any]] = {}
+        if isinstance(entries, list):
+            by_id = {e["transcript_id"]: e for e in entries if isinstance(e, dict) and "transcript_id" in e}
+
+        for result, future in batch:
+            if future.done():
+                continue
+            entry = by_id.get(result.transcript_id, {})
+            if entry.get("error"):
+                future.set_exception(RuntimeError(f"Submission rejected for {result.transcript_id}: {entry['error']}"))
+            else:
+                future.set_result(entry or response)
+
+    @staticmethod
+    def _fail_all(batch: List[Tuple[ProcessedResult, asyncio.Future]], error: BaseException) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
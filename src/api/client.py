@@ -1,20 +1,48 @@
 import aiohttp
 import asyncio
-import json
 import logging
 from tenacity import AsyncRetrying, stop_after_attempt, wait_exponential, retry_if_exception_type
-from typing import AsyncGenerator, Dict, Any, Optional
+from typing import AsyncGenerator, Dict, Any, List, Optional
 
-from .models import Transcript, ProcessedResult
+from metrics.registry import Counter
+from metrics.tracing import tracer
+from .models import LazyTranscript, Transcript, ProcessedResult, RawRecord
+from .ndjson import NDJSONDecoder, validate_batch
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
+HTTP_RETRIES = Counter("api_http_retries", "Transcripts API requests retried after a transient failure", ["operation"])
+REAUTHENTICATIONS = Counter("api_reauthentications", "Bearer token refreshes after a 401")
+
+
+def count_retry(operation: str):
+    """
+    tenacity ``before_sleep`` hook counting retries of ``operation``.
+    """
+    child = HTTP_RETRIES.labels(operation)
+    return lambda retry_state: child.inc()
+
+
+def _lazy_transcripts(lines: list) -> List[LazyTranscript]:
+    parsed = []
+    for line in lines:
+        try:
+            # copy out of the network chunk so the chunk itself can be freed
+            parsed.append(LazyTranscript.from_bytes(bytes(line)))
+        except ValueError as e:
+            logger.error(f"Failed to parse Transcript: {e}")
+    return parsed
+
 
 class APIClient:
     """
     Asynchronous client for interacting with the Mordor transcripts API.
     Handles authentication, streaming transcripts, and submitting processed results.
+
+    A single pooled ``aiohttp.ClientSession`` is shared by every call so that
+    connections are kept alive and reused. Use the client as an async context
+    manager, or call ``close()`` when done.
     """
 
     def __init__(
@@ -23,6 +51,11 @@ class APIClient:
         base_url: str = "https://relaxing-needed-vulture.ngrok-free.app/api",
         max_retries: int = 3,
         timeout: int = 60,
+        stream_chunk_size: int = 64 * 1024,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 30,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
     ):
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
@@ -30,6 +63,46 @@ class APIClient:
         self.headers: Dict[str, str] = {"Content-Type": "application/json"}
         self.max_retries = max_retries
         self.timeout = timeout
+        self.stream_chunk_size = stream_chunk_size
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._auth_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "APIClient":
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the shared session, creating it (and its connection pool) on first use.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                limit_per_host=self.connection_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """
+        Close the shared session and release pooled connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def authenticate(self) -> None:
         """
@@ -38,45 +111,129 @@ class APIClient:
         auth_url = f"{self.base_url}/auth"
         payload = {"api_key": self.api_key}
 
-        for attempt in AsyncRetrying(
+        async for attempt in AsyncRetrying(
             stop=stop_after_attempt(self.max_retries),
             wait=wait_exponential(min=1, max=10),
             retry=retry_if_exception_type(aiohttp.ClientError),
+            before_sleep=count_retry("auth"),
+            reraise=True,
         ):
             with attempt:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                    async with session.post(auth_url, json=payload) as resp:
-                        resp.raise_for_status()
-                        data = await resp.json()
-                        self.token = data.get("token")
-                        if not self.token:
-                            raise RuntimeError("Authentication succeeded but token missing in response")
-                        self.headers["Authorization"] = f"Bearer {self.token}"
-                        logger.info("Authentication succeeded")
-                        return
+                async with self._get_session().post(auth_url, json=payload) as resp:
+                    resp.raise_for_status()
+                    data = await resp.json()
+                    self.token = data.get("token")
+                    if not self.token:
+                        raise RuntimeError("Authentication succeeded but token missing in response")
+                    self.headers["Authorization"] = f"Bearer {self.token}"
+                    logger.info("Authentication succeeded")
+                    return
 
         raise RuntimeError("Failed to authenticate after retries")
 
-    async def stream_transcripts(self) -> AsyncGenerator[Transcript, None]:
+    async def _reauthenticate(self, stale_token: Optional[str]) -> None:
+        """
+        Refresh the bearer token after a 401, unless another caller already did.
+        """
+        async with self._auth_lock:
+            if self.token != stale_token:
+                return
+            logger.info("Token rejected, re-authenticating")
+            REAUTHENTICATIONS.inc()
+            await self.authenticate()
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> Any:
+        """
+        Send an authenticated request on the shared session and return the JSON body.
+        A 401 response triggers a single token refresh and replay of the request.
+        """
+        if not self.token:
+            raise RuntimeError("Client not authenticated. Call authenticate() first.")
+
+        session = self._get_session()
+        with tracer.span("api.request", method=method, url=url) as span:
+            for refreshed in (False, True):
+                token = self.token
+                async with session.request(method, url, headers=self.headers, **kwargs) as resp:
+                    if span is not None:
+                        span.set(status=resp.status)
+                    if resp.status == 401 and not refreshed:
+                        await self._reauthenticate(token)
+                        continue
+                    resp.raise_for_status()
+                    return await resp.json()
+
+    async def _stream_chunks(
+        self, params: Optional[Dict[str, str]] = None
+    ) -> AsyncGenerator[bytes, None]:
         """
-        Connect to the streaming endpoint and yield Transcript objects line by line.
+        Open the streaming endpoint and yield raw body chunks.
         """
         if not self.token:
             raise RuntimeError("Client not authenticated. Call authenticate() first.")
 
         url = f"{self.base_url}/v1/transcripts/stream"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None)) as session:
-            async with session.get(url, headers=self.headers) as resp:
+        session = self._get_session()
+        for refreshed in (False, True):
+            token = self.token
+            async with session.get(
+                url, headers=self.headers, params=params, timeout=aiohttp.ClientTimeout(total=None)
+            ) as resp:
+                if resp.status == 401 and not refreshed:
+                    await self._reauthenticate(token)
+                    continue
                 resp.raise_for_status()
-                async for raw in resp.content:
-                    if not raw:
-                        continue
-                    try:
-                        data = json.loads(raw.decode())
-                        yield Transcript.parse_obj(data)
-                    except (json.JSONDecodeError, ValueError) as e:
-                        logger.error(f"Failed to parse transcript: {e}")
-                        continue
+                async for chunk in resp.content.iter_chunked(self.stream_chunk_size):
+                    yield chunk
+                return
+
+    async def stream_transcripts(
+        self, params: Optional[Dict[str, str]] = None
+    ) -> AsyncGenerator[Transcript, None]:
+        """
+        Connect to the streaming endpoint and yield Transcript objects as they arrive.
+        The body is framed with NDJSONDecoder, so records may be of any size,
+        and all records completed by one network chunk are validated together.
+        ``params`` are passed as query parameters, e.g. a resume position.
+        """
+        decoder = NDJSONDecoder()
+        async for chunk in self._stream_chunks(params):
+            for transcript in validate_batch(Transcript, decoder.feed(chunk)):
+                yield transcript
+        for transcript in validate_batch(Transcript, decoder.close()):
+            yield transcript
+
+    async def stream_raw(
+        self, params: Optional[Dict[str, str]] = None
+    ) -> AsyncGenerator[RawRecord, None]:
+        """
+        Like stream_transcripts, but skip model validation: yield each record's
+        original bytes with just the fields needed to route and checkpoint it.
+        """
+        decoder = NDJSONDecoder()
+        async for chunk in self._stream_chunks(params):
+            for line in decoder.frame(chunk):
+                record = RawRecord.from_bytes(bytes(line))
+                if record is not None:
+                    yield record
+        for line in decoder.frame_close():
+            record = RawRecord.from_bytes(bytes(line))
+            if record is not None:
+                yield record
+
+    async def stream_lazy(
+        self, params: Optional[Dict[str, str]] = None
+    ) -> AsyncGenerator[LazyTranscript, None]:
+        """
+        Like stream_transcripts, but yield LazyTranscripts that keep each
+        record's original bytes and validate its turns only when first used.
+        """
+        decoder = NDJSONDecoder()
+        async for chunk in self._stream_chunks(params):
+            for transcript in _lazy_transcripts(decoder.frame(chunk)):
+                yield transcript
+        for transcript in _lazy_transcripts(decoder.frame_close()):
+            yield transcript
 
     async def submit_processed(
         self, result: ProcessedResult
@@ -84,41 +241,54 @@ class APIClient:
         """
         Submit a processed result JSON back to the API, with retries on transient failures.
         """
-        if not self.token:
-            raise RuntimeError("Client not authenticated. Call authenticate() first.")
-
-        url = f"{self.base_url}/v1/transcripts/process"
-        payload = result.dict()
-
-        for attempt in AsyncRetrying(
+        async for attempt in AsyncRetrying(
             stop=stop_after_attempt(self.max_retries),
             wait=wait_exponential(min=1, max=10),
             retry=retry_if_exception_type(aiohttp.ClientError),
+            before_sleep=count_retry("submit"),
+            reraise=True,
         ):
             with attempt:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-                    async with session.post(url, headers=self.headers, json=payload) as resp:
-                        resp.raise_for_status()
-                        response_data = await resp.json()
-                        logger.info(f"Submitted result for {result.transcript_id}")
-                        return response_data
+                return await self.post_processed(result)
 
         raise RuntimeError(f"Failed to submit result for {result.transcript_id} after retries")
 
+    async def post_processed(self, result: ProcessedResult) -> Dict[str, Any]:
+        """
+        Submit one processed result in a single attempt.
+        No retries here; callers such as SubmissionBatcher own the retry policy.
+        """
+        url = f"{self.base_url}/v1/transcripts/process"
+        response_data = await self._request("POST", url, data=result.json())
+        logger.info(f"Submitted result for {result.transcript_id}")
+        return response_data
+
+    async def submit_processed_batch(
+        self, results: List[ProcessedResult]
+    ) -> Any:
+        """
+        Submit several processed results in one request body (a JSON array).
+        No retries here; callers such as SubmissionBatcher own the retry policy.
+
+        The batch endpoint, ``POST /v1/transcripts/process/batch``, is not part
+        of the documented API and is assumed to exist. A server without it
+        answers 404/405/415/501, and SubmissionBatcher then falls back to
+        ``post_processed`` for every item.
+        """
+        url = f"{self.base_url}/v1/transcripts/process/batch"
+        payload = "[" + ",".join(result.json() for result in results) + "]"
+        response_data = await self._request("POST", url, data=payload)
+        logger.info(f"Submitted batch of {len(results)} results")
+        return response_data
+
     async def get_stats(self) -> Dict[str, Any]:
         """
         Fetch processing statistics from the API.
         """
-        if not self.token:
-            raise RuntimeError("Client not authenticated. Call authenticate() first.")
-
         url = f"{self.base_url}/v1/stats"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
-            async with session.get(url, headers=self.headers) as resp:
-                resp.raise_for_status()
-                data = await resp.json()
-                logger.info("Fetched stats")
-                return data
+        data = await self._request("GET", url)
+        logger.info("Fetched stats")
+        return data
 
     async def health_check(self) -> bool:
         """
@@ -126,8 +296,7 @@ class APIClient:
         """
         url = f"{self.base_url}/v1/health"
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10)) as session:
-                async with session.get(url) as resp:
-                    return resp.status == 200
-        except aiohttp.ClientError:
+            async with self._get_session().get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                return resp.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             return False
@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field, validator
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class TranscriptTurn(BaseModel):
@@ -25,17 +28,20 @@ class Metadata(BaseModel):
     language: str
 
 
-class Transcript(BaseModel):
+class TranscriptHeader(BaseModel):
     transcript_id: str
     session_id: str
     timestamp: datetime
     agent_type: str
     duration_seconds: int
     participants: Dict[str, str]
-    transcript_text: List[TranscriptTurn]
     metadata: Metadata
 
 
+class Transcript(TranscriptHeader):
+    transcript_text: List[TranscriptTurn]
+
+
 class VisitorDetails(BaseModel):
     ring_bearer: bool
     gear_prepared: bool
@@ -82,3 +88,102 @@ class ProcessedResult(BaseModel):
         if not (0.0 <= v.sentiment <= 1.0):
             raise ValueError("Sentiment must be between 0 and 1")
         return v
+
+
+class RawRecord:
+    """
+    An unvalidated stream record: the original NDJSON bytes plus the fields
+    needed to route and checkpoint it. ``to_transcript`` runs full validation.
+    """
+    __slots__ = ("data", "transcript_id", "session_id", "timestamp")
+
+    def __init__(self, data: bytes, transcript_id: str, session_id: str, timestamp: datetime):
+        self.data = data
+        self.transcript_id = transcript_id
+        self.session_id = session_id
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Optional["RawRecord"]:
+        """
+        Decode just enough of ``data`` to build a RawRecord; None if it is malformed.
+        """
+        from .ndjson import loads
+
+        try:
+            obj = loads(data)
+            return cls(data, str(obj["transcript_id"]), str(obj["session_id"]), datetime.fromisoformat(obj["timestamp"]))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Failed to parse stream record: {e}")
+            return None
+
+    def to_transcript(self) -> Transcript:
+        from .ndjson import loads
+
+        return Transcript.parse_obj(loads(self.data))
+
+
+class LazyTranscript:
+    """
+    A transcript backed by its original NDJSON bytes.
+
+    The header fields and metadata are validated up front; turns are decoded
+    from ``raw`` and validated on first access to ``transcript_text``, so a
+    queued transcript holds its compact bytes instead of a tree of turn
+    objects. ``raw`` is what gets stored in ``raw_transcripts.data``.
+    """
+    __slots__ = (
+        "raw", "transcript_id", "session_id", "timestamp", "agent_type",
+        "duration_seconds", "participants", "metadata", "_turns",
+    )
+
+    def __init__(self, raw: bytes, header: TranscriptHeader):
+        self.raw = raw
+        self.transcript_id = header.transcript_id
+        self.session_id = header.session_id
+        self.timestamp = header.timestamp
+        self.agent_type = header.agent_type
+        self.duration_seconds = header.duration_seconds
+        self.participants = header.participants
+        self.metadata = header.metadata
+        self._turns: Optional[List[TranscriptTurn]] = None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LazyTranscript":
+        """
+        Validate everything but the turns of ``data``; raises ValueError if it is invalid.
+        """
+        from .ndjson import loads
+
+        try:
+            obj = loads(data)
+        except ValueError as e:
+            raise ValueError(f"Malformed transcript record: {e}") from e
+        if not isinstance(obj, dict):
+            raise ValueError("Transcript record is not a JSON object")
+        if not isinstance(obj.pop("transcript_text", None), list):
+            raise ValueError("Transcript record has no transcript_text list")
+        return cls(data, TranscriptHeader.parse_obj(obj))
+
+    @property
+    def transcript_text(self) -> List[TranscriptTurn]:
+        if self._turns is None:
+            from .ndjson import loads
+
+            self._turns = [TranscriptTurn.parse_obj(turn) for turn in loads(self.raw)["transcript_text"]]
+        return self._turns
+
+    def to_transcript(self) -> Transcript:
+        return Transcript(
+            transcript_id=self.transcript_id,
+            session_id=self.session_id,
+            timestamp=self.timestamp,
+            agent_type=self.agent_type,
+            duration_seconds=self.duration_seconds,
+            participants=self.participants,
+            metadata=self.metadata,
+            transcript_text=self.transcript_text,
+        )
+
+    def dict(self) -> Dict[str, Any]:
+        return self.to_transcript().dict()
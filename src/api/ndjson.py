@@ -0,0 +1,149 @@
+"""
+Incremental NDJSON framing and decoding for the transcript stream.
+"""
+import json
+import logging
+from typing import Any, Iterable, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+    _JSON_ERRORS: tuple = (orjson.JSONDecodeError,)
+
+    def loads(data) -> Any:
+        # orjson reads bytes/bytearray/memoryview directly, no intermediate str
+        return orjson.loads(data)
+
+except ImportError:  # pragma: no cover - depends on installed extras
+    JSON_BACKEND = "json"
+    _JSON_ERRORS = (json.JSONDecodeError, UnicodeDecodeError)
+
+    def loads(data) -> Any:
+        return json.loads(bytes(data))
+
+
+# what bytes.strip() removes
+_WHITESPACE = frozenset(b" \t\n\r\x0b\x0c")
+
+
+class NDJSONDecoder:
+    """
+    Splits a byte stream into newline-delimited JSON records.
+
+    Chunks can be of any size and records may span any number of chunks;
+    there is no per-line length limit unless ``max_record_size`` is set, in
+    which case oversized records are dropped. Records that fail to decode are
+    logged, counted in ``errors`` and skipped.
+    """
+
+    def __init__(self, max_record_size: Optional[int] = None):
+        self.max_record_size = max_record_size
+        self.errors = 0
+        self.records = 0
+        self.bytes = 0
+        self._partial: List[bytes] = []
+        self._partial_size = 0
+        self._discarding = False
+
+    def frame(self, chunk: bytes) -> list:
+        """
+        Consume a chunk and return the raw buffers of every record it completed.
+
+        Records lying entirely inside ``chunk`` are returned as memoryview
+        slices of it, without copying; only records spanning chunks are joined.
+        Lines holding only whitespace are skipped.
+        """
+        self.bytes += len(chunk)
+        out: list = []
+        view = memoryview(chunk)
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                break
+            if self._partial:
+                self._partial.append(chunk[start:end])
+                record = b"".join(self._partial)
+                self._partial.clear()
+                self._partial_size = 0
+                if not self._discarding:
+                    self._append(record, out)
+            elif not self._discarding:
+                self._append(view[start:end], out)
+            self._discarding = False
+            start = end + 1
+
+        if start < len(chunk) and not self._discarding:
+            self._partial.append(chunk[start:])
+            self._partial_size += len(chunk) - start
+            if self.max_record_size is not None and self._partial_size > self.max_record_size:
+                logger.error(f"Dropping NDJSON record larger than {self.max_record_size} bytes")
+                self.errors += 1
+                self._partial.clear()
+                self._partial_size = 0
+                self._discarding = True
+        return out
+
+    def frame_close(self) -> list:
+        """
+        Return a trailing record that was not newline-terminated.
+        """
+        out: list = []
+        if self._partial and not self._discarding:
+            self._append(b"".join(self._partial), out)
+        self._partial.clear()
+        self._partial_size = 0
+        self._discarding = False
+        return out
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Consume a chunk and return every record it completed, decoded.
+        """
+        return self._decode_all(self.frame(chunk))
+
+    def close(self) -> List[Any]:
+        """
+        Flush and decode a trailing record that was not newline-terminated.
+        """
+        return self._decode_all(self.frame_close())
+
+    def _append(self, line, out: list) -> None:
+        # only a line starting with whitespace can be blank, so records are not copied to check
+        if (not line or line[0] in _WHITESPACE) and not bytes(line).strip():
+            return
+        if self.max_record_size is not None and len(line) > self.max_record_size:
+            logger.error(f"Dropping NDJSON record larger than {self.max_record_size} bytes")
+            self.errors += 1
+            return
+        out.append(line)
+
+    def _decode_all(self, lines: list) -> List[Any]:
+        out: List[Any] = []
+        for line in lines:
+            try:
+                out.append(loads(line))
+            except _JSON_ERRORS as e:
+                self.errors += 1
+                logger.error(f"Failed to decode NDJSON record: {e}")
+        self.records += len(out)
+        return out
+
+
+def validate_batch(model: Type[BaseModel], records: Iterable[Any]) -> List[BaseModel]:
+    """
+    Validate a batch of decoded records, skipping (and logging) invalid ones.
+    """
+    parsed = []
+    parse_obj = model.parse_obj
+    for record in records:
+        try:
+            parsed.append(parse_obj(record))
+        except (ValidationError, TypeError, ValueError) as e:
+            logger.error(f"Failed to parse {model.__name__}: {e}")
+    return parsed
@@ -0,0 +1,166 @@
+"""
+Resumable transcript stream with reconnects, checkpoints and dedupe.
+"""
+import aiohttp
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics.registry import Counter
+from .client import APIClient
+
+logger = logging.getLogger(__name__)
+
+STREAM_RECONNECTS = Counter("stream_reconnects", "Transcript stream reconnects")
+STREAM_SKIPPED = Counter("stream_skipped", "Streamed transcripts skipped as already processed")
+
+Checkpoint = Tuple[str, datetime]
+
+
+class ResumableStream:
+    """
+    Wraps ``APIClient.stream_transcripts`` so that ingest survives dropped connections.
+
+    On start the stream resumes from the persisted checkpoint, and on a
+    reconnect from the newest transcript received so far, by sending
+    ``since`` (that timestamp minus ``resume_overlap`` seconds, which covers
+    timestamps arriving slightly out of order). Anything already processed
+    or queued is dropped by ``seen`` before it reaches the work queue, so
+    replays cost no LLM calls.
+
+    With ``acknowledge``, every yielded transcript stays outstanding until
+    ``done`` is called for it (once it is durable), and the checkpoint is the
+    oldest outstanding transcript: after a crash, ingest resumes from the
+    first transcript that was received but not yet persisted. Without it the
+    checkpoint is the newest transcript received.
+
+    Reconnects use exponential backoff with full jitter. The checkpoint is
+    written at most every ``checkpoint_interval`` seconds and on exit.
+
+    ``source`` defaults to ``client.stream_transcripts``; any callable taking
+    the resume params and yielding items with ``transcript_id`` and
+    ``timestamp`` (e.g. ``client.stream_raw``) works.
+    """
+
+    def __init__(
+        self,
+        client: APIClient,
+        load_checkpoint: Callable[[], Awaitable[Optional[Checkpoint]]],
+        save_checkpoint: Callable[[str, datetime], Awaitable[None]],
+        seen: Optional[Callable[[str], Awaitable[bool]]] = None,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        checkpoint_interval: float = 5.0,
+        resume_overlap: float = 5.0,
+        source: Optional[Callable[[Optional[dict]], AsyncIterator[Any]]] = None,
+        acknowledge: bool = False,
+    ):
+        self.client = client
+        self.source = source or client.stream_transcripts
+        self.load_checkpoint = load_checkpoint
+        self.save_checkpoint = save_checkpoint
+        self.seen = seen
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.checkpoint_interval = checkpoint_interval
+        self.resume_overlap = resume_overlap
+        self.acknowledge = acknowledge
+        self.position: Optional[Checkpoint] = None
+        self.reconnects = 0
+        self.skipped = 0
+        self._saved_position: Optional[Checkpoint] = None
+        self._last_save = 0.0
+        # yielded and not yet durable, when acknowledging
+        self._outstanding: Dict[str, datetime] = {}
+
+    def _resume_params(self):
+        if self.position is None:
+            return None
+        since = self.position[1] - timedelta(seconds=self.resume_overlap)
+        return {"since": since.isoformat()}
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.min_backoff * 2 ** attempt))
+
+    async def transcripts(self) -> AsyncGenerator[Any, None]:
+        """
+        Yield new transcripts forever, reconnecting whenever the stream ends or fails.
+        """
+        self.position = await self.load_checkpoint()
+        if self.position:
+            logger.info(f"Resuming stream after {self.position[0]} ({self.position[1].isoformat()})")
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    async for transcript in self.source(self._resume_params()):
+                        attempt = 0
+                        self._advance(transcript)
+                        if self.seen is not None and await self.seen(transcript.transcript_id):
+                            self.skipped += 1
+                            STREAM_SKIPPED.inc()
+                            logger.debug(f"Skipping already processed {transcript.transcript_id}")
+                            continue
+                        if self.acknowledge:
+                            self._outstanding[transcript.transcript_id] = self._timestamp(transcript)
+                        yield transcript
+                        await self._maybe_checkpoint()
+                    logger.warning("Transcript stream ended, reconnecting")
+                except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                    logger.warning(f"Transcript stream failed: {e!r}, reconnecting")
+
+                delay = self._backoff(attempt)
+                attempt += 1
+                self.reconnects += 1
+                STREAM_RECONNECTS.inc()
+                await asyncio.sleep(delay)
+        finally:
+            await self._maybe_checkpoint(force=True)
+
+    async def close(self) -> None:
+        """
+        Persist the checkpoint as it stands, e.g. once the pipeline has drained after the stream stopped.
+        """
+        await self._maybe_checkpoint(force=True)
+
+    def done(self, transcript_id: str) -> None:
+        """
+        Acknowledge a yielded transcript as durable, letting the checkpoint move past it.
+        """
+        self._outstanding.pop(transcript_id, None)
+
+    @staticmethod
+    def _timestamp(transcript: Any) -> datetime:
+        ts = transcript.timestamp
+        return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+    def _advance(self, transcript: Any) -> None:
+        ts = self._timestamp(transcript)
+        if self.position is None or ts >= self.position[1]:
+            self.position = (transcript.transcript_id, ts)
+
+    def checkpoint(self) -> Optional[Checkpoint]:
+        """
+        Where a restarted process should resume: the oldest outstanding transcript, else the newest received.
+        """
+        if self._outstanding:
+            return min(self._outstanding.items(), key=lambda item: item[1])
+        return self.position
+
+    async def _maybe_checkpoint(self, force: bool = False) -> None:
+        position = self.checkpoint()
+        if position is None or position == self._saved_position:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_save < self.checkpoint_interval:
+            return
+        self._last_save = now
+        try:
+            await self.save_checkpoint(*position)
+            self._saved_position = position
+        except Exception:
+            logger.exception("Failed to persist stream checkpoint")
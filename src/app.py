@@ -3,18 +3,37 @@
 Main application wiring together ingestion, processing, storage, and submission.
 """
 import asyncio
+import functools
+import os
 import signal
 import logging
-from datetime import datetime, timezone
-from typing import Optional
+from contextlib import aclosing
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
 
+from api.batcher import SubmissionBatcher
 from api.client import APIClient
-from api.models import Transcript
-from queue.queue import AsyncQueue
-from processing.summarizer import summarize_transcript
-from processing.extractor import extract_structured_data
+from api.models import LazyTranscript, Transcript, ProcessedResult, StructuredData, Analysis
+from api.stream import ResumableStream
+from metrics.registry import Counter, Gauge
+from metrics.loop import LoopMonitor
+from metrics.server import start_metrics_server
+from metrics.tracing import tracer
+from workqueue.queue import AsyncQueue
+from pipeline.autoscaler import Autoscaler, ScalingPolicy
+from pipeline.executor import Pipeline, Stage
+from pipeline.redrive import LeaseKeeper, RedrivePolicy, RedriveScheduler
 from processing.analyzer import analyze_transcript
-from storage.db import save_raw_transcript, save_processed_result, init_db
+from processing.cache import llm_cache
+from processing.combined import process_transcript
+from processing.extractor import extract_structured_data
+from processing.scheduler import llm_scheduler
+from processing.sessions import session_store
+from processing.summarizer import summarize_transcript
+from storage import db
+from storage.db import init_db, load_checkpoint, save_checkpoint
+from storage.dedupe import SeenFilter
+from storage.writer import BatchWriter
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -24,71 +43,493 @@ API_KEY = "candidate-api-key-587e61ac"
 BASE_URL = "https://relaxing-needed-vulture.ngrok-free.app/api"
 CONCURRENCY = 20
 QUEUE_MAXSIZE = 1000
+# Memory budget for queued transcripts; the stream pauses at the high
+# watermark and resumes once consumers drain below the low one.
+QUEUE_MAX_BYTES = int(os.getenv("QUEUE_MAX_BYTES", str(64 * 1024 * 1024)))
+QUEUE_LOW_WATERMARK = int(QUEUE_MAX_BYTES * 0.75)
+# Lower is served first; a flagged potential issue moves a transcript up one level.
+INTEREST_PRIORITY = {"high": 0, "medium": 1, "low": 2}
+# Each priority level delays a transcript at most this long behind newer arrivals.
+PRIORITY_AGING = 30.0
+HTTP_POOL_LIMIT = 100
+HTTP_POOL_LIMIT_PER_HOST = CONCURRENCY + 10
+SUBMIT_BATCH_SIZE = 50
+SUBMIT_BATCH_DELAY = 0.05
+SUBMIT_MAX_IN_FLIGHT = 8
+DB_FLUSH_INTERVAL = 0.05
+DB_BATCH_SIZE = 500
+STREAM_CHECKPOINT = "transcripts"
+DEDUPE_CAPACITY = 1_000_000
+# "combined" gets summary, analysis and visitor details from one LLM call;
+# "separate" always uses the summarize + analyze calls.
+PROCESSING_MODE = os.getenv("PROCESSING_MODE", "combined")
+# Per-stage capacity: LLM, DB and submission stages scale independently.
+LLM_STAGE_CONCURRENCY = CONCURRENCY
+DB_STAGE_CONCURRENCY = 8
+SUBMIT_STAGE_CONCURRENCY = 200
+# Stage worker pools are resized from load within these bounds every
+# AUTOSCALE_INTERVAL seconds (0 keeps the sizes above fixed). LLM stages never
+# outgrow the scheduler's current concurrency limit and stop growing while an
+# item takes longer than the ceiling.
+AUTOSCALE_INTERVAL = float(os.getenv("AUTOSCALE_INTERVAL", "5"))
+LLM_STAGE_MIN_CONCURRENCY = 4
+LLM_STAGE_MAX_CONCURRENCY = int(os.getenv("LLM_STAGE_MAX_CONCURRENCY", "64"))
+LLM_STAGE_LATENCY_CEILING = 30.0
+DB_STAGE_MIN_CONCURRENCY = 2
+DB_STAGE_MAX_CONCURRENCY = 32
+SUBMIT_STAGE_MIN_CONCURRENCY = 50
+SUBMIT_STAGE_MAX_CONCURRENCY = 1000
+STAGE_QUEUE_SIZE = 100
+STATS_LOG_INTERVAL = 60
+# Prometheus /metrics endpoint; 0 disables it.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8000"))
+# Event-loop lag sampling; a loop blocked this long past a sample logs the blocking stack.
+LOOP_LAG_INTERVAL = 0.25
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))
+# Failed transcripts are retried from their first incomplete stage.
+REDRIVE_BASE_DELAY = 30
+REDRIVE_MAX_DELAY = 3600
+REDRIVE_MAX_ATTEMPTS = 5
+REDRIVE_INTERVAL = 5
+REDRIVE_BATCH_SIZE = 100
+# Progress records of transcripts still in the pipeline (persisted, or claimed
+# for redrive) are renewed every third of this, so a record only falls due
+# once the process working on it has died.
+PROGRESS_LEASE = 120
+
+redrive_policy = RedrivePolicy(REDRIVE_BASE_DELAY, REDRIVE_MAX_DELAY, REDRIVE_MAX_ATTEMPTS)
 
-async def worker(name: int, client: APIClient, work_q: AsyncQueue, dlq: AsyncQueue) -> None:
+TRANSCRIPTS_INGESTED = Counter("transcripts_ingested", "Transcripts received from the stream and queued for processing")
+TRANSCRIPTS_FINISHED = Counter("transcripts_finished", "Transcripts leaving the pipeline, by outcome", ["outcome"])
+QUEUE_DEPTH = Gauge("queue_depth", "Items waiting in application queues", ["queue"])
+QUEUE_BYTES = Gauge("queue_bytes", "Estimated bytes held by application queues", ["queue"])
+QUEUE_PAUSED = Gauge("queue_paused", "1 while a queue is above its high watermark", ["queue"])
+QUEUE_WAIT_P95 = Gauge("queue_wait_p95_seconds", "p95 time items waited in a queue (recent items)", ["queue"])
+
+def transcript_priority(transcript: Optional[Transcript]) -> float:
+    if transcript is None:
+        # the shutdown sentinel goes behind everything already queued
+        return float("inf")
+    md = transcript.metadata
+    priority = INTEREST_PRIORITY.get(md.visitor_interest_level.lower(), 1)
+    if md.potential_issue and md.potential_issue.lower() not in ("none", "n/a"):
+        priority -= 1
+    return max(0, priority)
+
+def transcript_size(transcript: Optional[Transcript]) -> int:
     """
-    Worker task: pull Transcript, process, store, and submit result.
+    Rough in-memory footprint: the raw bytes of a LazyTranscript, or turn
+    text plus a per-turn overhead for a parsed one, plus a fixed per-transcript overhead.
     """
-    while True:
-        transcript: Optional[Transcript] = await work_q.get()
-        if transcript is None:
-            work_q.task_done()
-            break
+    if transcript is None:
+        return 0
+    if isinstance(transcript, LazyTranscript):
+        return 2048 + len(transcript.raw)
+    return 2048 + sum(len(turn.text) + 256 for turn in transcript.transcript_text)
+
+def _raw_payload(transcript: Transcript) -> Any:
+    """
+    What BatchWriter.save_raw stores: a LazyTranscript's original bytes as-is, otherwise the model dict.
+    """
+    return transcript if isinstance(transcript, LazyTranscript) else transcript.dict()
+
+def export_queue_metrics(name: str, queue: AsyncQueue) -> None:
+    QUEUE_DEPTH.labels(name).set_function(queue.qsize)
+    QUEUE_BYTES.labels(name).set_function(lambda: queue.bytes)
+    QUEUE_PAUSED.labels(name).set_function(lambda: int(queue.paused))
+    QUEUE_WAIT_P95.labels(name).set_function(lambda: queue.stats()["p95_wait"])
+
+async def _load_stream_checkpoint():
+    row = await load_checkpoint(STREAM_CHECKPOINT)
+    if row is None:
+        return None
+    return row.transcript_id, row.timestamp.replace(tzinfo=timezone.utc)
+
+def _resumed(ctx: Dict[str, Any], *flags: str) -> bool:
+    progress = ctx.get("progress") or {}
+    return all(progress.get(flag) for flag in flags)
+
+def _outputs(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LLM outputs produced so far, merged over those of earlier attempts.
+    """
+    outputs = dict((ctx.get("progress") or {}).get("outputs") or {})
+    if "process" in ctx:
+        summary, structured, analysis = ctx["process"]
+        outputs.update(summary=summary, structured_data=structured.dict(), analysis=analysis.dict())
+    if "summarize" in ctx:
+        outputs["summary"] = ctx["summarize"]
+    if "analyze" in ctx:
+        outputs["analysis"] = ctx["analyze"].dict()
+    return outputs
+
+def _progress(ctx: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    """
+    Progress record for the item in ``ctx``: a stage counts as done if it ran
+    in this attempt or an earlier one.
+    """
+    transcript = ctx["transcript"]
+    previous = ctx.get("progress") or {}
+
+    def done(flag: str, *stages: str) -> bool:
+        return bool(previous.get(flag)) or any(stage in ctx for stage in stages)
+
+    record = {
+        "transcript_id": transcript.transcript_id,
+        "session_id": transcript.session_id,
+        "raw_stored": done("raw_stored", "raw_save"),
+        "summary_done": done("summary_done", "summarize", "process"),
+        "analysis_done": done("analysis_done", "analyze", "process"),
+        "persisted": done("persisted", "persist"),
+        "submitted": done("submitted", "submit"),
+        "outputs": None,
+        "status": db.PROGRESS_PENDING,
+        "attempts": previous.get("attempts", 0),
+        "last_stage": previous.get("last_stage"),
+        "last_error": previous.get("last_error"),
+        "next_attempt_at": None,
+    }
+    record.update(fields)
+    return record
+
+async def _process_stage(ctx):
+    outputs = (ctx.get("progress") or {}).get("outputs") or {}
+    if _resumed(ctx, "summary_done", "analysis_done") and "structured_data" in outputs:
+        return (
+            outputs["summary"],
+            StructuredData.parse_obj(outputs["structured_data"]),
+            Analysis.parse_obj(outputs["analysis"]),
+        )
+    return await process_transcript(ctx["transcript"], combined=True)
+
+async def _summarize_stage(ctx):
+    if _resumed(ctx, "summary_done"):
+        return ctx["progress"]["outputs"]["summary"]
+    return await summarize_transcript(ctx["transcript"])
+
+async def _analyze_stage(ctx):
+    if _resumed(ctx, "analysis_done"):
+        return Analysis.parse_obj(ctx["progress"]["outputs"]["analysis"])
+    return await analyze_transcript(ctx["transcript"])
+
+def build_llm_stages(concurrency: Optional[int] = None, mode: Optional[str] = None) -> List[Stage]:
+    """
+    The LLM stages for PROCESSING_MODE (or ``mode``): "process" alone, or
+    "summarize" and "analyze" side by side.
+    """
+    concurrency = concurrency or LLM_STAGE_CONCURRENCY
+    if (mode or PROCESSING_MODE) == "combined":
+        return [Stage("process", _process_stage, concurrency=concurrency, queue_size=STAGE_QUEUE_SIZE)]
+    return [
+        Stage("summarize", _summarize_stage, concurrency=concurrency, queue_size=STAGE_QUEUE_SIZE),
+        Stage("analyze", _analyze_stage, concurrency=concurrency, queue_size=STAGE_QUEUE_SIZE),
+    ]
+
+def build_result(ctx: Dict[str, Any]) -> ProcessedResult:
+    """
+    ProcessedResult from the outputs of the LLM stages in ``ctx``.
+    """
+    transcript = ctx["transcript"]
+    if "process" in ctx:
+        summary, structured, analysis = ctx["process"]
+    else:
+        summary, structured, analysis = ctx["summarize"], extract_structured_data(transcript), ctx["analyze"]
+    return ProcessedResult(
+        transcript_id=transcript.transcript_id,
+        summary=summary,
+        structured_data=structured,
+        analysis=analysis,
+        processing_timestamp=datetime.now(timezone.utc),
+    )
+
+def build_pipeline(
+    writer: BatchWriter,
+    batcher: SubmissionBatcher,
+    seen_filter: SeenFilter,
+    dlq: AsyncQueue,
+    leases: Optional[LeaseKeeper] = None,
+    on_durable: Optional[Callable[[str], None]] = None,
+) -> Pipeline:
+    """
+    Stage graph for one transcript. The raw save runs alongside the LLM stages
+    (and summarize alongside analyze in "separate" mode); persisting waits for
+    all of them, and submission follows persisting.
+
+    Items redriven from a progress record (``ctx["progress"]``) skip every
+    stage that already completed, so a failed submission is retried without
+    new LLM calls. Items with a progress record are held in ``leases`` until
+    they complete or fail. ``on_durable(transcript_id)`` is called once an
+    item's result is persisted or its failure is recorded for redrive.
+    """
+    async def save_raw(ctx):
+        if _resumed(ctx, "raw_stored"):
+            return
+        await (await writer.save_raw(_raw_payload(ctx["transcript"])))
+
+    llm_stages = build_llm_stages()
+
+    async def persist(ctx):
+        transcript = ctx["transcript"]
+        if _resumed(ctx, "persisted"):
+            stored = await db.load_processed_result(transcript.transcript_id)
+            if stored is None:
+                raise LookupError(f"Processed result for {transcript.transcript_id} is missing")
+            return ProcessedResult.parse_obj(stored)
+        result = build_result(ctx)
+        # the progress record makes the transcript due for redrive should we die before submitting;
+        # until then its lease is renewed, so a slow submission is not redriven
+        progress = _progress(ctx, persisted=True, next_attempt_at=datetime.utcnow() + timedelta(seconds=PROGRESS_LEASE))
+        saved = [await writer.save_processed(result.dict()), await writer.save_progress(progress)]
+        # later transcripts of the session are prompted with this summary plus their new turns
+        state = session_store.record(transcript, result.summary, result.analysis.dict())
+        if state is not None:
+            saved.append(await writer.save_session(state))
+        await asyncio.gather(*saved)
+        if leases is not None:
+            leases.hold(transcript.transcript_id)
+        seen_filter.add(transcript.transcript_id)
+        if on_durable is not None:
+            on_durable(transcript.transcript_id)
+        return result
 
-        tid = transcript.transcript_id
+    async def submit(ctx):
+        # the batcher posts in the background; this stage only waits for the outcome
+        return await (await batcher.submit(ctx["persist"]))
+
+    completed = TRANSCRIPTS_FINISHED.labels("submitted")
+    retrying = TRANSCRIPTS_FINISHED.labels("retrying")
+    poisoned = TRANSCRIPTS_FINISHED.labels("poisoned")
+
+    def release(ctx):
+        if leases is not None:
+            leases.release(ctx["transcript"].transcript_id)
+
+    async def on_complete(ctx):
+        transcript_id = ctx["transcript"].transcript_id
+        release(ctx)
+        completed.inc()
         try:
-            # Store raw transcript
-            await save_raw_transcript(transcript.dict())
-
-            # Processing pipeline
-            summary = await summarize_transcript(transcript)
-            structured = extract_structured_data(transcript)
-            analysis = await analyze_transcript(transcript)
-
-            # Prepare processed result dict
-            result = {
-                "transcript_id": tid,
-                "summary": summary,
-                "structured_data": structured.dict(),
-                "analysis": analysis.dict(),
-                "processing_timestamp": datetime.now(timezone.utc).isoformat()
-            }
-
-            # Store processed result
-            await save_processed_result(result)
-
-            # Submit to external API
-            await client.submit_processed(result)
-            logger.info(f"Worker {name} processed and submitted {tid}")
+            await (await writer.save_progress(_progress(ctx, status=db.PROGRESS_DONE)))
+        except Exception as e:
+            # the pending progress row stays behind, so the redriver picks the transcript up again
+            logger.error(f"Could not mark {transcript_id} done, leaving it for redrive: {e}")
+            return
+        logger.debug(f"Processed and submitted {transcript_id}")
 
+    async def on_error(ctx, stage, exc):
+        transcript = ctx["transcript"]
+        release(ctx)
+        progress = _progress(ctx, outputs=_outputs(ctx), last_stage=stage, last_error=repr(exc)[:2000])
+        progress["attempts"] += 1
+        progress["next_attempt_at"] = redrive_policy.next_attempt(progress["attempts"])
+        if progress["next_attempt_at"] is None:
+            progress["status"] = db.PROGRESS_POISONED
+            poisoned.inc()
+            logger.error(f"Stage {stage} failed for {transcript.transcript_id} on attempt {progress['attempts']}, giving up: {exc!r}")
+        else:
+            retrying.inc()
+            logger.warning(f"Stage {stage} failed for {transcript.transcript_id} on attempt {progress['attempts']}, will retry: {exc!r}")
+        try:
+            saved = []
+            if not progress["raw_stored"]:
+                # redrive reloads the transcript from raw_transcripts
+                saved.append(await writer.save_raw(_raw_payload(transcript)))
+                progress["raw_stored"] = True
+            saved.append(await writer.save_progress(progress))
+            await asyncio.gather(*saved)
         except Exception as e:
-            logger.exception(f"Error in worker {name} processing {tid}, sending to DLQ")
+            logger.error(f"Could not record progress for {transcript.transcript_id}, sending to DLQ: {e}")
+            # nothing will retry it, so a replay of the stream may pick it up again
+            seen_filter.release(transcript.transcript_id)
             await dlq.put(transcript)
+            return
+        # the progress record now keeps the stream from handing it out again, retrying or poisoned
+        seen_filter.add(transcript.transcript_id)
+        if on_durable is not None:
+            on_durable(transcript.transcript_id)
+
+    stages = [
+        Stage("raw_save", save_raw, concurrency=DB_STAGE_CONCURRENCY, queue_size=STAGE_QUEUE_SIZE),
+        *llm_stages,
+        Stage(
+            "persist",
+            persist,
+            depends_on=["raw_save", *(stage.name for stage in llm_stages)],
+            concurrency=DB_STAGE_CONCURRENCY,
+            queue_size=STAGE_QUEUE_SIZE,
+        ),
+        Stage("submit", submit, depends_on=["persist"], concurrency=SUBMIT_STAGE_CONCURRENCY, queue_size=STAGE_QUEUE_SIZE),
+    ]
+    return Pipeline(
+        stages,
+        on_complete=on_complete,
+        on_error=on_error,
+        trace_attributes=lambda ctx: {
+            "transcript_id": ctx["transcript"].transcript_id,
+            "session_id": ctx["transcript"].session_id,
+            "redrive": "progress" in ctx,
+        },
+    )
+
+def build_autoscaler(pipeline: Pipeline) -> Autoscaler:
+    """
+    Autoscaler for the stages of ``pipeline``, bounded per kind of dependency.
+    The LLM stages share one policy, so together they stay within the scheduler's limit.
+    """
+    llm = ScalingPolicy(
+        LLM_STAGE_MIN_CONCURRENCY,
+        LLM_STAGE_MAX_CONCURRENCY,
+        latency_ceiling=LLM_STAGE_LATENCY_CEILING,
+        capacity=lambda: llm_scheduler.limit,
+    )
+    database = ScalingPolicy(DB_STAGE_MIN_CONCURRENCY, DB_STAGE_MAX_CONCURRENCY)
+    submission = ScalingPolicy(SUBMIT_STAGE_MIN_CONCURRENCY, SUBMIT_STAGE_MAX_CONCURRENCY)
+    by_stage = {
+        "process": llm,
+        "summarize": llm,
+        "analyze": llm,
+        "raw_save": database,
+        "persist": database,
+        "submit": submission,
+    }
+    policies = {name: by_stage[name] for name in pipeline.stages if name in by_stage}
+    return Autoscaler(pipeline, policies, interval=AUTOSCALE_INTERVAL)
+
+def build_redriver(pipeline: Pipeline, leases: Optional[LeaseKeeper] = None) -> RedriveScheduler:
+    """
+    Background task feeding due progress records back into ``pipeline``,
+    holding each redriven record in ``leases``.
+    """
+    async def resubmit(progress: Dict[str, Any]) -> None:
+        transcript_id = progress["transcript_id"]
+        data = await db.load_raw_transcript(transcript_id)
+        if data is None:
+            logger.error(f"Cannot redrive {transcript_id}: raw transcript is missing")
+            return
+        logger.info(f"Redriving {transcript_id} (attempt {progress['attempts'] + 1})")
+        await pipeline.submit({"transcript": Transcript.parse_obj(data), "progress": progress})
+
+    return RedriveScheduler(
+        db.claim_due_progress,
+        resubmit,
+        interval=REDRIVE_INTERVAL,
+        batch_size=REDRIVE_BATCH_SIZE,
+        lease=PROGRESS_LEASE,
+        leases=leases,
+    )
+
+def build_leases() -> LeaseKeeper:
+    """
+    Lease renewal for the progress records of in-flight transcripts.
+    """
+    return LeaseKeeper(db.renew_progress_leases, lease=PROGRESS_LEASE)
+
+async def feeder(pipeline: Pipeline, work_q: AsyncQueue) -> None:
+    """
+    Move transcripts from the work queue into the stage pipeline until a None sentinel.
+    """
+    while True:
+        transcript: Optional[Transcript] = await work_q.get()
+        try:
+            if transcript is None:
+                break
+            await pipeline.submit({"transcript": transcript})
         finally:
             work_q.task_done()
 
+async def report_stage_latency(pipeline: Pipeline) -> None:
+    while True:
+        await asyncio.sleep(STATS_LOG_INTERVAL)
+        _log_stage_latency(pipeline)
+
+def _log_loop_health(monitor: LoopMonitor) -> None:
+    health = monitor.summary()
+    logger.info(
+        f"Event loop: mean lag {health['mean_lag'] * 1000:.1f}ms, max lag {health['max_lag']:.3f}s, "
+        f"{health['stalls']} stalls over {LOOP_STALL_THRESHOLD}s"
+    )
+
+def _log_stage_latency(pipeline: Pipeline) -> None:
+    depths = pipeline.queue_depths()
+    for name, stats in pipeline.report().items():
+        logger.info(
+            f"Stage {name}: ok={stats['processed']} failed={stats['failed']} "
+            f"p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s p99={stats['p99']:.3f}s "
+            f"queued={depths.get(name, 0)}"
+        )
+
 async def main() -> None:
     # Initialize DB
     await init_db()
+    metrics_runner = await start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+    loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL, LOOP_STALL_THRESHOLD)
+    loop_monitor.start()
 
     # Initialize client and authenticate
-    client = APIClient(API_KEY, BASE_URL)
+    client = APIClient(
+        API_KEY,
+        BASE_URL,
+        connection_limit=HTTP_POOL_LIMIT,
+        connection_limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+    )
     await client.authenticate()
+    writer = BatchWriter(flush_interval=DB_FLUSH_INTERVAL, max_batch_size=DB_BATCH_SIZE)
+    batcher = SubmissionBatcher(
+        client,
+        max_batch_size=SUBMIT_BATCH_SIZE,
+        max_delay=SUBMIT_BATCH_DELAY,
+        max_in_flight=SUBMIT_MAX_IN_FLIGHT,
+    )
 
     # Queues for work and dead letters
-    work_queue = AsyncQueue(maxsize=QUEUE_MAXSIZE)
+    work_queue = AsyncQueue(
+        maxsize=QUEUE_MAXSIZE,
+        max_bytes=QUEUE_MAX_BYTES,
+        low_watermark=QUEUE_LOW_WATERMARK,
+        priority=transcript_priority,
+        size=transcript_size,
+        priority_aging=PRIORITY_AGING,
+    )
     dlq = AsyncQueue()
+    export_queue_metrics("work_queue", work_queue)
+    export_queue_metrics("dlq", dlq)
+
+    # Dedupe filter over processed_results, so replays never reach the LLM
+    seen_filter = SeenFilter(capacity=DEDUPE_CAPACITY)
+    await seen_filter.warm()
+
+    # Start resumable transcript stream producer; the checkpoint only moves past persisted transcripts
+    stream = ResumableStream(
+        client,
+        load_checkpoint=_load_stream_checkpoint,
+        save_checkpoint=functools.partial(save_checkpoint, STREAM_CHECKPOINT),
+        seen=seen_filter.seen,
+        source=client.stream_lazy,
+        acknowledge=True,
+    )
 
-    # Start transcript stream producer
     async def producer() -> None:
-        async for transcript in client.stream_transcripts():
-            await work_queue.put(transcript)
-            logger.debug(f"Enqueued {transcript.transcript_id}")
+        async with aclosing(stream.transcripts()) as transcripts:
+            async for transcript in transcripts:
+                seen_filter.reserve(transcript.transcript_id)
+                await work_queue.put(transcript)
+                TRANSCRIPTS_INGESTED.inc()
+                logger.debug(f"Enqueued {transcript.transcript_id}")
 
     producer_task = asyncio.create_task(producer())
 
-    # Start worker pool
-    workers = [asyncio.create_task(worker(i, client, work_queue, dlq)) for i in range(CONCURRENCY)]
+    # Start the stage pipeline and the task feeding it from the work queue
+    leases = build_leases()
+    leases.start()
+    pipeline = build_pipeline(writer, batcher, seen_filter, dlq, leases, on_durable=stream.done)
+    pipeline.start()
+    feeder_task = asyncio.create_task(feeder(pipeline, work_queue))
+    reporter_task = asyncio.create_task(report_stage_latency(pipeline))
+    redriver = build_redriver(pipeline, leases)
+    redriver.start()
+    autoscaler = build_autoscaler(pipeline)
+    if AUTOSCALE_INTERVAL:
+        autoscaler.start()
 
     # Graceful shutdown handling
     stop_event = asyncio.Event()
@@ -97,16 +538,37 @@ async def main() -> None:
         loop.add_signal_handler(sig, stop_event.set)
 
     await stop_event.wait()
-    logger.info("Shutdown signal received, terminating workers...")
-
-    # Signal workers to stop
-    for _ in workers:
-        await work_queue.put(None)
+    logger.info("Shutdown signal received, draining pipeline...")
 
-    await asyncio.gather(*workers)
+    # Stop ingest and redrive, let queued transcripts flow through, then stop the stages
     producer_task.cancel()
+    await asyncio.gather(producer_task, return_exceptions=True)
+    await redriver.stop()
+    await work_queue.put(None)
+    await feeder_task
+    await pipeline.drain()
+    await stream.close()
+    await autoscaler.stop()
+    await pipeline.stop()
+    await leases.stop()
+    reporter_task.cancel()
+    _log_stage_latency(pipeline)
+    queue_stats = work_queue.stats()
+    logger.info(
+        f"Work queue: {queue_stats['gets']} served, p95 wait {queue_stats['p95_wait']:.3f}s, "
+        f"paused {queue_stats['pauses']} times for {queue_stats['paused_seconds']:.1f}s"
+    )
+    await writer.close()
+    await llm_cache.flush()
+    await batcher.close()
+    await client.close()
+    await loop_monitor.stop()
+    _log_loop_health(loop_monitor)
+    await tracer.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
 
-    # Handle DLQ items
+    # Transcripts whose failure could not be recorded for redrive
     if not dlq.empty():
         count = 0
         while not dlq.empty():
@@ -116,4 +578,3 @@ async def main() -> None:
 
 if __name__ == "__main__":
     asyncio.run(main())
-s
\ No newline at end of file
@@ -0,0 +1,123 @@
+"""
+Event-loop health: scheduling lag and detection of blocking callbacks.
+
+Every coroutine shares one loop, so a single blocking call (synchronous I/O,
+a large parse, a CPU-bound loop) stalls every stage at once. ``LoopMonitor``
+measures how late a periodic sleep wakes up, which is the delay every ready
+callback sees, and runs a watchdog thread that captures the loop thread's
+stack while the loop is stuck, pointing at the code that blocks it.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .registry import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer callback",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_LAG_MAX = Gauge("event_loop_lag_max_seconds", "Largest event loop lag since the previous scrape")
+LOOP_STALLS = Counter("event_loop_stalls", "Times the event loop was blocked past the stall threshold")
+
+
+class LoopMonitor:
+    """
+    Samples loop lag every ``interval`` seconds and reports a stall, with the
+    blocking stack, once the loop has not run the sampler for
+    ``stall_threshold`` seconds past its due time. The last ``max_stalls``
+    stall reports are kept in ``stalls``.
+
+    The watchdog thread and the loop both update ``stats`` and ``stalls``
+    under ``_lock``; read them through ``summary`` and ``recent_stalls``
+    while the monitor runs.
+    """
+
+    def __init__(self, interval: float = 0.25, stall_threshold: float = 0.5, max_stalls: int = 20):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self.stats = {"samples": 0, "max_lag": 0.0, "total_lag": 0.0, "stalls": 0}
+        self._window_max = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        LOOP_LAG_MAX.set_function(self._scrape_max)
+        self._task = asyncio.create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self.stats)
+        samples = stats["samples"]
+        return {
+            "samples": samples,
+            "mean_lag": stats["total_lag"] / samples if samples else 0.0,
+            "max_lag": stats["max_lag"],
+            "stalls": stats["stalls"],
+        }
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.stalls)
+
+    def _scrape_max(self) -> float:
+        with self._lock:
+            value, self._window_max = self._window_max, 0.0
+        return value
+
+    async def _sample(self) -> None:
+        while True:
+            due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - due)
+            LOOP_LAG.observe(lag)
+            with self._lock:
+                self.stats["samples"] += 1
+                self.stats["total_lag"] += lag
+                self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+                self._window_max = max(self._window_max, lag)
+
+    def _watch(self) -> None:
+        reported: Optional[float] = None
+        while not self._stopped.wait(self.stall_threshold / 4):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.stall_threshold or reported == heartbeat:
+                continue
+            # report each stall once, while it is still in progress
+            reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            with self._lock:
+                self.stats["stalls"] += 1
+                self.stalls.append({"at": time.time(), "blocked": blocked, "stack": stack})
+            LOOP_STALLS.inc()
+            logger.warning(f"Event loop blocked for {blocked:.2f}s so far, in:\n{stack}")
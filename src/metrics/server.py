@@ -0,0 +1,32 @@
+"""
+Embedded HTTP endpoint serving the metrics registry to Prometheus.
+"""
+import logging
+
+from aiohttp import web
+
+from .registry import REGISTRY, Registry
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def metrics_app(registry: Registry = REGISTRY) -> web.Application:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=registry.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    return app
+
+
+async def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY) -> web.AppRunner:
+    """
+    Serve ``/metrics`` on the running event loop; call ``cleanup()`` on the returned runner to stop.
+    """
+    runner = web.AppRunner(metrics_app(registry), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,199 @@
+"""
+Sampled trace spans exported as JSON lines.
+
+A trace is sampled when its root span starts (``TRACE_SAMPLE_RATE``). Spans
+started while another span is current (per task, through a context
+variable) join its trace, and none are recorded inside an unsampled one, so
+an unsampled trace costs one random draw. Each finished span is written as
+one JSON object per line, with OTLP field names (``traceId``, ``spanId``,
+``parentSpanId``, ``startTimeUnixNano``, ...), to ``TRACE_FILE``. Tracing is
+off when no file is configured.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from .registry import Counter
+
+logger = logging.getLogger(__name__)
+
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Spans buffered before a write is scheduled, and the most kept while writes lag.
+TRACE_BATCH_SIZE = 512
+TRACE_MAX_BUFFERED = 50_000
+
+SPANS_EXPORTED = Counter("trace_spans_exported", "Trace spans written to the trace file")
+SPANS_DROPPED = Counter("trace_spans_dropped", "Trace spans dropped because the export buffer was full")
+
+_current: contextvars.ContextVar[Any] = contextvars.ContextVar("current_span", default=None)
+# Current while an unsampled trace runs, so nothing under it starts a trace of its own.
+_UNSAMPLED = object()
+
+
+class Span:
+    """
+    One timed operation; ``end`` hands it to the tracer's exporter.
+    """
+    __slots__ = ("tracer", "trace_id", "span_id", "parent_id", "name", "attributes", "start_ns", "error")
+
+    def __init__(self, tracer: "Tracer", trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self.error = repr(error)[:500]
+        self.tracer.exporter.export(self.to_dict(time.time_ns()))
+
+    def to_dict(self, end_ns: int) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class JsonLinesExporter:
+    """
+    Buffers finished spans and appends them to ``path`` in batches, writing
+    from a worker thread so file I/O never runs on the event loop. Spans past
+    ``max_buffered`` are dropped and counted rather than blocking callers.
+    """
+
+    def __init__(self, path: str, batch_size: int = TRACE_BATCH_SIZE, max_buffered: int = TRACE_MAX_BUFFERED):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self._buffer: List[Dict[str, Any]] = []
+        self._writes: List[asyncio.Future] = []
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if len(self._buffer) >= self.max_buffered:
+            SPANS_DROPPED.inc()
+            return
+        self._buffer.append(span)
+        if len(self._buffer) >= self.batch_size:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        batch, self._buffer = self._buffer, []
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(batch)
+            return
+        self._writes = [write for write in self._writes if not write.done()]
+        self._writes.append(loop.run_in_executor(None, self._write, batch))
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(span, default=str) + "\n" for span in batch)
+        except OSError as e:
+            logger.warning(f"Could not write {len(batch)} trace spans to {self.path}: {e}")
+            return
+        SPANS_EXPORTED.inc(len(batch))
+
+    async def flush(self) -> None:
+        """
+        Write everything buffered and wait for pending writes.
+        """
+        if self._buffer:
+            self._schedule()
+        if self._writes:
+            await asyncio.gather(*self._writes)
+            self._writes.clear()
+
+
+class Tracer:
+    """
+    Starts spans, sampling ``sample_rate`` of traces; with no ``exporter`` every span is a no-op.
+    """
+
+    def __init__(self, exporter: Optional[JsonLinesExporter] = None, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.random = random.Random()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(JsonLinesExporter(TRACE_FILE) if TRACE_FILE else None, TRACE_SAMPLE_RATE)
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Optional[Span]:
+        """
+        A child of ``parent`` (default: the current span), or a new root span
+        if sampled; None when the span is not recorded. The caller must ``end`` it.
+        """
+        if parent is None:
+            parent = _current.get()
+            if parent is _UNSAMPLED:
+                return None
+        if parent is not None:
+            return Span(self, parent.trace_id, parent.span_id, name, attributes)
+        if not self.enabled or self.random.random() >= self.sample_rate:
+            return None
+        return Span(self, os.urandom(16).hex(), None, name, attributes)
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Iterator[Optional[Span]]:
+        """
+        ``start_span`` as a context manager that makes the span current while
+        the block runs and records an exception raised from it.
+        """
+        span = self.start_span(name, parent, **attributes)
+        if span is None:
+            with self.unsampled():
+                yield None
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            _current.reset(token)
+            span.end(e)
+            raise
+        _current.reset(token)
+        span.end()
+
+    @contextmanager
+    def unsampled(self) -> Iterator[None]:
+        """
+        Record no spans while the block runs, e.g. the stages of an unsampled item.
+        """
+        token = _current.set(_UNSAMPLED)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+
+    async def close(self) -> None:
+        if self.exporter is not None:
+            await self.exporter.flush()
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,216 @@
+"""
+Queue-driven autoscaling of pipeline stage workers.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from metrics.registry import Counter, Gauge
+from .executor import Pipeline
+
+logger = logging.getLogger(__name__)
+
+STAGE_WORKERS_DESIRED = Gauge("autoscaler_desired_workers", "Worker count the autoscaler last computed for each stage", ["stage"])
+STAGE_RESIZES = Counter("autoscaler_resizes", "Stage worker pool resizes, by direction", ["stage", "direction"])
+
+
+@dataclass
+class ScalingPolicy:
+    """
+    Bounds and pacing for one stage.
+
+    The target follows Little's law: workers = arrival rate x time per item,
+    times ``headroom``, plus enough workers to clear the current backlog
+    within ``drain_time`` seconds. While the stage's time per item is over
+    ``latency_ceiling`` the dependency behind it is struggling, so the pool
+    does not grow. Growth waits ``up_cooldown`` seconds after any resize and
+    shrinking waits ``down_cooldown`` (also after start); one shrink removes
+    at most ``max_shrink`` of the workers.
+
+    ``capacity``, if set, returns how many items the dependency will serve at
+    once right now (e.g. the LLM scheduler's adaptive limit). Workers past it
+    would only wait for a slot, and that wait would count as time per item and
+    ask for still more workers, so targets never exceed it. Stages whose
+    policies share one ``capacity`` function share that capacity: when their
+    targets add up to more, each gets a share in proportion to its target
+    (never below ``min_workers``).
+    """
+    min_workers: int = 1
+    max_workers: int = 64
+    headroom: float = 1.2
+    drain_time: float = 30.0
+    latency_ceiling: Optional[float] = None
+    up_cooldown: float = 10.0
+    down_cooldown: float = 60.0
+    max_shrink: float = 0.25
+    capacity: Optional[Callable[[], float]] = None
+
+
+class _StageState:
+    __slots__ = ("enqueued", "finished", "busy_seconds", "latency", "last_resize", "desired")
+
+    def __init__(self) -> None:
+        self.enqueued = 0
+        self.finished = 0
+        self.busy_seconds = 0.0
+        self.latency: Optional[float] = None
+        self.last_resize = -math.inf
+        self.desired = 0
+
+
+class Autoscaler:
+    """
+    Every ``interval`` seconds, resizes each stage that has a policy from its
+    arrival rate, recent time per item and queue depth since the previous
+    tick. Every resize is logged and counted, and ``decisions`` keeps the
+    inputs of the last ones.
+    """
+
+    def __init__(self, pipeline: Pipeline, policies: Dict[str, ScalingPolicy], interval: float = 5.0, smoothing: float = 0.5):
+        unknown = set(policies) - set(pipeline.stages)
+        if unknown:
+            raise ValueError(f"No such stages to autoscale: {sorted(unknown)}")
+        self.pipeline = pipeline
+        self.policies = policies
+        self.interval = interval
+        self.smoothing = smoothing
+        self.decisions: Deque[Dict[str, Any]] = deque(maxlen=100)
+        self._state = {name: _StageState() for name in policies}
+        self._last_tick: Optional[float] = None
+        self._started = -math.inf
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        for name in self.policies:
+            STAGE_WORKERS_DESIRED.labels(name).set_function(lambda name=name: self._state[name].desired)
+        self._started = time.monotonic()
+        self._snapshot()
+        self._task = asyncio.create_task(self.run(), name="autoscaler")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Autoscaler tick failed: {e}")
+
+    def _snapshot(self) -> None:
+        self._last_tick = time.monotonic()
+        for name, state in self._state.items():
+            stats = self.pipeline.stats[name]
+            state.enqueued = stats.enqueued
+            state.finished = stats.processed + stats.failed
+            state.busy_seconds = stats.total_latency
+
+    def desired(self, name: str, arrival_rate: float, latency: float, queued: int) -> int:
+        """
+        Worker count for stage ``name`` given its arrival rate (items/s), time per item (s) and backlog.
+        """
+        policy = self.policies[name]
+        needed = arrival_rate * latency * policy.headroom + queued * latency / policy.drain_time
+        return max(policy.min_workers, min(policy.max_workers, math.ceil(needed)))
+
+    def share_capacity(self, targets: Dict[str, int]) -> Dict[str, int]:
+        """
+        ``targets`` cut down so the stages sharing a ``capacity`` function together stay within it.
+        """
+        shared: Dict[Callable[[], float], List[str]] = {}
+        for name in targets:
+            capacity = self.policies[name].capacity
+            if capacity is not None:
+                shared.setdefault(capacity, []).append(name)
+        result = dict(targets)
+        for capacity, names in shared.items():
+            limit = int(capacity())
+            total = sum(targets[name] for name in names)
+            if total <= limit:
+                continue
+            for name in names:
+                result[name] = max(self.policies[name].min_workers, targets[name] * limit // total)
+        return result
+
+    def tick(self) -> Dict[str, int]:
+        """
+        Measure every autoscaled stage since the previous tick and resize those that need it.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_tick if self._last_tick is not None else self.interval
+        depths = self.pipeline.queue_depths()
+        sizes = {}
+        # stages without a time per item yet keep their size, and hold it against any shared capacity
+        targets: Dict[str, int] = {}
+        measured: Dict[str, Tuple[float, int]] = {}
+        for name, state in self._state.items():
+            stats = self.pipeline.stats[name]
+            arrivals = stats.enqueued - state.enqueued
+            finished = stats.processed + stats.failed - state.finished
+            queued = depths.get(name, 0)
+            if finished:
+                # smoothed time per item over this window
+                sample = (stats.total_latency - state.busy_seconds) / finished
+                state.latency = sample if state.latency is None else self.smoothing * sample + (1 - self.smoothing) * state.latency
+            elif queued:
+                # nothing finished while items waited, so each takes at least this long
+                state.latency = max(state.latency or 0.0, elapsed)
+            current = self.pipeline.concurrency(name)
+            sizes[name] = current
+            targets[name] = current
+            if state.latency is None:
+                continue
+            arrival_rate = arrivals / elapsed if elapsed > 0 else 0.0
+            targets[name] = self.desired(name, arrival_rate, state.latency, queued)
+            measured[name] = (arrival_rate, queued)
+        targets = self.share_capacity(targets)
+
+        for name, (arrival_rate, queued) in measured.items():
+            state = self._state[name]
+            policy = self.policies[name]
+            current = sizes[name]
+            target = targets[name]
+            state.desired = target
+            since_resize = now - state.last_resize
+            reason = None
+            if target > current:
+                if policy.latency_ceiling is not None and state.latency > policy.latency_ceiling:
+                    logger.info(
+                        f"Not growing stage {name}: {state.latency:.2f}s per item is over the "
+                        f"{policy.latency_ceiling:.2f}s ceiling"
+                    )
+                elif since_resize >= policy.up_cooldown:
+                    reason = "up"
+            elif target < current and now - max(state.last_resize, self._started) >= policy.down_cooldown:
+                target = max(target, math.floor(current * (1 - policy.max_shrink)))
+                if target < current:
+                    reason = "down"
+            if reason is None:
+                continue
+
+            self.pipeline.resize(name, target)
+            state.last_resize = now
+            sizes[name] = target
+            STAGE_RESIZES.labels(name, reason).inc()
+            self.decisions.append({
+                "stage": name,
+                "from": current,
+                "to": target,
+                "arrival_rate": arrival_rate,
+                "latency": state.latency,
+                "queued": queued,
+            })
+            logger.info(
+                f"Scaling stage {name} {current} -> {target} workers "
+                f"({arrival_rate:.1f} arrivals/s, {state.latency:.3f}s per item, {queued} queued)"
+            )
+        self._snapshot()
+        return sizes
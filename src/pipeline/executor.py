@@ -0,0 +1,320 @@
+"""
+Declarative stage-graph executor with per-stage queues and concurrency.
+"""
+import asyncio
+import functools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Sequence, Set
+
+from metrics.registry import Gauge, Histogram
+from metrics.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+STAGE_LATENCY = Histogram("pipeline_stage_latency_seconds", "Time spent in each pipeline stage, by outcome", ["stage", "outcome"])
+STAGE_QUEUE_DEPTH = Gauge("pipeline_stage_queue_depth", "Items waiting for each pipeline stage", ["stage"])
+END_TO_END_LATENCY = Histogram("pipeline_end_to_end_seconds", "Time from admission to completion or failure", ["outcome"])
+ACTIVE_ITEMS = Gauge("pipeline_active_items", "Items admitted and not yet finished")
+STAGE_WORKERS = Gauge("pipeline_stage_workers", "Worker tasks running each pipeline stage", ["stage"])
+
+Context = Dict[str, Any]
+
+
+@dataclass
+class Stage:
+    """
+    One step of the pipeline.
+
+    ``func`` receives the item's context dict and its return value is stored
+    in the context under ``name``. A stage runs for an item once every stage
+    in ``depends_on`` has finished for it, so stages without a path between
+    them run concurrently.
+    """
+    name: str
+    func: Callable[[Context], Awaitable[Any]]
+    depends_on: Sequence[str] = ()
+    concurrency: int = 1
+    queue_size: int = 100
+
+
+@dataclass
+class StageStats:
+    enqueued: int = 0
+    processed: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    recent: Deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record(self, latency: float, ok: bool) -> None:
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.recent.append(latency)
+
+    def summary(self) -> Dict[str, float]:
+        count = self.processed + self.failed
+        recent = sorted(self.recent)
+
+        def pct(p: float) -> float:
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "mean": self.total_latency / count if count else 0.0,
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+            "max": self.max_latency,
+        }
+
+
+class _Job:
+    __slots__ = ("ctx", "waiting", "remaining", "failed", "started", "span")
+
+    def __init__(self, ctx: Context, stages: Dict[str, Stage], sinks: int):
+        self.ctx = ctx
+        self.waiting = {name: len(stage.depends_on) for name, stage in stages.items()}
+        self.remaining = sinks
+        self.failed = False
+        self.started = time.monotonic()
+        self.span = None
+
+
+class Pipeline:
+    """
+    Runs items through a DAG of stages.
+
+    Each stage owns a bounded queue and ``concurrency`` worker tasks, so a
+    slow stage only holds back items that need it, and back-pressure
+    propagates upstream through full queues. When a stage raises, the item is
+    abandoned and ``on_error(ctx, stage_name, exc)`` is called; when all sink
+    stages finish, ``on_complete(ctx)`` is called. Exceptions from either
+    callback are logged and do not stop the worker. ``resize`` changes a
+    stage's worker count while running.
+
+    Sampled items get a trace span from admission to completion, with a
+    child span per stage; ``trace_attributes(ctx)`` labels the item's span.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        on_complete: Optional[Callable[[Context], Awaitable[None]]] = None,
+        on_error: Optional[Callable[[Context, str, BaseException], Awaitable[None]]] = None,
+        trace_attributes: Optional[Callable[[Context], Dict[str, Any]]] = None,
+    ):
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        self.dependents: Dict[str, List[str]] = {name: [] for name in self.stages}
+        for stage in stages:
+            for dep in stage.depends_on:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name!r} depends on unknown stage {dep!r}")
+                self.dependents[dep].append(stage.name)
+        self._check_acyclic()
+        self.roots = [name for name, stage in self.stages.items() if not stage.depends_on]
+        self.sinks = [name for name, deps in self.dependents.items() if not deps]
+        self.on_complete = on_complete
+        self.on_error = on_error
+        self.trace_attributes = trace_attributes
+        self.stats = {name: StageStats() for name in self.stages}
+        self.end_to_end = StageStats()
+        self._latency = {name: (STAGE_LATENCY.labels(name, "ok"), STAGE_LATENCY.labels(name, "failed")) for name in self.stages}
+        self._end_to_end = (END_TO_END_LATENCY.labels("ok"), END_TO_END_LATENCY.labels("failed"))
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._workers: Dict[str, Set[asyncio.Task]] = {name: set() for name in self.stages}
+        # workers waiting for a job, which can be cancelled without losing one
+        self._waiting: Dict[str, Set[asyncio.Task]] = {name: set() for name in self.stages}
+        # busy workers that should exit after their current job
+        self._retiring: Dict[str, int] = {name: 0 for name in self.stages}
+        self._active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _check_acyclic(self) -> None:
+        visiting, done = set(), set()
+
+        def visit(name: str) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage graph has a cycle through {name!r}")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def start(self) -> None:
+        ACTIVE_ITEMS.set_function(lambda: self._active)
+        for name, stage in self.stages.items():
+            queue = self._queues[name] = asyncio.Queue(maxsize=stage.queue_size)
+            STAGE_QUEUE_DEPTH.labels(name).set_function(queue.qsize)
+            STAGE_WORKERS.labels(name).set_function(functools.partial(self.concurrency, name))
+            self._spawn(stage, stage.concurrency)
+
+    def _spawn(self, stage: Stage, count: int) -> None:
+        workers = self._workers[stage.name]
+        for _ in range(count):
+            task = asyncio.create_task(self._run_stage(stage), name=f"{stage.name}-worker")
+            workers.add(task)
+            task.add_done_callback(workers.discard)
+
+    def concurrency(self, name: str) -> int:
+        """
+        Workers of stage ``name``, not counting those retiring after their current job.
+        """
+        return len(self._workers[name]) - self._retiring[name]
+
+    def resize(self, name: str, concurrency: int) -> None:
+        """
+        Run ``concurrency`` workers for stage ``name``. Shrinking cancels idle
+        workers first; busy ones finish their current item and then exit, so
+        no admitted item is dropped.
+        """
+        concurrency = max(1, concurrency)
+        delta = concurrency - self.concurrency(name)
+        if delta > 0:
+            # withdraw pending retirements before starting new workers
+            kept = min(delta, self._retiring[name])
+            self._retiring[name] -= kept
+            self._spawn(self.stages[name], delta - kept)
+        elif delta < 0:
+            surplus = -delta
+            for task in list(self._waiting[name])[:surplus]:
+                # a job is only taken off the queue after the wait returns, so none is lost
+                self._waiting[name].discard(task)
+                self._workers[name].discard(task)
+                task.cancel()
+                surplus -= 1
+            self._retiring[name] += surplus
+
+    async def submit(self, ctx: Context) -> None:
+        """
+        Admit an item; waits while the root stage queues are full.
+        """
+        job = _Job(ctx, self.stages, len(self.sinks))
+        job.span = tracer.start_span("pipeline")
+        if job.span is not None and self.trace_attributes is not None:
+            job.span.set(**self.trace_attributes(ctx))
+        self._active += 1
+        self._idle.clear()
+        for name in self.roots:
+            self.stats[name].enqueued += 1
+            await self._queues[name].put(job)
+
+    async def drain(self) -> None:
+        """
+        Wait until every admitted item has completed or failed.
+        """
+        await self._idle.wait()
+
+    async def stop(self) -> None:
+        workers = [task for tasks in self._workers.values() for task in tasks]
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for name in self.stages:
+            self._workers[name].clear()
+            self._waiting[name].clear()
+            self._retiring[name] = 0
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {name: queue.qsize() for name, queue in self._queues.items()}
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        report = {name: stats.summary() for name, stats in self.stats.items()}
+        report["end_to_end"] = self.end_to_end.summary()
+        return report
+
+    def _record_end_to_end(self, job: _Job, ok: bool) -> None:
+        latency = time.monotonic() - job.started
+        self.end_to_end.record(latency, ok=ok)
+        self._end_to_end[0 if ok else 1].observe(latency)
+
+    def _finish(self, job: _Job, error: Optional[BaseException] = None) -> None:
+        if job.span is not None:
+            job.span.end(error)
+        self._active -= 1
+        if self._active == 0:
+            self._idle.set()
+
+    async def _run_stage(self, stage: Stage) -> None:
+        queue = self._queues[stage.name]
+        waiting = self._waiting[stage.name]
+        worker = asyncio.current_task()
+        while True:
+            if self._retiring[stage.name] > 0:
+                self._retiring[stage.name] -= 1
+                self._workers[stage.name].discard(worker)
+                return
+            waiting.add(worker)
+            try:
+                job: _Job = await queue.get()
+            finally:
+                waiting.discard(worker)
+            try:
+                await self._execute(stage, job)
+            finally:
+                queue.task_done()
+
+    async def _execute(self, stage: Stage, job: _Job) -> None:
+        if job.failed:
+            return
+        started = time.monotonic()
+        try:
+            with tracer.span(stage.name, parent=job.span) if job.span is not None else tracer.unsampled():
+                job.ctx[stage.name] = await stage.func(job.ctx)
+        except Exception as e:
+            latency = time.monotonic() - started
+            self.stats[stage.name].record(latency, ok=False)
+            self._latency[stage.name][1].observe(latency)
+            if job.failed:
+                # a parallel branch already failed and reported this item
+                return
+            job.failed = True
+            self._record_end_to_end(job, ok=False)
+            try:
+                if self.on_error is not None:
+                    await self.on_error(job.ctx, stage.name, e)
+                else:
+                    logger.exception(f"Stage {stage.name} failed")
+            except Exception:
+                # a failing callback must not take the worker down with it
+                logger.exception(f"on_error callback failed for stage {stage.name}")
+            finally:
+                self._finish(job, e)
+            return
+        latency = time.monotonic() - started
+        self.stats[stage.name].record(latency, ok=True)
+        self._latency[stage.name][0].observe(latency)
+
+        for name in self.dependents[stage.name]:
+            job.waiting[name] -= 1
+            if job.waiting[name] == 0:
+                self.stats[name].enqueued += 1
+                await self._queues[name].put(job)
+
+        if not self.dependents[stage.name]:
+            job.remaining -= 1
+            if job.remaining == 0 and not job.failed:
+                self._record_end_to_end(job, ok=True)
+                try:
+                    if self.on_complete is not None:
+                        await self.on_complete(job.ctx)
+                except Exception:
+                    logger.exception("on_complete callback failed")
+                finally:
+                    self._finish(job)
@@ -0,0 +1,135 @@
+"""
+Background redrive of failed pipeline items from their persisted progress records.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+Record = Dict[str, Any]
+
+
+class RedrivePolicy:
+    """
+    Exponential backoff with full jitter between attempts, and a poison
+    cutoff after ``max_attempts`` failures.
+    """
+
+    def __init__(self, base_delay: float = 30.0, max_delay: float = 3600.0, max_attempts: int = 5):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    def next_attempt(self, attempts: int) -> Optional[datetime]:
+        """
+        When to retry after ``attempts`` failures (naive UTC), or None once the item is poisoned.
+        """
+        if attempts >= self.max_attempts:
+            return None
+        ceiling = min(self.max_delay, self.base_delay * 2 ** max(0, attempts - 1))
+        return datetime.utcnow() + timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+class LeaseKeeper:
+    """
+    Keeps the records of items still in the pipeline from falling due.
+
+    An item is held from the moment its record could be claimed (it was
+    persisted, or claimed for redrive) until the pipeline is done with it.
+    Every third of ``lease`` seconds, ``renew(keys, lease)`` pushes the
+    records of all held items ``lease`` seconds ahead. Once a process dies
+    its records stop being renewed and fall due within ``lease``.
+    """
+
+    def __init__(self, renew: Callable[[Sequence[str], float], Awaitable[int]], lease: float = 120.0):
+        self.renew = renew
+        self.lease = lease
+        self._held: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def hold(self, key: str) -> None:
+        self._held.add(key)
+
+    def release(self, key: str) -> None:
+        self._held.discard(key)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run(), name="lease-renewal")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def renew_once(self) -> int:
+        if not self._held:
+            return 0
+        return await self.renew(list(self._held), self.lease)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await self.renew_once()
+            except Exception as e:
+                logger.error(f"Lease renewal failed for {len(self._held)} items: {e}")
+
+
+class RedriveScheduler:
+    """
+    Polls ``claim(limit, lease)`` for records whose retry is due and hands each
+    to ``resubmit``. Claimed records are leased for ``lease`` seconds, so one
+    that is still in flight (or lost to a crash) is claimed again only after
+    the lease runs out; with ``leases``, claimed records are held there so
+    the lease is renewed until the pipeline releases them.
+    """
+
+    def __init__(
+        self,
+        claim: Callable[[int, float], Awaitable[List[Record]]],
+        resubmit: Callable[[Record], Awaitable[None]],
+        interval: float = 5.0,
+        batch_size: int = 100,
+        lease: float = 600.0,
+        leases: Optional[LeaseKeeper] = None,
+    ):
+        self.claim = claim
+        self.resubmit = resubmit
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lease = lease
+        self.leases = leases
+        self.redriven = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run(), name="redrive")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self) -> int:
+        records = await self.claim(self.batch_size, self.lease)
+        for record in records:
+            if self.leases is not None:
+                self.leases.hold(record["transcript_id"])
+            await self.resubmit(record)
+            self.redriven += 1
+        return len(records)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                claimed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Redrive pass failed: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.interval)
@@ -1,21 +1,91 @@
 """
 Analysis services: sentiment scoring, interest level, preparedness.
 """
-from ..api.models import Transcript, Analysis
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
 
+from api.models import Transcript, Analysis
+from metrics.registry import Counter
+from .cache import llm_cache
+from .llm import LLMError
+from .scheduler import llm_scheduler
+from .scoring import score_transcript
+from .summarizer import condense_conversation
 
-def analyze_transcript(transcript: Transcript) -> Analysis:
+ANALYSIS_PROMPT_VERSION = "analysis-v1"
+PREPAREDNESS_LEVELS = ("low", "medium", "high")
+# Local scores at or above this confidence skip the LLM; 0 never escalates, above 1 always does.
+ANALYSIS_CONFIDENCE_THRESHOLD = float(os.getenv("ANALYSIS_CONFIDENCE_THRESHOLD", "0.6"))
+
+ANALYSIS_PATH = Counter("analysis_path", "Transcripts analyzed locally or escalated to the LLM", ["path"])
+_LOCAL = ANALYSIS_PATH.labels("local")
+_ESCALATED = ANALYSIS_PATH.labels("llm")
+
+ANALYSIS_PROMPT = """Analyze this call between a Mount Doom visitor and an agent.
+Respond with a JSON object with exactly these keys:
+"sentiment": visitor sentiment from 0.0 (very negative) to 1.0 (very positive),
+"preparedness_level": one of "low", "medium", "high",
+"action_items": list of short follow-up actions for the agent.
+
+Transcript:
+{conversation}"""
+
+
+def _parse_analysis(text: str) -> Dict[str, Any]:
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise LLMError(f"Analysis response is not valid JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise LLMError("Analysis response is not a JSON object")
+    return data
+
+
+def analyze_locally(transcript: Transcript, threshold: Optional[float] = None) -> Optional[Analysis]:
     """
-    Perform sentiment analysis and derive other metrics.
+    Lexicon/metadata analysis when it is confident enough, else None (escalate to the LLM).
     """
-    # TODO: hook up sentiment model or service
-    sentiment_score = 0.5  # placeholder
-    interest_level = transcript.metadata.visitor_interest_level
-    preparedness_level = "medium"  # stub logic
-    action_items = ["[LLM GENERATED ACTION ITEM]"]
+    threshold = ANALYSIS_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    score = score_transcript(transcript)
+    if score.confidence >= threshold:
+        _LOCAL.inc()
+        return score.analysis
+    _ESCALATED.inc()
+    return None
+
+
+async def analyze_transcript(transcript: Transcript) -> Analysis:
+    """
+    Perform sentiment analysis and derive other metrics, locally when
+    confident and with an LLM call otherwise.
+    """
+    local = analyze_locally(transcript)
+    if local is not None:
+        return local
+    return await analyze_with_llm(transcript)
+
+
+async def analyze_with_llm(transcript: Transcript) -> Analysis:
+    """
+    LLM-based sentiment, preparedness and action items.
+    """
+    prompt = ANALYSIS_PROMPT.format(conversation=await condense_conversation(transcript))
+
+    async def call() -> Tuple[str, Optional[str]]:
+        response = await llm_scheduler.call(prompt, json_mode=True)
+        # validate before caching so a malformed answer is never reused
+        _parse_analysis(response.text)
+        return response.text, response.backend_model
+
+    data = _parse_analysis(await llm_cache.get_or_call(prompt, llm_scheduler.client.model, ANALYSIS_PROMPT_VERSION, call))
+    sentiment_score = min(1.0, max(0.0, float(data.get("sentiment", 0.5))))
+    preparedness_level = str(data.get("preparedness_level", "medium")).lower()
+    if preparedness_level not in PREPAREDNESS_LEVELS:
+        preparedness_level = "medium"
     return Analysis(
         sentiment=sentiment_score,
-        interest_level=interest_level,
+        interest_level=transcript.metadata.visitor_interest_level,
         preparedness_level=preparedness_level,
-        action_items=action_items
+        action_items=[str(item) for item in data.get("action_items") or []],
     )
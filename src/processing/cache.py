@@ -0,0 +1,173 @@
+"""
+Content-addressed, two-tier cache for LLM responses.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from storage import db
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse whitespace so formatting-only differences map to the same key.
+    """
+    return " ".join(text.split())
+
+
+def cache_key(prompt_input: str, model: str, prompt_version: str) -> str:
+    """
+    SHA-256 over model, prompt version and the normalized prompt input.
+    """
+    h = hashlib.sha256()
+    for part in (model, prompt_version, normalize_text(prompt_input)):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    In-process LRU (size- and TTL-bounded) in front of the persistent ``llm_cache`` table.
+
+    ``get_or_call`` returns a cached response when either tier has one and
+    otherwise runs ``call`` once, even if several tasks ask for the same key
+    concurrently, then stores the result in both tiers under the model that
+    actually produced it. Persistent writes happen behind the call: entries
+    stored while a write runs go out together in the next one, and ``flush``
+    waits for them. Failures of the persistent tier are logged and treated as
+    misses; they never fail the call.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: Optional[float] = 24 * 3600,
+        persistent: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persistent = persistent
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._unwritten: Dict[str, Dict[str, Any]] = {}
+        self._writer: Optional[asyncio.Task] = None
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            self.stats["expirations"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.persistent:
+            try:
+                value = await db.get_llm_cache_entry(key, max_age=self.ttl)
+            except Exception as e:
+                logger.warning(f"LLM cache lookup failed: {e}")
+                value = None
+            if value is not None:
+                self.stats["db_hits"] += 1
+                self._put_memory(key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: str, model: str, prompt_version: str) -> None:
+        """
+        Store ``value`` in memory now and queue it for the persistent tier.
+        """
+        self._put_memory(key, value)
+        if not self.persistent:
+            return
+        self._unwritten[key] = {
+            "key": key,
+            "model": model,
+            "prompt_version": prompt_version,
+            "response": value,
+            "created_at": datetime.utcnow(),
+        }
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.get_running_loop().create_task(self._write_behind())
+
+    async def _write_behind(self) -> None:
+        while self._unwritten:
+            rows, self._unwritten = list(self._unwritten.values()), {}
+            try:
+                await db.put_llm_cache_entries(rows)
+            except Exception as e:
+                logger.warning(f"LLM cache write of {len(rows)} entries failed: {e}")
+
+    async def flush(self) -> None:
+        """
+        Wait until every stored entry has been written to the persistent tier.
+        """
+        if self._writer is not None:
+            await self._writer
+
+    async def get_or_call(
+        self,
+        prompt_input: str,
+        model: str,
+        prompt_version: str,
+        call: Callable[[], Awaitable[Tuple[str, Optional[str]]]],
+    ) -> str:
+        """
+        Return the cached response for this input under ``model``, or compute
+        it with ``call``. ``call`` returns the response and the model that
+        produced it (None for ``model``), e.g. another backend after a
+        failover; the response is cached under that model.
+        """
+        key = cache_key(prompt_input, model, prompt_version)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self.get(key)
+            if value is None:
+                value, served_by = await call()
+                served_by = served_by or model
+                served_key = key if served_by == model else cache_key(prompt_input, served_by, prompt_version)
+                self.put(served_key, value, served_by, prompt_version)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # waiters re-raise it; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+
+llm_cache = LLMCache()
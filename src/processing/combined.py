@@ -0,0 +1,130 @@
+"""
+Single-call summarization, analysis and visitor assessment with structured output.
+"""
+import json
+import logging
+from typing import Optional, Tuple
+
+from pydantic import ValidationError
+
+from api.models import Transcript, StructuredData, Analysis, VisitorDetails
+from .analyzer import PREPAREDNESS_LEVELS, analyze_locally, analyze_with_llm
+from .cache import llm_cache
+from .extractor import extract_structured_data
+from .scheduler import llm_scheduler
+from .summarizer import condense_conversation, summarize_transcript
+
+logger = logging.getLogger(__name__)
+
+COMBINED_PROMPT_VERSION = "combined-v1"
+# Variant used when the analysis was already produced locally.
+COMBINED_NO_ANALYSIS_PROMPT_VERSION = "combined-no-analysis-v1"
+
+COMBINED_PROMPT = """You review calls between Mount Doom visitors and an agent.
+Respond with one JSON object with exactly this shape:
+{{
+  "summary": concise summary of the call,
+  "analysis": {{
+    "sentiment": visitor sentiment from 0.0 (very negative) to 1.0 (very positive),
+    "preparedness_level": one of "low", "medium", "high",
+    "action_items": list of short follow-up actions for the agent
+  }},
+  "visitor_details": {{
+    "hazard_knowledge": one of "low", "medium", "high", "unknown",
+    "fitness_level": one of "low", "medium", "high", "unknown",
+    "ring_bearer": true if the visitor carries the Ring, else false
+  }}
+}}
+
+Transcript:
+{conversation}"""
+
+COMBINED_NO_ANALYSIS_PROMPT = """You review calls between Mount Doom visitors and an agent.
+Respond with one JSON object with exactly this shape:
+{{
+  "summary": concise summary of the call,
+  "visitor_details": {{
+    "hazard_knowledge": one of "low", "medium", "high", "unknown",
+    "fitness_level": one of "low", "medium", "high", "unknown",
+    "ring_bearer": true if the visitor carries the Ring, else false
+  }}
+}}
+
+Transcript:
+{conversation}"""
+
+
+def _build(transcript: Transcript, text: str, analysis: Optional[Analysis] = None) -> Tuple[str, StructuredData, Analysis]:
+    """
+    Validate a combined response and merge it with metadata-derived fields.
+    A given ``analysis`` is used as is instead of the response's.
+    Raises ValueError (including ValidationError) if anything is missing or out of range.
+    """
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Combined response is not a JSON object")
+
+    summary = str(data.get("summary") or "").strip()
+    if not summary:
+        raise ValueError("Combined response has an empty summary")
+
+    if analysis is None:
+        md = transcript.metadata
+        analysis = Analysis.parse_obj({**data.get("analysis", {}), "interest_level": md.visitor_interest_level})
+        if not 0.0 <= analysis.sentiment <= 1.0:
+            raise ValueError(f"Sentiment {analysis.sentiment} outside [0, 1]")
+        if analysis.preparedness_level not in PREPAREDNESS_LEVELS:
+            raise ValueError(f"Unknown preparedness level {analysis.preparedness_level!r}")
+
+    structured = extract_structured_data(transcript)
+    visitor = VisitorDetails.parse_obj({
+        **structured.visitor_details.dict(),
+        **data.get("visitor_details", {}),
+        # metadata stays authoritative for these
+        "gear_prepared": structured.visitor_details.gear_prepared,
+        "permit_status": structured.visitor_details.permit_status,
+    })
+    return summary, StructuredData(visitor_details=visitor, questionnaire_completion=structured.questionnaire_completion), analysis
+
+
+async def process_combined(
+    transcript: Transcript, analysis: Optional[Analysis] = None
+) -> Tuple[str, StructuredData, Analysis]:
+    """
+    Produce summary, structured data and analysis from one LLM request.
+    With a locally computed ``analysis`` the request leaves analysis out.
+    """
+    if analysis is None:
+        template, version = COMBINED_PROMPT, COMBINED_PROMPT_VERSION
+    else:
+        template, version = COMBINED_NO_ANALYSIS_PROMPT, COMBINED_NO_ANALYSIS_PROMPT_VERSION
+    prompt = template.format(conversation=await condense_conversation(transcript))
+
+    async def call() -> Tuple[str, Optional[str]]:
+        response = await llm_scheduler.call(prompt, json_mode=True)
+        # validate before caching so a malformed answer is never reused
+        _build(transcript, response.text, analysis)
+        return response.text, response.backend_model
+
+    text = await llm_cache.get_or_call(prompt, llm_scheduler.client.model, version, call)
+    return _build(transcript, text, analysis)
+
+
+async def process_transcript(transcript: Transcript, combined: bool = True) -> Tuple[str, StructuredData, Analysis]:
+    """
+    Run all processing for a transcript, preferring the single combined call.
+    Confident local analysis keeps analysis out of the LLM request entirely.
+    Falls back to separate summarize/extract/analyze calls when the combined
+    response cannot be validated.
+    """
+    local = analyze_locally(transcript)
+    if combined:
+        try:
+            return await process_combined(transcript, local)
+        except (ValueError, TypeError, ValidationError) as e:
+            logger.warning(f"Combined processing failed for {transcript.transcript_id}, falling back: {e}")
+
+    summary = await summarize_transcript(transcript)
+    structured = extract_structured_data(transcript)
+    analysis = local if local is not None else await analyze_with_llm(transcript)
+    return summary, structured, analysis
@@ -1,7 +1,7 @@
 """
 Structured data extraction from transcript and metadata.
 """
-from ..api.models import Transcript, StructuredData, VisitorDetails, QuestionnaireCompletion
+from api.models import Transcript, StructuredData, VisitorDetails, QuestionnaireCompletion
 
 
 def extract_structured_data(transcript: Transcript) -> StructuredData:
@@ -0,0 +1,146 @@
+"""
+Minimal async client for an OpenAI-compatible chat completions API.
+"""
+import aiohttp
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from metrics.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+
+class LLMError(RuntimeError):
+    """
+    The LLM provider returned an error or an unusable response.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimitError(LLMError):
+    """
+    The provider throttled the request (HTTP 429).
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message, status=429)
+        self.retry_after = retry_after
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # set by LLMRouter: the backend that served the request and the model it was asked for
+    backend: Optional[str] = None
+    backend_model: Optional[str] = None
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class LLMClient:
+    """
+    Sends single-prompt chat completions over one pooled aiohttp session.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = "https://api.openai.com/v1",
+        model: str = DEFAULT_MODEL,
+        timeout: int = 60,
+        max_connections: int = 50,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def call(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+    ) -> LLMResponse:
+        """
+        Send ``prompt`` as a single user message and return the completion.
+        """
+        payload: Dict[str, Any] = {
+            "model": model or self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+        }
+        if max_tokens is not None:
+            payload["max_tokens"] = max_tokens
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        url = f"{self.base_url}/chat/completions"
+        try:
+            with tracer.span("llm.request", model=payload["model"], prompt_chars=len(prompt)):
+                async with self._get_session().post(url, json=payload, headers=headers) as resp:
+                    if resp.status == 429:
+                        raise RateLimitError("LLM rate limit exceeded", retry_after=_retry_after(resp.headers))
+                    if resp.status >= 400:
+                        body = await resp.text()
+                        raise LLMError(f"LLM request failed with {resp.status}: {body[:200]}", status=resp.status)
+                    data = await resp.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise LLMError(f"LLM request failed: {e}") from e
+
+        try:
+            text = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise LLMError(f"Malformed LLM response: {e}") from e
+        usage = data.get("usage") or {}
+        return LLMResponse(
+            text=text,
+            model=data.get("model", payload["model"]),
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
+
+
+llm_client = LLMClient.from_env()
@@ -0,0 +1,100 @@
+"""
+Prompt construction helpers: compact turn rendering, local token counting
+and splitting conversations into chunks that fit a token budget.
+
+Every prompt renders conversation text through ``render_turn``, so a
+transcript reads the same whether it is sent whole, in chunks, or after a
+session summary.
+"""
+import os
+from typing import Iterable, List
+
+from .scheduler import CHARS_PER_TOKEN, estimate_tokens
+
+# Conversation tokens one prompt may carry before it is summarized in chunks.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+# Conversation tokens per chunk when it is.
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "3000"))
+
+try:
+    import tiktoken
+
+    TOKEN_COUNTER = "tiktoken"
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text, disallowed_special=()))
+
+except ImportError:  # pragma: no cover - depends on installed extras
+    TOKEN_COUNTER = "estimate"
+
+    def count_tokens(text: str) -> int:
+        return estimate_tokens(text)
+
+
+def compact(text: str) -> str:
+    """
+    ``text`` on one line, with runs of whitespace collapsed to single spaces.
+    """
+    return " ".join(text.split())
+
+
+def render_turn(turn) -> str:
+    """
+    One ``speaker: text`` line, with the text's internal whitespace collapsed.
+    """
+    return f"{turn.speaker}: {compact(turn.text)}"
+
+
+def render_turns(turns: Iterable) -> str:
+    """
+    Render turns as ``speaker: text`` lines for prompts.
+    """
+    return "\n".join(render_turn(turn) for turn in turns)
+
+
+def render_conversation(transcript) -> str:
+    """
+    Render transcript turns as ``speaker: text`` lines for prompts.
+    """
+    return render_turns(transcript.transcript_text)
+
+
+def _split_line(line: str, budget: int) -> List[str]:
+    # a single turn longer than a whole chunk is cut on whitespace near the budget
+    pieces: List[str] = []
+    limit = budget * CHARS_PER_TOKEN
+    while count_tokens(line) > budget and len(line) > limit:
+        cut = line.rfind(" ", 0, limit)
+        cut = cut if cut > 0 else limit
+        pieces.append(line[:cut])
+        line = line[cut:].lstrip()
+    pieces.append(line)
+    return pieces
+
+
+def chunk_lines(lines: Iterable[str], budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Pack lines, in order, into newline-joined chunks of at most ``budget`` tokens each.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+    for line in lines:
+        for piece in _split_line(line, budget):
+            tokens = count_tokens(piece) + 1
+            if current and used + tokens > budget:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(piece)
+            used += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def chunk_turns(turns: Iterable, budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """
+    Rendered conversation split on turn boundaries into chunks of at most ``budget`` tokens.
+    """
+    return chunk_lines((render_turn(turn) for turn in turns), budget)
@@ -0,0 +1,252 @@
+"""
+Routing of LLM calls across backends, with hedging and failover.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, List, Optional, Sequence
+
+from metrics.registry import Counter, Histogram
+from .llm import LLMClient, LLMError, LLMResponse, RateLimitError, llm_client
+
+logger = logging.getLogger(__name__)
+
+BACKEND_LATENCY = Histogram("llm_backend_latency_seconds", "Latency of successful LLM requests, by backend", ["backend"])
+BACKEND_ERRORS = Counter("llm_backend_errors", "Failed LLM requests, by backend and kind", ["backend", "kind"])
+LLM_HEDGES = Counter("llm_hedges", "Hedged duplicate LLM requests, by outcome", ["outcome"])
+LLM_FAILOVERS = Counter("llm_failovers", "LLM requests retried on another backend after an error")
+
+_HEDGE_WON = LLM_HEDGES.labels("won")
+_HEDGE_LOST = LLM_HEDGES.labels("lost")
+
+
+@dataclass
+class Backend:
+    """
+    One provider endpoint. ``model`` overrides the requested model for it.
+    """
+    name: str
+    client: LLMClient
+    model: Optional[str] = None
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=512))
+    failures: int = 0
+    down_until: float = 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+class LLMRouter:
+    """
+    Drop-in for ``LLMClient.call`` that spreads requests over several backends.
+
+    * Backends are tried in order, skipping those marked down; a backend is
+      marked down for ``cooldown`` seconds after ``max_failures`` consecutive
+      errors. An error fails the request over to the next backend; a 429 from
+      every backend is re-raised as RateLimitError so the scheduler pauses.
+    * If a request is still running after the ``hedge_quantile`` latency of
+      its backend (at least ``min_hedge_delay``, and only once
+      ``min_samples`` latencies are known), one duplicate is sent to the next
+      available backend (the same one if it is alone). The first success wins
+      and the other request is cancelled. Hedges are limited to
+      ``hedge_budget`` of requests by a token bucket that earns that fraction
+      of a hedge per request, and must be admitted by ``admit_hedge`` (set by
+      the LLMScheduler in front of the router, so hedges spend its request
+      and token budgets).
+    * The hedge delay is taken from the latencies of every finished request,
+      failed ones included, so slow errors count towards it; a request
+      cancelled after losing a hedge race counts with its time so far.
+    """
+
+    def __init__(
+        self,
+        backends: Sequence[Backend],
+        hedge_quantile: float = 0.95,
+        hedge_budget: float = 0.05,
+        min_hedge_delay: float = 0.05,
+        min_samples: int = 20,
+        max_failures: int = 3,
+        cooldown: float = 30.0,
+    ):
+        if not backends:
+            raise ValueError("LLMRouter needs at least one backend")
+        self.backends = list(backends)
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.stats = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+        # start with one hedge available so the first straggler can be hedged
+        self._hedge_tokens = 1.0
+        self.admit_hedge: Optional[Callable[[str, Optional[int]], bool]] = None
+
+    @classmethod
+    def from_env(cls) -> "LLMRouter":
+        """
+        Backends from ``LLM_BACKENDS``, a JSON list of
+        ``{"name", "base_url", "model", "api_key_env"}`` objects; by default a
+        single backend using the shared ``llm_client``.
+        """
+        spec = os.getenv("LLM_BACKENDS")
+        if not spec:
+            backends = [Backend("default", llm_client)]
+        else:
+            backends = [
+                Backend(
+                    entry["name"],
+                    LLMClient(
+                        api_key=os.getenv(entry.get("api_key_env", "OPENAI_API_KEY")),
+                        base_url=entry["base_url"],
+                        **({"model": entry["model"]} if entry.get("model") else {}),
+                    ),
+                    model=entry.get("model"),
+                )
+                for entry in json.loads(spec)
+            ]
+        return cls(
+            backends,
+            hedge_quantile=float(os.getenv("LLM_HEDGE_QUANTILE", "0.95")),
+            hedge_budget=float(os.getenv("LLM_HEDGE_BUDGET", "0.05")),
+        )
+
+    @property
+    def model(self) -> str:
+        """
+        Model of the backend a request goes to first. Callers look up caches
+        under it; the response names the backend and model that served it.
+        """
+        first = self._order()[0]
+        return first.model or first.client.model
+
+    async def close(self) -> None:
+        await asyncio.gather(*(backend.client.close() for backend in self.backends))
+
+    def _order(self) -> List[Backend]:
+        available = [backend for backend in self.backends if backend.available]
+        return available or list(self.backends)
+
+    def _hedge_delay(self, backend: Backend) -> Optional[float]:
+        if len(backend.latencies) < self.min_samples:
+            return None
+        return max(self.min_hedge_delay, backend.percentile(self.hedge_quantile))
+
+    def _take_hedge_token(self, prompt: str, max_tokens: Optional[int]) -> bool:
+        if self._hedge_tokens < 1.0:
+            return False
+        if self.admit_hedge is not None and not self.admit_hedge(prompt, max_tokens):
+            return False
+        self._hedge_tokens -= 1.0
+        return True
+
+    async def _send(self, backend: Backend, prompt: str, model: Optional[str], max_tokens: Optional[int], json_mode: bool) -> LLMResponse:
+        started = time.monotonic()
+        model = backend.model or model
+        try:
+            response = await backend.client.call(prompt, model=model, max_tokens=max_tokens, json_mode=json_mode)
+        except asyncio.CancelledError:
+            # a request that lost a hedge race took at least this long; leaving it out
+            # would keep only the fast responses and pull the hedge delay down
+            backend.latencies.append(time.monotonic() - started)
+            raise
+        except RateLimitError:
+            BACKEND_ERRORS.labels(backend.name, "throttled").inc()
+            raise
+        except LLMError:
+            # a slow error delays the caller like a slow success does
+            backend.latencies.append(time.monotonic() - started)
+            BACKEND_ERRORS.labels(backend.name, "error").inc()
+            backend.failures += 1
+            if backend.failures >= self.max_failures:
+                backend.down_until = time.monotonic() + self.cooldown
+                logger.warning(f"LLM backend {backend.name} marked down for {self.cooldown:.0f}s after {backend.failures} failures")
+            raise
+        latency = time.monotonic() - started
+        backend.latencies.append(latency)
+        backend.failures = 0
+        BACKEND_LATENCY.labels(backend.name).observe(latency)
+        response.backend = backend.name
+        response.backend_model = model or backend.client.model
+        return response
+
+    async def _hedged(
+        self, order: List[Backend], prompt: str, model: Optional[str], max_tokens: Optional[int], json_mode: bool
+    ) -> LLMResponse:
+        """
+        Call ``order[0]``, hedging to the next backend if it is slow.
+        """
+        primary = order[0]
+        first = asyncio.create_task(self._send(primary, prompt, model, max_tokens, json_mode))
+        pending = {first}
+        hedged = False
+        try:
+            delay = self._hedge_delay(primary)
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done and self._take_hedge_token(prompt, max_tokens):
+                    hedged = True
+                    self.stats["hedges"] += 1
+                    secondary = order[1] if len(order) > 1 else primary
+                    pending.add(asyncio.create_task(self._send(secondary, prompt, model, max_tokens, json_mode)))
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.stats["hedge_wins"] += 1
+                            _HEDGE_WON.inc()
+                        elif hedged:
+                            _HEDGE_LOST.inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # the losing request, or everything if the caller was cancelled
+            for task in pending:
+                task.cancel()
+
+    async def call(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+    ) -> LLMResponse:
+        """
+        Send ``prompt`` to the best available backend, hedging stragglers and failing over on errors.
+        """
+        self.stats["requests"] += 1
+        self._hedge_tokens = min(1.0, self._hedge_tokens + self.hedge_budget)
+        order = self._order()
+        throttled: Optional[RateLimitError] = None
+        error: Optional[LLMError] = None
+        for i in range(len(order)):
+            if i:
+                self.stats["failovers"] += 1
+                LLM_FAILOVERS.inc()
+                logger.info(f"Failing over LLM request to backend {order[i].name}")
+            try:
+                return await self._hedged(order[i:], prompt, model, max_tokens, json_mode)
+            except RateLimitError as e:
+                throttled = e
+            except LLMError as e:
+                if e.status is not None and 400 <= e.status < 500:
+                    # the request itself is bad; another backend will reject it too
+                    raise
+                error = e
+        if error is None and throttled is not None:
+            raise throttled
+        raise error
@@ -0,0 +1,280 @@
+"""
+Shared LLM execution layer: rate budgets, adaptive concurrency and retries.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional, Union
+
+from metrics.registry import Counter, Gauge, Histogram
+from .llm import LLMClient, LLMError, LLMResponse, RateLimitError
+from .router import LLMRouter
+
+logger = logging.getLogger(__name__)
+
+LLM_CALLS = Counter("llm_calls", "LLM calls by outcome", ["outcome"])
+LLM_RETRIES = Counter("llm_retries", "LLM call retries, including throttled ones")
+LLM_THROTTLED = Counter("llm_throttled", "LLM calls rejected with 429")
+LLM_TOKENS = Counter("llm_tokens", "Tokens reported by the LLM provider", ["kind"])
+LLM_LATENCY = Histogram("llm_request_latency_seconds", "Latency of successful LLM requests")
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "LLM requests in flight")
+LLM_CONCURRENCY_LIMIT = Gauge("llm_concurrency_limit", "Current adaptive LLM concurrency limit")
+
+_LLM_OK = LLM_CALLS.labels("ok")
+_LLM_FAILED = LLM_CALLS.labels("failed")
+_PROMPT_TOKENS = LLM_TOKENS.labels("prompt")
+_COMPLETION_TOKENS = LLM_TOKENS.labels("completion")
+
+# Rough local estimate used to reserve tokens-per-minute budget before a call.
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket holding at most ``capacity`` tokens.
+    ``rate_per_minute`` of None disables the limit.
+    """
+
+    def __init__(self, rate_per_minute: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = capacity or rate_per_minute or 0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """
+        Wait until ``amount`` tokens are available and take them.
+        """
+        if self.rate is None:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        """
+        Take ``amount`` tokens if they are available now, without waiting.
+        """
+        if self.rate is None:
+            return True
+        amount = min(amount, self.capacity)
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+    def adjust(self, delta: float) -> None:
+        """
+        Correct a reservation once real usage is known (positive delta returns tokens).
+        """
+        if self.rate is None:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+class LLMScheduler:
+    """
+    Single gateway for LLM calls made by the processing modules.
+
+    * Requests-per-minute and tokens-per-minute budgets are enforced with
+      token buckets; token use is reserved from a local estimate and
+      corrected from the provider's reported usage.
+    * The in-flight limit follows AIMD: it grows by ``increase_step`` after
+      each fast success and is multiplied by ``decrease_factor`` on a 429 or
+      when latency exceeds ``latency_target`` (at most once per
+      ``decrease_cooldown`` seconds).
+    * A 429 pauses every caller until its Retry-After has elapsed; other
+      transient errors are retried with jittered exponential backoff.
+    * Hedged duplicates sent by an ``LLMRouter`` client draw from the same
+      budgets; a hedge is skipped when they have nothing left.
+    """
+
+    def __init__(
+        self,
+        client: Union[LLMClient, LLMRouter],
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        initial_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = 64,
+        latency_target: float = 20.0,
+        increase_step: float = 1.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+        max_retries: int = 5,
+        base_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.client = client
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.limit = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.in_flight = 0
+        self.stats = {"calls": 0, "throttled": 0, "retries": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._slots = asyncio.Condition()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        if isinstance(client, LLMRouter):
+            client.admit_hedge = self._admit_hedge
+
+    def scale_budgets(self, fraction: float) -> None:
+        """
+        Keep only ``fraction`` of the RPM/TPM budgets, e.g. when N processes share one provider quota.
+        """
+        for bucket in (self.requests, self.tokens):
+            if bucket.rate is not None:
+                bucket.rate *= fraction
+                bucket.capacity *= fraction
+                bucket.tokens = min(bucket.tokens, bucket.capacity)
+        self.max_concurrency = max(self.min_concurrency, int(self.max_concurrency * fraction))
+        self.limit = min(self.limit, self.max_concurrency)
+
+    async def _acquire_slot(self) -> None:
+        async with self._slots:
+            await self._slots.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def _release_slot(self) -> None:
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    async def _wait_if_paused(self) -> None:
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def _admit_hedge(self, prompt: str, max_tokens: Optional[int]) -> bool:
+        """
+        Charge a hedged duplicate to the rate budgets if both can cover it now.
+        """
+        reserved = estimate_tokens(prompt) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+        if not self.requests.try_acquire(1):
+            return False
+        if not self.tokens.try_acquire(reserved):
+            self.requests.adjust(1)
+            return False
+        return True
+
+    def _increase(self) -> None:
+        self.limit = min(self.max_concurrency, self.limit + self.increase_step / max(1.0, self.limit))
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        logger.info(f"LLM concurrency limit reduced to {int(self.limit)} ({reason})")
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    async def call(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        json_mode: bool = False,
+    ) -> LLMResponse:
+        """
+        Run one LLM call within the configured budgets, retrying throttled and transient failures.
+        """
+        reserved = estimate_tokens(prompt) + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+        attempt = 0
+        while True:
+            await self._wait_if_paused()
+            await self.requests.acquire(1)
+            await self.tokens.acquire(reserved)
+            await self._acquire_slot()
+            started = time.monotonic()
+            try:
+                response = await self.client.call(prompt, model=model, max_tokens=max_tokens, json_mode=json_mode)
+            except RateLimitError as e:
+                self.stats["throttled"] += 1
+                LLM_THROTTLED.inc()
+                self.tokens.adjust(reserved)
+                delay = e.retry_after if e.retry_after is not None else self._backoff(attempt)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._decrease("throttled")
+            except LLMError as e:
+                self.tokens.adjust(reserved)
+                if e.status is not None and 400 <= e.status < 500:
+                    self.stats["failures"] += 1
+                    _LLM_FAILED.inc()
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                latency = time.monotonic() - started
+                LLM_LATENCY.observe(latency)
+                if latency > self.latency_target:
+                    self._decrease(f"latency {latency:.1f}s")
+                else:
+                    self._increase()
+                used = response.prompt_tokens + response.completion_tokens
+                if used:
+                    self.tokens.adjust(reserved - used)
+                self.stats["calls"] += 1
+                self.stats["prompt_tokens"] += response.prompt_tokens
+                self.stats["completion_tokens"] += response.completion_tokens
+                _LLM_OK.inc()
+                _PROMPT_TOKENS.inc(response.prompt_tokens)
+                _COMPLETION_TOKENS.inc(response.completion_tokens)
+                return response
+            finally:
+                await self._release_slot()
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.stats["failures"] += 1
+                _LLM_FAILED.inc()
+                raise LLMError(f"LLM call failed after {self.max_retries} retries")
+            self.stats["retries"] += 1
+            LLM_RETRIES.inc()
+            await asyncio.sleep(delay)
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    return float(value) if value else None
+
+
+llm_scheduler = LLMScheduler(
+    LLMRouter.from_env(),
+    requests_per_minute=_env_float("LLM_RPM"),
+    tokens_per_minute=_env_float("LLM_TPM"),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "64")),
+)
+LLM_IN_FLIGHT.set_function(lambda: llm_scheduler.in_flight)
+LLM_CONCURRENCY_LIMIT.set_function(lambda: int(llm_scheduler.limit))
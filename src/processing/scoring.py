@@ -0,0 +1,142 @@
+"""
+Deterministic local scoring of sentiment and preparedness with a confidence estimate.
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from api.models import Transcript, Analysis
+
+WORD_RE = re.compile(r"[a-z']+")
+
+# Polarity lexicon tuned to visitor calls; weights are in [-1, 1].
+LEXICON: Dict[str, float] = {
+    **dict.fromkeys(
+        ("great", "excellent", "perfect", "love", "amazing", "wonderful", "fantastic", "thrilled", "excited"), 1.0
+    ),
+    **dict.fromkeys(
+        ("good", "thanks", "thank", "happy", "glad", "helpful", "ready", "prepared", "sure", "confident",
+         "appreciate", "clear", "nice", "fine", "okay", "ok", "yes", "interested", "safe", "understood"), 0.6
+    ),
+    **dict.fromkeys(
+        ("terrible", "awful", "hate", "furious", "disaster", "horrible", "outraged", "unacceptable", "worst"), -1.0
+    ),
+    **dict.fromkeys(
+        ("bad", "worried", "afraid", "scared", "confused", "unsure", "problem", "issue", "angry", "upset",
+         "frustrated", "annoyed", "expensive", "dangerous", "difficult", "denied", "refuse", "cancel",
+         "complaint", "disappointed", "unprepared", "lost"), -0.6
+    ),
+}
+NEGATORS = frozenset(("not", "never", "don't", "doesn't", "didn't", "isn't", "wasn't", "can't", "won't", "without"))
+NEGATION_WINDOW = 3
+AGENT_SPEAKERS = frozenset(("agent", "assistant", "operator"))
+
+# Share of the preparedness score contributed by each questionnaire flag.
+PREPAREDNESS_WEIGHTS = {
+    "risk_acknowledged": 0.3,
+    "gear_discussed": 0.25,
+    "experience_assessed": 0.2,
+    "purpose_of_visit_asked": 0.1,
+    "any_items_to_dispose_of_asked": 0.05,
+}
+PERMIT_SCORES = {"approved": 0.1, "granted": 0.1, "valid": 0.1, "pending": 0.05}
+PREPAREDNESS_THRESHOLDS = (("high", 0.75), ("medium", 0.45), ("low", 0.0))
+
+# Sentiment evidence (summed lexicon weight) at which confidence reaches ~63%.
+EVIDENCE_SCALE = 3.0
+
+
+@dataclass
+class LocalScore:
+    analysis: Analysis
+    confidence: float
+    sentiment_confidence: float
+    preparedness_confidence: float
+
+
+def _visitor_texts(transcript: Transcript) -> List[str]:
+    texts = [turn.text for turn in transcript.transcript_text if turn.speaker.lower() not in AGENT_SPEAKERS]
+    return texts or [turn.text for turn in transcript.transcript_text]
+
+
+def _polarity(texts: Sequence[str]) -> Tuple[float, float]:
+    """
+    Positive and negative evidence over one transcript's visitor turns: (pos, neg).
+    A negator within NEGATION_WINDOW tokens before a word flips and halves its weight.
+    """
+    pos = neg = 0.0
+    for text in texts:
+        tokens = WORD_RE.findall(text.lower())
+        for i, token in enumerate(tokens):
+            weight = LEXICON.get(token)
+            if weight is None:
+                continue
+            if any(t in NEGATORS for t in tokens[max(0, i - NEGATION_WINDOW):i]):
+                weight = -weight * 0.5
+            if weight > 0:
+                pos += weight
+            else:
+                neg -= weight
+    return pos, neg
+
+
+def _sentiment(pos: float, neg: float) -> Tuple[float, float]:
+    # Laplace-smoothed share of positive evidence; no evidence means neutral 0.5.
+    sentiment = (pos + 1.0) / (pos + neg + 2.0)
+    evidence = pos + neg
+    agreement = abs(pos - neg) / evidence if evidence else 0.0
+    confidence = (1.0 - math.exp(-evidence / EVIDENCE_SCALE)) * (0.5 + 0.5 * agreement)
+    return sentiment, confidence
+
+
+def _preparedness(transcript: Transcript) -> Tuple[str, float, float]:
+    md = transcript.metadata
+    flags = md.questionnaire.dict()
+    score = sum(weight for name, weight in PREPAREDNESS_WEIGHTS.items() if flags.get(name))
+    score += PERMIT_SCORES.get(md.mount_doom_permit_status.lower(), 0.0)
+    level = next(name for name, threshold in PREPAREDNESS_THRESHOLDS if score >= threshold)
+    # confidence grows with the distance to the nearest level boundary
+    margin = min(abs(score - threshold) for _, threshold in PREPAREDNESS_THRESHOLDS[:-1])
+    return level, score, min(1.0, 0.5 + 4.0 * margin)
+
+
+def _action_items(transcript: Transcript) -> List[str]:
+    md = transcript.metadata
+    q = md.questionnaire
+    items = []
+    if not q.risk_acknowledged:
+        items.append("Confirm the visitor acknowledges the risks")
+    if not q.gear_discussed:
+        items.append("Review required gear with the visitor")
+    if not q.experience_assessed:
+        items.append("Assess the visitor's climbing experience")
+    permit = md.mount_doom_permit_status.lower()
+    if permit not in PERMIT_SCORES:
+        items.append(f"Resolve permit status ({md.mount_doom_permit_status})")
+    elif permit == "pending":
+        items.append("Follow up on the pending permit")
+    if md.potential_issue and md.potential_issue.lower() not in ("none", "n/a"):
+        items.append(f"Address potential issue: {md.potential_issue}")
+    return items
+
+
+def score_transcript(transcript: Transcript) -> LocalScore:
+    """
+    Score one transcript. Cost is one regex pass and one dict lookup per
+    token of the visitor's turns, so it is linear in the text and needs no I/O.
+    """
+    sentiment, sentiment_confidence = _sentiment(*_polarity(_visitor_texts(transcript)))
+    level, _, preparedness_confidence = _preparedness(transcript)
+    analysis = Analysis(
+        sentiment=round(sentiment, 3),
+        interest_level=transcript.metadata.visitor_interest_level,
+        preparedness_level=level,
+        action_items=_action_items(transcript),
+    )
+    return LocalScore(
+        analysis=analysis,
+        confidence=min(sentiment_confidence, preparedness_confidence),
+        sentiment_confidence=sentiment_confidence,
+        preparedness_confidence=preparedness_confidence,
+    )
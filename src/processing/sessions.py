@@ -0,0 +1,192 @@
+"""
+Session state for incremental processing of multi-part sessions.
+
+A session often produces several transcripts whose turn lists grow: each one
+repeats the turns of the previous one and adds more. Once a transcript is
+processed, its session's state (how many turns it had, a fingerprint of
+them, its summary and analysis) is kept. A later transcript of the session
+whose first turns match that fingerprint is then prompted with the earlier
+summary plus only its new turns.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence
+
+from api.models import Transcript
+from metrics.registry import Counter
+from storage import db
+from .prompts import compact
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+# Transcripts whose session lookup is remembered until they are recorded; far more than are in flight.
+SESSION_LOOKUPS_KEPT = 4096
+# First line of a prompt input that starts from an earlier summary of the session.
+SESSION_HEADER = "Summary of the earlier part of this call:"
+NEW_TURNS_HEADER = "The call continued:"
+
+SESSION_CONTEXT = Counter("session_context", "Prompt inputs built from scratch or from earlier session state", ["path"])
+SESSION_TURNS_REUSED = Counter("session_turns_reused", "Turns replaced by an earlier summary of their session")
+
+_INCREMENTAL = SESSION_CONTEXT.labels("incremental")
+_FULL = SESSION_CONTEXT.labels("full")
+
+
+def turns_fingerprint(turns: Sequence) -> str:
+    """
+    SHA-256 over the speakers and texts of ``turns`` as prompts render them.
+    """
+    h = hashlib.sha256()
+    for turn in turns:
+        h.update(turn.speaker.encode())
+        h.update(b"\0")
+        h.update(compact(turn.text).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@dataclass
+class SessionState:
+    """
+    What is known about a session after processing ``transcript_id``, its longest transcript so far.
+    """
+    session_id: str
+    transcript_id: str
+    turn_count: int
+    fingerprint: str
+    summary: str
+    analysis: Optional[Dict[str, Any]] = None
+
+    def extended_by(self, transcript: Transcript) -> bool:
+        """
+        True if ``transcript`` starts with exactly the turns this state covers and adds more.
+        """
+        turns = transcript.transcript_text
+        return 0 < self.turn_count < len(turns) and turns_fingerprint(turns[: self.turn_count]) == self.fingerprint
+
+    def render(self) -> str:
+        lines = [SESSION_HEADER, compact(self.summary)]
+        if self.analysis:
+            assessment = (
+                f"Assessment so far: sentiment {float(self.analysis.get('sentiment', 0.5)):.2f}, "
+                f"preparedness {self.analysis.get('preparedness_level', 'unknown')}"
+            )
+            actions = self.analysis.get("action_items") or []
+            if actions:
+                assessment += "; open actions: " + "; ".join(str(item) for item in actions)
+            lines.append(assessment)
+        return "\n".join(lines)
+
+
+class SessionStore:
+    """
+    In-process LRU of session states in front of the persistent ``session_states`` table.
+
+    ``previous`` returns the state a transcript extends, if any; ``record``
+    updates the in-process entry after a transcript is processed and returns
+    the row to persist (the pipeline writes it through the BatchWriter).
+    Failures of the persistent tier are logged and treated as misses.
+
+    The summary, analysis and combined prompts of one transcript each ask
+    ``previous``; the lookup runs and is counted once per transcript, and
+    every prompt sees the same state, until ``record`` forgets it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_CACHE_SIZE,
+        persistent: bool = True,
+        enabled: bool = True,
+        max_lookups: int = SESSION_LOOKUPS_KEPT,
+    ):
+        self.max_entries = max_entries
+        self.persistent = persistent
+        self.enabled = enabled
+        self.max_lookups = max_lookups
+        self._entries: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lookups: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "incremental": 0, "full": 0, "turns_reused": 0}
+
+    def _put_memory(self, state: SessionState) -> None:
+        self._entries[state.session_id] = state
+        self._entries.move_to_end(state.session_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        state = self._entries.get(session_id)
+        if state is not None:
+            self.stats["memory_hits"] += 1
+            self._entries.move_to_end(session_id)
+            return state
+        if self.persistent:
+            try:
+                row = await db.get_session_state(session_id)
+            except Exception as e:
+                logger.warning(f"Session state lookup failed: {e}")
+                row = None
+            if row is not None:
+                self.stats["db_hits"] += 1
+                state = SessionState(**row)
+                self._put_memory(state)
+                return state
+        self.stats["misses"] += 1
+        return None
+
+    async def previous(self, transcript: Transcript) -> Optional[SessionState]:
+        """
+        State of an earlier transcript of the same session whose turns ``transcript`` repeats and extends.
+        """
+        lookup = self._lookups.get(transcript.transcript_id)
+        if lookup is None:
+            lookup = asyncio.ensure_future(self._previous(transcript))
+            self._lookups[transcript.transcript_id] = lookup
+            while len(self._lookups) > self.max_lookups:
+                self._lookups.popitem(last=False)
+        else:
+            self._lookups.move_to_end(transcript.transcript_id)
+        return await asyncio.shield(lookup)
+
+    async def _previous(self, transcript: Transcript) -> Optional[SessionState]:
+        state = await self.get(transcript.session_id) if self.enabled else None
+        if state is None or not state.extended_by(transcript):
+            self.stats["full"] += 1
+            _FULL.inc()
+            return None
+        self.stats["incremental"] += 1
+        self.stats["turns_reused"] += state.turn_count
+        _INCREMENTAL.inc()
+        SESSION_TURNS_REUSED.inc(state.turn_count)
+        return state
+
+    def record(self, transcript: Transcript, summary: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Remember ``transcript`` as the latest state of its session and return
+        the row to persist, or None if a transcript with at least as many
+        turns was already recorded for the session.
+        """
+        self._lookups.pop(transcript.transcript_id, None)
+        if not self.enabled:
+            return None
+        turns = transcript.transcript_text
+        current = self._entries.get(transcript.session_id)
+        if current is not None and current.turn_count >= len(turns):
+            return None
+        state = SessionState(
+            session_id=transcript.session_id,
+            transcript_id=transcript.transcript_id,
+            turn_count=len(turns),
+            fingerprint=turns_fingerprint(turns),
+            summary=summary,
+            analysis=analysis,
+        )
+        self._put_memory(state)
+        return asdict(state)
+
+
+session_store = SessionStore()
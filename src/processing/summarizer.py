@@ -1,17 +1,106 @@
 """
 LLM-based summarization of transcript text.
 """
-from typing import List
-from pydantic import ValidationError
-from ..api.models import Transcript, ProcessedResult, StructuredData, Analysis
+import asyncio
+from typing import List, Optional, Sequence, Tuple
 
+from api.models import Transcript
+from .cache import llm_cache
+from .prompts import CHUNK_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET, chunk_lines, chunk_turns, compact, count_tokens, render_turns
+from .scheduler import llm_scheduler
+from .sessions import NEW_TURNS_HEADER, SESSION_HEADER, session_store
 
-def summarize_transcript(transcript: Transcript) -> str:
+SUMMARY_PROMPT_VERSION = "summary-v1"
+CHUNK_PROMPT_VERSION = "summary-chunk-v1"
+REDUCE_PROMPT_VERSION = "summary-reduce-v1"
+SESSION_PROMPT_VERSION = "summary-session-v1"
+
+SUMMARY_PROMPT = "Summarize the following transcript:\n{conversation}\nSummary:"
+CHUNK_PROMPT = """This is part {part} of {parts} of a call between a Mount Doom visitor and an agent.
+Summarize this part, keeping every fact about the visitor, their gear, risks, permits and agreed actions.
+
+{conversation}
+Summary:"""
+REDUCE_PROMPT = """These are summaries of consecutive parts of one call between a Mount Doom visitor and an agent.
+Combine them into one concise summary of the whole call.
+
+{conversation}
+Summary:"""
+SESSION_PROMPT = """This is a call between a Mount Doom visitor and an agent: a summary of its earlier part, then the turns that followed.
+Write one concise summary of the whole call.
+
+{conversation}
+Summary:"""
+# Prefix marking a conversation that was condensed into part summaries.
+CONDENSED_HEADER = "Summaries of consecutive parts of the call:"
+
+
+async def _summarize(prompt: str, version: str) -> str:
+    async def call() -> Tuple[str, Optional[str]]:
+        response = await llm_scheduler.call(prompt)
+        return response.text.strip(), response.backend_model
+
+    return await llm_cache.get_or_call(prompt, llm_scheduler.client.model, version, call)
+
+
+async def _summarize_chunks(chunks: List[str]) -> List[str]:
+    """
+    Summarize every chunk concurrently; the scheduler bounds the actual parallelism.
+    """
+    return await asyncio.gather(*(
+        _summarize(CHUNK_PROMPT.format(part=i + 1, parts=len(chunks), conversation=chunk), CHUNK_PROMPT_VERSION)
+        for i, chunk in enumerate(chunks)
+    ))
+
+
+async def _condense_turns(turns: Sequence, budget: int) -> str:
+    conversation = render_turns(turns)
+    if count_tokens(conversation) <= budget:
+        return conversation
+    partials = await _summarize_chunks(chunk_turns(turns, CHUNK_TOKEN_BUDGET))
+    lines = [f"Part {i + 1}: {compact(text)}" for i, text in enumerate(partials)]
+    while count_tokens("\n".join(lines)) > budget:
+        chunks = chunk_lines(lines, CHUNK_TOKEN_BUDGET)
+        if len(chunks) >= len(lines):
+            # summaries too long to merge any further; go slightly over budget instead
+            break
+        partials = await _summarize_chunks(chunks)
+        lines = [f"Part {i + 1}: {compact(text)}" for i, text in enumerate(partials)]
+    return CONDENSED_HEADER + "\n" + "\n".join(lines)
+
+
+async def condense_conversation(transcript: Transcript) -> str:
+    """
+    The conversation as prompt input within PROMPT_TOKEN_BUDGET: rendered as
+    is when it fits, otherwise split into chunks that are summarized in
+    parallel (repeatedly, if the part summaries still do not fit).
+    Chunk summaries are cached, so the summary and analysis of one
+    transcript share them.
+
+    If an earlier transcript of the same session covered the first turns,
+    they are replaced by its summary and assessment and only the new turns
+    are rendered (see processing.sessions).
+    """
+    previous = await session_store.previous(transcript)
+    if previous is None:
+        return await _condense_turns(transcript.transcript_text, PROMPT_TOKEN_BUDGET)
+    context = previous.render()
+    new_turns = await _condense_turns(
+        transcript.transcript_text[previous.turn_count:], max(CHUNK_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET - count_tokens(context))
+    )
+    return f"{context}\n{NEW_TURNS_HEADER}\n{new_turns}"
+
+
+async def summarize_transcript(transcript: Transcript) -> str:
     """
     Generate a concise summary of the transcript using an LLM.
+    Conversations over the prompt budget are summarized in parallel chunks
+    and then reduced; a transcript continuing an earlier one of its session
+    updates that one's summary. Identical prompts are served from the LLM cache.
     """
-    # TODO: Integrate with actual LLM service (OpenAI, etc.)
-    prompt = f"Summarize the following transcript:\n{transcript.transcript_text}\nSummary:" 
-    response = llm_client.call(prompt)
-    summary = response.text.strip()
-    return summary
\ No newline at end of file
+    conversation = await condense_conversation(transcript)
+    if conversation.startswith(SESSION_HEADER):
+        return await _summarize(SESSION_PROMPT.format(conversation=conversation), SESSION_PROMPT_VERSION)
+    if conversation.startswith(CONDENSED_HEADER):
+        return await _summarize(REDUCE_PROMPT.format(conversation=conversation), REDUCE_PROMPT_VERSION)
+    return await _summarize(SUMMARY_PROMPT.format(conversation=conversation), SUMMARY_PROMPT_VERSION)
@@ -0,0 +1,249 @@
+# file: src/replay.py
+"""
+Replay mode: reprocess stored raw transcripts through the LLM stages, e.g.
+after a prompt or model change, without touching the live stream.
+
+Rows are read from raw_transcripts page by page (keyset pagination), at an
+optional rate limit, and results are written as versioned rows to
+processed_result_versions. Submission to the API is off unless --submit is
+given; --promote also replaces the live processed_results rows.
+
+    python src/replay.py --since 2025-05-01 --agent-type customer_service --rate 20 --version summary-v2
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import signal
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import app
+from api.batcher import SubmissionBatcher
+from api.client import APIClient
+from api.models import Transcript
+from pipeline.executor import Pipeline, Stage
+from processing import analyzer, combined, summarizer
+from processing.cache import llm_cache
+from processing.scheduler import TokenBucket, llm_scheduler
+from processing.sessions import session_store
+from storage import db
+from storage.db import init_db
+from storage.writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+# Configuration parameters
+REPLAY_PAGE_SIZE = 500
+REPLAY_PROGRESS_INTERVAL = 10.0
+
+
+def version_inputs(mode: str) -> Dict[str, Any]:
+    """
+    Everything that shapes a replayed result in ``mode``: the model, every
+    prompt version the mode can reach (combined mode falls back to the
+    separate calls) and the local-analysis and prompt-size settings.
+    """
+    inputs: Dict[str, Any] = {
+        "model": llm_scheduler.client.model,
+        "summary": summarizer.SUMMARY_PROMPT_VERSION,
+        "chunk": summarizer.CHUNK_PROMPT_VERSION,
+        "reduce": summarizer.REDUCE_PROMPT_VERSION,
+        "session": summarizer.SESSION_PROMPT_VERSION,
+        "analysis": analyzer.ANALYSIS_PROMPT_VERSION,
+        "confidence_threshold": analyzer.ANALYSIS_CONFIDENCE_THRESHOLD,
+        "prompt_token_budget": summarizer.PROMPT_TOKEN_BUDGET,
+        "chunk_token_budget": summarizer.CHUNK_TOKEN_BUDGET,
+    }
+    if mode == "combined":
+        inputs["combined"] = combined.COMBINED_PROMPT_VERSION
+        inputs["combined_no_analysis"] = combined.COMBINED_NO_ANALYSIS_PROMPT_VERSION
+    return inputs
+
+
+def default_version(mode: str) -> str:
+    """
+    Version label ``<model>+<mode>+<digest>``, the digest covering every
+    entry of ``version_inputs``, so changing any of them starts a new version.
+    """
+    inputs = version_inputs(mode)
+    digest = hashlib.sha256("\n".join(f"{name}={value}" for name, value in sorted(inputs.items())).encode())
+    return f"{inputs['model']}+{mode}+{digest.hexdigest()[:12]}"
+
+
+class ReplayProgress:
+    """
+    Counts finished transcripts and renders progress with rate and ETA.
+    """
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def line(self) -> str:
+        finished = self.done + self.failed
+        elapsed = time.monotonic() - self.started
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - finished) / rate if rate > 0 else float("inf")
+        percent = 100.0 * finished / self.total if self.total else 100.0
+        eta_text = f"{eta:.0f}s" if eta != float("inf") else "?"
+        return (
+            f"Replayed {finished}/{self.total} ({percent:.1f}%), {self.failed} failed, "
+            f"{rate:.1f}/s, ETA {eta_text}"
+        )
+
+
+def build_replay_pipeline(
+    writer: BatchWriter,
+    version: str,
+    progress: ReplayProgress,
+    batcher: Optional[SubmissionBatcher] = None,
+    promote: bool = False,
+    mode: Optional[str] = None,
+) -> Pipeline:
+    """
+    The live LLM stages followed by a versioned persist and, with a
+    ``batcher``, submission. Failures are logged and counted, never redriven.
+    """
+    llm_stages = app.build_llm_stages(mode=mode)
+
+    async def persist(ctx):
+        result = app.build_result(ctx)
+        saved = [await writer.save_version({**result.dict(), "version": version})]
+        if promote:
+            saved.append(await writer.save_processed(result.dict()))
+        await asyncio.gather(*saved)
+        return result
+
+    stages = [
+        *llm_stages,
+        Stage(
+            "persist",
+            persist,
+            depends_on=[stage.name for stage in llm_stages],
+            concurrency=app.DB_STAGE_CONCURRENCY,
+            queue_size=app.STAGE_QUEUE_SIZE,
+        ),
+    ]
+    if batcher is not None:
+        async def submit(ctx):
+            return await (await batcher.submit(ctx["persist"]))
+
+        stages.append(
+            Stage("submit", submit, depends_on=["persist"], concurrency=app.SUBMIT_STAGE_CONCURRENCY, queue_size=app.STAGE_QUEUE_SIZE)
+        )
+
+    async def on_complete(ctx):
+        progress.done += 1
+
+    async def on_error(ctx, stage, exc):
+        progress.failed += 1
+        logger.error(f"Replay of {ctx['transcript'].transcript_id} failed in {stage}: {exc!r}")
+
+    return Pipeline(stages, on_complete=on_complete, on_error=on_error)
+
+
+async def _report(progress: ReplayProgress, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(progress.line())
+
+
+async def replay(args: argparse.Namespace) -> ReplayProgress:
+    await init_db()
+    # every turn is reprocessed, rather than reusing session summaries made by older prompts
+    session_store.enabled = False
+    mode = args.mode or app.PROCESSING_MODE
+    version = args.version or default_version(mode)
+    if not args.version:
+        logger.info(f"Replaying as version {version} from {version_inputs(mode)}")
+    filters: Dict[str, Any] = {
+        "since": args.since,
+        "until": args.until,
+        "session_id": args.session,
+        "agent_type": args.agent_type,
+    }
+    progress = ReplayProgress(await db.count_raw_transcripts(**filters))
+    logger.info(f"Replaying {progress.total} stored transcripts as version {version!r} (submit={args.submit})")
+
+    client: Optional[APIClient] = None
+    batcher: Optional[SubmissionBatcher] = None
+    if args.submit:
+        client = APIClient(app.API_KEY, app.BASE_URL)
+        await client.authenticate()
+        batcher = SubmissionBatcher(
+            client,
+            max_batch_size=app.SUBMIT_BATCH_SIZE,
+            max_delay=app.SUBMIT_BATCH_DELAY,
+            max_in_flight=app.SUBMIT_MAX_IN_FLIGHT,
+        )
+    writer = BatchWriter(flush_interval=app.DB_FLUSH_INTERVAL, max_batch_size=app.DB_BATCH_SIZE)
+    pipeline = build_replay_pipeline(writer, version, progress, batcher=batcher, promote=args.promote, mode=mode)
+    pipeline.start()
+    reporter_task = asyncio.create_task(_report(progress, args.progress_interval))
+    pacer = TokenBucket(args.rate * 60 if args.rate else None, capacity=max(1.0, args.rate))
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    # pages are fetched lazily and the pipeline's bounded queues block admission,
+    # so only a page plus the in-flight items are ever held in memory
+    async for page in db.iter_raw_transcripts(args.page_size, **filters):
+        for data in page:
+            if stop_event.is_set():
+                break
+            try:
+                transcript = Transcript.parse_obj(data)
+            except ValueError as e:
+                progress.failed += 1
+                logger.error(f"Skipping invalid stored transcript {data.get('transcript_id')}: {e}")
+                continue
+            await pacer.acquire(1)
+            await pipeline.submit({"transcript": transcript})
+        if stop_event.is_set():
+            logger.info("Shutdown signal received, draining replay...")
+            break
+
+    await pipeline.drain()
+    await pipeline.stop()
+    reporter_task.cancel()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.remove_signal_handler(sig)
+    app._log_stage_latency(pipeline)
+    logger.info(progress.line())
+    await writer.close()
+    await llm_cache.flush()
+    if batcher is not None:
+        await batcher.close()
+    if client is not None:
+        await client.close()
+    return progress
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--since", type=datetime.fromisoformat, help="received_at lower bound (UTC, inclusive)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="received_at upper bound (UTC, exclusive)")
+    parser.add_argument("--session", help="only this session_id")
+    parser.add_argument("--agent-type", help="only this agent_type")
+    parser.add_argument("--rate", type=float, default=0.0, help="transcripts per second, 0 for unlimited")
+    parser.add_argument("--version", help="result version label (default: model and prompt versions)")
+    parser.add_argument("--mode", choices=["combined", "separate"], help="PROCESSING_MODE for the replay")
+    parser.add_argument("--submit", action="store_true", help="also submit results to the API")
+    parser.add_argument("--promote", action="store_true", help="also replace the live processed_results rows")
+    parser.add_argument("--page-size", type=int, default=REPLAY_PAGE_SIZE)
+    parser.add_argument("--progress-interval", type=float, default=REPLAY_PROGRESS_INTERVAL)
+    args = parser.parse_args()
+
+    progress = asyncio.run(replay(args))
+    if progress.failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+# file: src/sharded.py
+"""
+Multi-process mode: one ingest process reads the transcript stream and
+shards it by session_id across N worker processes, each with its own event
+loop, DB pool, API session and stage pipeline.
+
+    python src/sharded.py --processes 4
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import zlib
+from contextlib import aclosing
+from typing import List
+
+import app
+from api.batcher import SubmissionBatcher
+from api.client import APIClient
+from api.models import LazyTranscript, RawRecord
+from api.stream import ResumableStream
+from metrics.loop import LoopMonitor
+from metrics.server import start_metrics_server
+from metrics.tracing import tracer
+from processing.cache import llm_cache
+from processing.scheduler import llm_scheduler
+from storage.db import engine, init_db, save_checkpoint
+from storage.dedupe import SeenFilter
+from storage.writer import BatchWriter
+from workqueue.queue import AsyncQueue
+
+logger = logging.getLogger(__name__)
+
+# Configuration parameters
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", str(os.cpu_count() or 1)))
+SHARD_QUEUE_MAXSIZE = 64  # batches buffered per shard before ingest blocks
+SHARD_BATCH_SIZE = 64
+SHARD_BATCH_DELAY = 0.01
+SHARD_MONITOR_INTERVAL = 1.0
+# How often shards report durable transcripts back to ingest, which checkpoints the stream behind them.
+SHARD_ACK_INTERVAL = 0.5
+# "auto" uses uvloop when it is installed, "uvloop" requires it, "asyncio" never uses it.
+EVENT_LOOP = os.getenv("EVENT_LOOP", "auto")
+
+
+def install_event_loop(name: str) -> str:
+    """
+    Install the requested event loop policy and return the implementation in use.
+    """
+    if name == "asyncio":
+        return "asyncio"
+    try:
+        import uvloop
+    except ImportError:
+        if name == "uvloop":
+            raise
+        return "asyncio"
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return "uvloop"
+
+
+def shard_for(session_id: str, shards: int) -> int:
+    """
+    Stable shard index, so every transcript of a session lands on the same process.
+    """
+    return zlib.crc32(session_id.encode()) % shards
+
+
+def run_shard(index: int, shards: int, inbox: mp.Queue, acks: mp.Queue, event_loop: str) -> None:
+    """
+    Worker process entry point.
+    """
+    # Ctrl-C reaches the whole process group; shutdown is driven by the ingest process.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    loop_name = install_event_loop(event_loop)
+    logger.info(f"Shard {index} starting on {loop_name} (pid {os.getpid()})")
+    asyncio.run(_shard_main(index, shards, inbox, acks))
+
+
+class AckBatcher:
+    """
+    Collects the ids of transcripts a shard no longer needs replayed
+    (persisted, recorded for redrive, or skipped) and sends them to ingest
+    in batches.
+    """
+
+    def __init__(self, acks: mp.Queue):
+        self.acks = acks
+        self._pending: List[str] = []
+
+    def add(self, transcript_id: str) -> None:
+        self._pending.append(transcript_id)
+
+    def flush(self) -> None:
+        if self._pending:
+            # unbounded queue: put hands the batch to its feeder thread without blocking
+            self.acks.put(self._pending)
+            self._pending = []
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(SHARD_ACK_INTERVAL)
+            self.flush()
+
+
+def _next_batch(inbox: mp.Queue):
+    """
+    The next batch of records from ingest, or None at the end of the stream or
+    once the ingest process has died without sending it.
+    """
+    ingest_process = mp.parent_process()
+    while True:
+        try:
+            return inbox.get(timeout=SHARD_MONITOR_INTERVAL)
+        except queue.Empty:
+            if ingest_process is not None and not ingest_process.is_alive():
+                logger.error("Ingest process exited without ending the stream, draining")
+                return None
+
+
+async def _shard_main(index: int, shards: int, inbox: mp.Queue, acks: mp.Queue) -> None:
+    # The provider quota is shared by every shard.
+    llm_scheduler.scale_budgets(1 / shards)
+    # Each shard exports its own metrics next to the ingest process's port.
+    metrics_runner = await start_metrics_server(app.METRICS_PORT + 1 + index) if app.METRICS_PORT else None
+    loop_monitor = LoopMonitor(app.LOOP_LAG_INTERVAL, app.LOOP_STALL_THRESHOLD)
+    loop_monitor.start()
+    if tracer.exporter is not None:
+        # one trace file per shard, so processes never interleave partial lines
+        tracer.exporter.path = f"{tracer.exporter.path}.shard-{index}"
+
+    client = APIClient(
+        app.API_KEY,
+        app.BASE_URL,
+        connection_limit=app.HTTP_POOL_LIMIT,
+        connection_limit_per_host=app.HTTP_POOL_LIMIT_PER_HOST,
+    )
+    await client.authenticate()
+    writer = BatchWriter(flush_interval=app.DB_FLUSH_INTERVAL, max_batch_size=app.DB_BATCH_SIZE)
+    batcher = SubmissionBatcher(
+        client,
+        max_batch_size=app.SUBMIT_BATCH_SIZE,
+        max_delay=app.SUBMIT_BATCH_DELAY,
+        max_in_flight=app.SUBMIT_MAX_IN_FLIGHT,
+    )
+    dlq = AsyncQueue()
+    app.export_queue_metrics("dlq", dlq)
+    seen_filter = SeenFilter(capacity=app.DEDUPE_CAPACITY)
+    await seen_filter.warm()
+
+    leases = app.build_leases()
+    leases.start()
+    durable = AckBatcher(acks)
+    acker_task = asyncio.create_task(durable.run())
+    pipeline = app.build_pipeline(writer, batcher, seen_filter, dlq, leases, on_durable=durable.add)
+    pipeline.start()
+    reporter_task = asyncio.create_task(app.report_stage_latency(pipeline))
+    redriver = app.build_redriver(pipeline, leases)
+    redriver.start()
+    autoscaler = app.build_autoscaler(pipeline)
+    if app.AUTOSCALE_INTERVAL:
+        autoscaler.start()
+
+    loop = asyncio.get_running_loop()
+    received = skipped = 0
+    while True:
+        batch = await loop.run_in_executor(None, _next_batch, inbox)
+        if batch is None:
+            break
+        for data in batch:
+            received += 1
+            record = RawRecord.from_bytes(data)
+            if record is None:
+                continue
+            if await seen_filter.seen(record.transcript_id):
+                skipped += 1
+                durable.add(record.transcript_id)
+                continue
+            try:
+                transcript = LazyTranscript.from_bytes(record.data)
+            except ValueError as e:
+                logger.error(f"Invalid transcript {record.transcript_id}: {e}")
+                durable.add(record.transcript_id)
+                continue
+            seen_filter.reserve(transcript.transcript_id)
+            await pipeline.submit({"transcript": transcript})
+
+    logger.info(f"Shard {index} draining ({received} received, {skipped} already processed)")
+    await redriver.stop()
+    await pipeline.drain()
+    await autoscaler.stop()
+    await pipeline.stop()
+    await leases.stop()
+    acker_task.cancel()
+    durable.flush()
+    reporter_task.cancel()
+    app._log_stage_latency(pipeline)
+    await writer.close()
+    await llm_cache.flush()
+    await batcher.close()
+    await client.close()
+    await loop_monitor.stop()
+    app._log_loop_health(loop_monitor)
+    await tracer.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+    if not dlq.empty():
+        count = 0
+        while not dlq.empty():
+            await dlq.get()
+            count += 1
+        logger.warning(f"Shard {index}: {count} transcripts in DLQ")
+
+
+class ShardRouter:
+    """
+    Groups raw records into per-shard batches and hands them to the shard
+    queues. Puts run in a thread so a full shard queue blocks ingest without
+    blocking the event loop; a per-shard lock keeps each shard's batches in
+    stream order. Batches for a shard whose process has died are dropped with
+    a warning instead of blocking shutdown.
+    """
+
+    def __init__(self, queues: List[mp.Queue], processes: List[mp.Process], batch_size: int = SHARD_BATCH_SIZE):
+        self.queues = queues
+        self.processes = processes
+        self.batch_size = batch_size
+        self.routed = [0] * len(queues)
+        self._batches: List[List[bytes]] = [[] for _ in queues]
+        self._locks = [asyncio.Lock() for _ in queues]
+
+    async def route(self, record: RawRecord) -> None:
+        index = shard_for(record.session_id, len(self.queues))
+        self._batches[index].append(record.data)
+        self.routed[index] += 1
+        if len(self._batches[index]) >= self.batch_size:
+            await self._send(index)
+
+    async def flush(self) -> None:
+        await asyncio.gather(*(self._send(i) for i, batch in enumerate(self._batches) if batch))
+
+    async def close(self) -> None:
+        """
+        Flush what is buffered, then send every shard its end-of-stream sentinel.
+        """
+        await self.flush()
+        await asyncio.gather(*(self._put(i, None) for i in range(len(self.queues))))
+
+    async def _send(self, index: int) -> None:
+        batch, self._batches[index] = self._batches[index], []
+        if batch:
+            await self._put(index, batch)
+
+    async def _put(self, index: int, item) -> None:
+        async with self._locks[index]:
+            await asyncio.get_running_loop().run_in_executor(None, self._blocking_put, index, item)
+
+    def _blocking_put(self, index: int, item) -> None:
+        _put_while_alive(self.queues[index], self.processes[index], item)
+
+
+def _put_while_alive(shard_queue: mp.Queue, process: mp.Process, item) -> None:
+    while process.is_alive():
+        try:
+            shard_queue.put(item, timeout=SHARD_MONITOR_INTERVAL)
+            return
+        except queue.Full:
+            continue
+    if item is not None:
+        logger.warning(f"{process.name} is not running, dropping {len(item)} records")
+
+
+async def _flush_periodically(router: ShardRouter) -> None:
+    while True:
+        await asyncio.sleep(SHARD_BATCH_DELAY)
+        await router.flush()
+
+
+async def _watch_shards(processes: List[mp.Process], stop_event: asyncio.Event) -> None:
+    while not stop_event.is_set():
+        await asyncio.sleep(SHARD_MONITOR_INTERVAL)
+        for process in processes:
+            if not process.is_alive():
+                logger.error(f"{process.name} exited unexpectedly with code {process.exitcode}, shutting down")
+                stop_event.set()
+                return
+
+
+async def _prepare_db() -> None:
+    # Create tables once, before any shard warms its dedupe filter from them.
+    await init_db()
+    await engine.dispose()
+
+
+def _get_acks(acks: mp.Queue) -> List[str]:
+    try:
+        return acks.get(timeout=SHARD_MONITOR_INTERVAL)
+    except queue.Empty:
+        return []
+
+
+async def _apply_acks(acks: mp.Queue, stream: ResumableStream, shards_done: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = await loop.run_in_executor(None, _get_acks, acks)
+        for transcript_id in batch:
+            stream.done(transcript_id)
+        if not batch and shards_done.is_set():
+            return
+
+
+async def ingest(queues: List[mp.Queue], acks: mp.Queue, processes: List[mp.Process]) -> None:
+    metrics_runner = await start_metrics_server(app.METRICS_PORT) if app.METRICS_PORT else None
+    for i, shard_queue in enumerate(queues):
+        app.QUEUE_DEPTH.labels(f"shard-{i}").set_function(shard_queue.qsize)
+    client = APIClient(app.API_KEY, app.BASE_URL)
+    await client.authenticate()
+
+    # Shards dedupe against their own processed_results view; ingest only routes,
+    # and checkpoints behind the transcripts shards have acknowledged as durable.
+    stream = ResumableStream(
+        client,
+        load_checkpoint=app._load_stream_checkpoint,
+        save_checkpoint=functools.partial(save_checkpoint, app.STREAM_CHECKPOINT),
+        source=client.stream_raw,
+        acknowledge=True,
+    )
+    router = ShardRouter(queues, processes)
+
+    async def producer() -> None:
+        async with aclosing(stream.transcripts()) as records:
+            async for record in records:
+                await router.route(record)
+                app.TRANSCRIPTS_INGESTED.inc()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    producer_task = asyncio.create_task(producer())
+    flusher_task = asyncio.create_task(_flush_periodically(router))
+    watcher_task = asyncio.create_task(_watch_shards(processes, stop_event))
+    shards_done = asyncio.Event()
+    acks_task = asyncio.create_task(_apply_acks(acks, stream, shards_done))
+
+    await stop_event.wait()
+    logger.info("Shutdown signal received, draining shards...")
+
+    producer_task.cancel()
+    await asyncio.gather(producer_task, return_exceptions=True)
+    flusher_task.cancel()
+    watcher_task.cancel()
+    await asyncio.gather(flusher_task, watcher_task, return_exceptions=True)
+    await router.close()
+    await client.close()
+
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+        if process.exitcode:
+            logger.error(f"{process.name} exited with code {process.exitcode}")
+    # shards flush their acks before exiting, so this ends once the queue is empty
+    shards_done.set()
+    await acks_task
+    await stream.close()
+    logger.info(f"Routed per shard: {router.routed}")
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=SHARD_PROCESSES)
+    parser.add_argument("--event-loop", choices=["auto", "uvloop", "asyncio"], default=EVENT_LOOP)
+    args = parser.parse_args()
+
+    install_event_loop(args.event_loop)
+    asyncio.run(_prepare_db())
+
+    # spawn gives every shard a fresh interpreter: no inherited loop, sockets or DB pool
+    ctx = mp.get_context("spawn")
+    queues = [ctx.Queue(maxsize=SHARD_QUEUE_MAXSIZE) for _ in range(args.processes)]
+    acks = ctx.Queue()
+    processes = [
+        ctx.Process(target=run_shard, args=(i, args.processes, queues[i], acks, args.event_loop), name=f"shard-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        asyncio.run(ingest(queues, acks, processes))
+    except BaseException:
+        # ingest failed before ending the stream; let the shards drain and exit rather than wait forever
+        logger.exception("Ingest failed, stopping shards")
+        for shard_queue, process in zip(queues, processes):
+            _put_while_alive(shard_queue, process, None)
+        for process in processes:
+            process.join()
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Dashboard queries over the analytics rollups.
+
+Answers come from ``analytics_rollups`` alone: all-time figures read a fixed
+number of rows, and time ranges read one row per bucket and value, so no
+query scans ``processed_results``.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from . import db
+from .rollups import INTEREST_LEVEL, PERMIT_STATUS, QUESTIONNAIRE, RESULTS, SENTIMENT
+
+
+def _summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for row in rows:
+        if not row["count"]:
+            # every result that contributed here was reprocessed into another value
+            continue
+        counts[row["dimension"]][row["value"]] += row["count"]
+        totals[row["dimension"]][row["value"]] += row["total"]
+
+    results = counts[RESULTS][""]
+    return {
+        "results": results,
+        "mean_sentiment": totals[RESULTS][""] / results if results else None,
+        "permit_status": dict(counts[PERMIT_STATUS]),
+        "interest_level": dict(counts[INTEREST_LEVEL]),
+        "questionnaire_completion": {
+            key: totals[QUESTIONNAIRE][key] / count for key, count in counts[QUESTIONNAIRE].items() if count
+        },
+        "sentiment_histogram": dict(sorted(counts[SENTIMENT].items())),
+    }
+
+
+async def summary(since: Optional[datetime] = None, until: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Result count, mean sentiment, permit status and interest level mix,
+    questionnaire completion rates and sentiment histogram, over all time or
+    over the buckets in [since, until).
+    """
+    return _summarize(await db.load_rollups(since, until))
+
+
+async def timeseries(
+    dimension: str = INTEREST_LEVEL,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Per-bucket counts of ``dimension`` values, oldest first, e.g.
+    ``[{"bucket": ..., "counts": {"high": 3, "low": 1}}]``.
+    """
+    buckets: Dict[datetime, Dict[str, int]] = defaultdict(dict)
+    for row in await db.load_rollups(since or db.ALL_TIME, until, dimension=dimension):
+        if row["count"]:
+            buckets[row["bucket"]][row["value"]] = row["count"]
+    return [{"bucket": bucket, "counts": counts} for bucket, counts in sorted(buckets.items())]
@@ -0,0 +1,127 @@
+"""
+Hot-path duplicate detection for transcripts that were already processed.
+"""
+import hashlib
+import logging
+import math
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Set
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter over strings using double hashing of one blake2b digest.
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.01):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class SeenFilter:
+    """
+    Answers "was this transcript already processed?" without a DB query per item.
+
+    An LRU of recent answers is checked first, then a bloom filter warmed from
+    ``processed_results``. A bloom miss is authoritative; a bloom hit (a real
+    duplicate or a false positive) is confirmed with indexed lookups on
+    ``processed_results`` and ``transcript_progress`` and the answer is cached.
+
+    Transcripts queued or in flight in this process are ``reserve``d, so a
+    replay of them counts as seen before anything about them is durable.
+    Once a result or a progress record is, ``add`` replaces the reservation.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.01,
+        lru_size: int = 50_000,
+        lookup: Optional[Callable[[str], Awaitable[bool]]] = None,
+    ):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.lru_size = lru_size
+        self.lookup = lookup or db.transcript_recorded
+        self._recent: "OrderedDict[str, bool]" = OrderedDict()
+        self._reserved: Set[str] = set()
+        self.hits = 0
+        self.db_lookups = 0
+
+    async def warm(self, batch_size: int = 10000) -> int:
+        """
+        Load every processed transcript_id into the bloom filter.
+        """
+        count = 0
+        async for ids in db.iter_processed_transcript_ids(batch_size):
+            self.add_many(ids, remember=False)
+            count += len(ids)
+        logger.info(f"Dedupe filter warmed with {count} processed transcripts")
+        return count
+
+    def add(self, transcript_id: str) -> None:
+        """
+        Record a transcript as processed, or as recorded for redrive.
+        """
+        self._reserved.discard(transcript_id)
+        self.bloom.add(transcript_id)
+        self._remember(transcript_id, True)
+
+    def reserve(self, transcript_id: str) -> None:
+        """
+        Record a transcript as queued or in flight; ``add`` or ``release`` ends the reservation.
+        """
+        self._reserved.add(transcript_id)
+
+    def release(self, transcript_id: str) -> None:
+        """
+        Forget a reservation whose transcript was neither processed nor recorded for redrive.
+        """
+        self._reserved.discard(transcript_id)
+
+    def add_many(self, transcript_ids: Iterable[str], remember: bool = True) -> None:
+        for tid in transcript_ids:
+            self.bloom.add(tid)
+            if remember:
+                self._remember(tid, True)
+
+    async def seen(self, transcript_id: str) -> bool:
+        if transcript_id in self._reserved:
+            self.hits += 1
+            return True
+        if transcript_id in self._recent:
+            self._recent.move_to_end(transcript_id)
+            answer = self._recent[transcript_id]
+        elif transcript_id not in self.bloom:
+            return False
+        else:
+            self.db_lookups += 1
+            answer = await self.lookup(transcript_id)
+            self._remember(transcript_id, answer)
+        if answer:
+            self.hits += 1
+        return answer
+
+    def _remember(self, transcript_id: str, answer: bool) -> None:
+        self._recent[transcript_id] = answer
+        self._recent.move_to_end(transcript_id)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
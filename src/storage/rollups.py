@@ -0,0 +1,81 @@
+"""
+Incremental analytics aggregates derived from processed results.
+
+Every processed result contributes (count, total) pairs to a few
+dimensions, both in its time bucket and in the all-time bucket. The write
+path applies the difference between new rows and the rows they replace, so
+reprocessing a transcript never double counts.
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BUCKET_SECONDS = int(os.getenv("ANALYTICS_BUCKET_SECONDS", "3600"))
+# Bucket holding the all-time aggregates.
+ALL_TIME = datetime(1970, 1, 1)
+SENTIMENT_BINS = 10
+
+# Dimensions. "results" has one value ("") whose total is the sentiment sum;
+# "questionnaire" values are questionnaire_completion keys whose total counts completions.
+RESULTS = "results"
+PERMIT_STATUS = "permit_status"
+INTEREST_LEVEL = "interest_level"
+QUESTIONNAIRE = "questionnaire"
+SENTIMENT = "sentiment"
+
+RollupKey = Tuple[datetime, str, str]
+
+
+def bucket_start(ts: datetime, seconds: int = BUCKET_SECONDS) -> datetime:
+    """
+    Start of the naive-UTC bucket containing ``ts``.
+    """
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    offset = int((ts - ALL_TIME).total_seconds()) // seconds * seconds
+    return ALL_TIME + timedelta(seconds=offset)
+
+
+def sentiment_bin(sentiment: float) -> str:
+    index = min(SENTIMENT_BINS - 1, max(0, int(sentiment * SENTIMENT_BINS)))
+    return f"{index / SENTIMENT_BINS:.1f}"
+
+
+def contributions(row: Dict[str, Any]) -> List[Tuple[str, str, float]]:
+    """
+    (dimension, value, total) for one ``processed_results`` row; each counts once.
+    """
+    structured = row.get("structured") or {}
+    analysis = row.get("analysis") or {}
+    sentiment: Optional[float] = analysis.get("sentiment")
+    out = [(RESULTS, "", float(sentiment or 0.0))]
+    permit = (structured.get("visitor_details") or {}).get("permit_status")
+    if permit:
+        out.append((PERMIT_STATUS, permit, 0.0))
+    if analysis.get("interest_level"):
+        out.append((INTEREST_LEVEL, analysis["interest_level"], 0.0))
+    for key, done in (structured.get("questionnaire_completion") or {}).items():
+        out.append((QUESTIONNAIRE, key, 1.0 if done else 0.0))
+    if sentiment is not None:
+        out.append((SENTIMENT, sentiment_bin(sentiment), float(sentiment)))
+    return out
+
+
+def rollup_deltas(
+    new_rows: Iterable[Dict[str, Any]], old_rows: Iterable[Dict[str, Any]] = ()
+) -> Dict[RollupKey, List[float]]:
+    """
+    Net [count, total] change per (bucket, dimension, value) when ``old_rows``
+    are replaced by ``new_rows``. Entries that cancel out are dropped.
+    """
+    deltas: Dict[RollupKey, List[float]] = defaultdict(lambda: [0, 0.0])
+    for sign, rows in ((1, new_rows), (-1, old_rows)):
+        for row in rows:
+            buckets = (bucket_start(row["processed_at"]), ALL_TIME)
+            for dimension, value, total in contributions(row):
+                for bucket in buckets:
+                    delta = deltas[(bucket, dimension, value)]
+                    delta[0] += sign
+                    delta[1] += sign * total
+    return {key: delta for key, delta in deltas.items() if delta[0] or abs(delta[1]) > 1e-9}
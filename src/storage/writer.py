@@ -0,0 +1,215 @@
+"""
+Write-behind batching of raw transcripts, processed results, result versions, session states and progress records.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics.registry import Counter, Histogram
+from . import db
+
+logger = logging.getLogger(__name__)
+
+DB_COMMIT_LATENCY = Histogram("db_commit_latency_seconds", "Latency of batch write transactions, by outcome", ["outcome"])
+DB_ROWS_WRITTEN = Counter("db_rows_written", "Rows committed by the batch writer", ["table"])
+
+_COMMIT_OK = DB_COMMIT_LATENCY.labels("ok")
+_COMMIT_FAILED = DB_COMMIT_LATENCY.labels("failed")
+_RAW_ROWS = DB_ROWS_WRITTEN.labels("raw_transcripts")
+_PROCESSED_ROWS = DB_ROWS_WRITTEN.labels("processed_results")
+_PROGRESS_ROWS = DB_ROWS_WRITTEN.labels("transcript_progress")
+_VERSION_ROWS = DB_ROWS_WRITTEN.labels("processed_result_versions")
+_SESSION_ROWS = DB_ROWS_WRITTEN.labels("session_states")
+
+Pending = List[Tuple[Any, asyncio.Future]]
+# raw, processed, progress, version and session rows of one transaction
+Batch = Tuple[Pending, Pending, Pending, Pending, Pending]
+
+
+def _unavailable(error: BaseException) -> bool:
+    """
+    True if ``error`` means the database could not be reached, rather than that a row was refused.
+    """
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+def _split(batch: Batch) -> Tuple[Batch, Batch]:
+    """
+    Two batches holding the first and second half of ``batch``'s rows, tables in write order.
+    """
+    rows = [(table, entry) for table, pending in enumerate(batch) for entry in pending]
+    halves = []
+    for part in (rows[: len(rows) // 2], rows[len(rows) // 2:]):
+        tables: Batch = ([], [], [], [], [])
+        for table, entry in part:
+            tables[table].append(entry)
+        halves.append(tables)
+    return halves[0], halves[1]
+
+
+class BatchWriter:
+    """
+    Buffers rows and writes them with one multi-row upsert per table per flush.
+
+    Rows are flushed every ``flush_interval`` seconds, or as soon as
+    ``max_batch_size`` rows are buffered. All tables are written in a single
+    transaction. ``save_raw``, ``save_processed``, ``save_version``, ``save_session``
+    and ``save_progress`` return a future that resolves once the row is committed, so callers can await durability when
+    they need it and ignore it otherwise. At most ``max_pending`` rows may be
+    buffered or in flight before the save calls wait.
+
+    A flush the database refuses is retried in halves, down to single rows,
+    so only the futures of the rows it cannot take fail; when the database
+    is unreachable the whole flush fails at once.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        flush_interval: float = 0.05,
+        max_batch_size: int = 500,
+        max_concurrent_flushes: int = 2,
+        max_pending: int = 5000,
+    ):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self._flush_slots = asyncio.Semaphore(max_concurrent_flushes)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._raw: Pending = []
+        self._processed: Pending = []
+        self._progress: Pending = []
+        self._versions: Pending = []
+        self._sessions: Pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def save_raw(self, transcript_data: Any) -> asyncio.Future:
+        """
+        Buffer a raw transcript (a dict, or a LazyTranscript to store its
+        original bytes); the returned future resolves once it is committed.
+        """
+        return await self._enqueue(self._raw, transcript_data)
+
+    async def save_processed(self, result_data: dict) -> asyncio.Future:
+        """
+        Buffer a processed result; the returned future resolves once it is committed.
+        """
+        return await self._enqueue(self._processed, result_data)
+
+    async def save_version(self, result_data: dict) -> asyncio.Future:
+        """
+        Buffer a versioned (replayed) result; the returned future resolves once it is committed.
+        """
+        return await self._enqueue(self._versions, result_data)
+
+    async def save_session(self, state: dict) -> asyncio.Future:
+        """
+        Buffer a session state row; the returned future resolves once it is committed.
+        """
+        return await self._enqueue(self._sessions, state)
+
+    async def save_progress(self, progress: dict) -> asyncio.Future:
+        """
+        Buffer a transcript progress record; the returned future resolves once it is committed.
+        """
+        return await self._enqueue(self._progress, progress)
+
+    async def _enqueue(self, buffer: Pending, row: Any) -> asyncio.Future:
+        await self._pending.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(lambda _: self._pending.release())
+        buffer.append((row, future))
+
+        if self._buffered() >= self.max_batch_size:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self._flush_now)
+        return future
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffered():
+            return
+        raw, self._raw = self._raw, []
+        processed, self._processed = self._processed, []
+        progress, self._progress = self._progress, []
+        versions, self._versions = self._versions, []
+        sessions, self._sessions = self._sessions, []
+        task = asyncio.create_task(self._write(raw, processed, progress, versions, sessions))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def flush(self) -> None:
+        """
+        Write everything buffered and wait for all outstanding transactions.
+        """
+        self._flush_now()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def close(self) -> None:
+        await self.flush()
+
+    def _buffered(self) -> int:
+        return len(self._raw) + len(self._processed) + len(self._progress) + len(self._versions) + len(self._sessions)
+
+    async def _write(
+        self, raw: Pending, processed: Pending, progress: Pending, versions: Pending, sessions: Pending
+    ) -> None:
+        async with self._flush_slots:
+            await self._write_or_split((raw, processed, progress, versions, sessions))
+
+    async def _write_or_split(self, batch: Batch) -> None:
+        raw, processed, progress, versions, sessions = batch
+        rows = sum(len(pending) for pending in batch)
+        try:
+            await self._commit(batch)
+        except Exception as e:
+            if rows > 1 and not _unavailable(e):
+                logger.warning(f"Batch write of {rows} rows failed, retrying it in halves: {e}")
+                for half in _split(batch):
+                    await self._write_or_split(half)
+                return
+            logger.error(
+                f"Batch write of {len(raw)} raw / {len(processed)} processed / {len(progress)} progress / "
+                f"{len(versions)} version / {len(sessions)} session rows failed: {e}"
+            )
+            for _, future in raw + processed + progress + versions + sessions:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _, future in raw + processed + progress + versions + sessions:
+            if not future.done():
+                future.set_result(None)
+
+    async def _commit(self, batch: Batch) -> None:
+        raw, processed, progress, versions, sessions = batch
+        engine = self.engine or db.engine
+        started = time.monotonic()
+        try:
+            async with engine.begin() as conn:
+                await db.insert_raw_transcripts(conn, [row for row, _ in raw])
+                await db.upsert_processed_results(conn, [row for row, _ in processed])
+                await db.upsert_progress(conn, [row for row, _ in progress])
+                await db.upsert_result_versions(conn, [row for row, _ in versions])
+                await db.upsert_session_states(conn, [row for row, _ in sessions])
+        except Exception:
+            _COMMIT_FAILED.observe(time.monotonic() - started)
+            raise
+        _COMMIT_OK.observe(time.monotonic() - started)
+        _RAW_ROWS.inc(len(raw))
+        _PROCESSED_ROWS.inc(len(processed))
+        _PROGRESS_ROWS.inc(len(progress))
+        _VERSION_ROWS.inc(len(versions))
+        _SESSION_ROWS.inc(len(sessions))
@@ -0,0 +1,155 @@
+"""
+Queue abstraction with priorities, a memory budget and watermark back-pressure.
+"""
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class AsyncQueue:
+    """
+    Bounded async queue for back-pressure and graceful shutdown.
+
+    * ``priority(item)`` returns a number; lower values are served first and
+      equal values in FIFO order. With ``priority_aging`` seconds set, each
+      priority step only delays an item by that long relative to newer
+      arrivals, so low-priority items cannot starve.
+    * ``maxsize`` bounds the item count and ``max_bytes`` the summed
+      ``size(item)``; an item is always admitted into an empty queue.
+    * Once the byte total reaches ``high_watermark`` (default ``max_bytes``),
+      ``put`` pauses until consumers drain it to ``low_watermark``, so a
+      producer such as the stream reader stops and resumes in bursts instead
+      of waking for every freed slot.
+
+    ``put``/``get``/``task_done``/``join`` behave like ``asyncio.Queue``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        max_bytes: int = 0,
+        high_watermark: Optional[int] = None,
+        low_watermark: Optional[int] = None,
+        priority: Optional[Callable[[Any], float]] = None,
+        size: Optional[Callable[[Any], int]] = None,
+        priority_aging: Optional[float] = None,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.high_watermark = high_watermark if high_watermark is not None else max_bytes
+        self.low_watermark = low_watermark if low_watermark is not None else int(self.high_watermark * 0.75)
+        if self.high_watermark and self.low_watermark > self.high_watermark:
+            raise ValueError("low_watermark must not exceed high_watermark")
+        self.priority = priority
+        self.size = size
+        self.priority_aging = priority_aging
+        self.bytes = 0
+        self.paused = False
+        self._heap: List[Tuple[float, int, float, int, Any]] = []
+        self._counter = itertools.count()
+        self._changed = asyncio.Condition()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._paused_at = 0.0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._stats: Dict[str, float] = {
+            "puts": 0, "gets": 0, "pauses": 0, "paused_seconds": 0.0, "total_wait": 0.0, "max_wait": 0.0,
+        }
+
+    def _has_room(self, nbytes: int) -> bool:
+        if not self._heap:
+            return True
+        if self.paused:
+            return False
+        if self.maxsize > 0 and len(self._heap) >= self.maxsize:
+            return False
+        if self.max_bytes > 0 and self.bytes + nbytes > self.max_bytes:
+            return False
+        return True
+
+    async def put(self, item: Any) -> None:
+        """
+        Put an item into the queue; waits while it is full or paused.
+        """
+        nbytes = self.size(item) if self.size is not None else 0
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._has_room(nbytes))
+            now = time.monotonic()
+            rank = self.priority(item) if self.priority is not None else 0
+            if self.priority_aging is not None:
+                rank = now + rank * self.priority_aging
+            heapq.heappush(self._heap, (rank, next(self._counter), now, nbytes, item))
+            self.bytes += nbytes
+            self._unfinished += 1
+            self._finished.clear()
+            self._stats["puts"] += 1
+            if self.high_watermark > 0 and not self.paused and self.bytes >= self.high_watermark:
+                self.paused = True
+                self._paused_at = now
+                self._stats["pauses"] += 1
+            self._changed.notify_all()
+
+    async def get(self) -> Any:
+        """
+        Retrieve and remove the highest-priority item, waiting until one is available.
+        """
+        async with self._changed:
+            await self._changed.wait_for(lambda: bool(self._heap))
+            _, _, enqueued, nbytes, item = heapq.heappop(self._heap)
+            now = time.monotonic()
+            self.bytes -= nbytes
+            wait = now - enqueued
+            self._waits.append(wait)
+            self._stats["gets"] += 1
+            self._stats["total_wait"] += wait
+            self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+            if self.paused and self.bytes <= self.low_watermark:
+                self.paused = False
+                self._stats["paused_seconds"] += now - self._paused_at
+            self._changed.notify_all()
+            return item
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def qsize(self) -> int:
+        return len(self._heap)
+
+    def empty(self) -> bool:
+        return not self._heap
+
+    def full(self) -> bool:
+        return bool(self._heap) and not self._has_room(0)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Depth, byte usage, pause counts and wait times (p50/p95 over recent gets).
+        """
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        stats = dict(self._stats)
+        if self.paused:
+            stats["paused_seconds"] += time.monotonic() - self._paused_at
+        stats.update(
+            depth=len(self._heap),
+            bytes=self.bytes,
+            paused=int(self.paused),
+            mean_wait=stats["total_wait"] / stats["gets"] if stats["gets"] else 0.0,
+            p50_wait=pct(0.50),
+            p95_wait=pct(0.95),
+        )
+        return stats
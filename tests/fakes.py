@@ -0,0 +1,267 @@
+"""
+Local stand-ins for external services, for tests and load runs.
+"""
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Union
+
+from aiohttp import web
+
+Latency = Union[float, Callable[[], float]]
+
+
+class FakeLLM:
+    """
+    OpenAI-compatible ``/chat/completions`` endpoint with injectable latency,
+    errors and throttling.
+
+    Requests beyond ``max_concurrency`` in flight, and a random
+    ``throttle_rate`` share of the rest, get a 429 with ``Retry-After``;
+    ``error_rate`` of requests get a 500. ``latency`` is seconds or a
+    callable returning seconds, so tests can shape the distribution.
+    """
+
+    def __init__(
+        self,
+        latency: Latency = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        max_concurrency: Optional[int] = None,
+        retry_after: float = 0.05,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.prompt_chars = 0
+        self.last_prompt: Optional[str] = None
+
+    def respond(self, prompt: str, json_mode: bool) -> str:
+        """
+        Canned completion; override or replace to script responses.
+        """
+        analysis = {"sentiment": 0.7, "preparedness_level": "high", "action_items": ["Confirm permit"]}
+        if json_mode and '"visitor_details"' in prompt:
+            return json.dumps({
+                "summary": f"Summary of a {len(prompt.splitlines())}-line prompt.",
+                "analysis": analysis,
+                "visitor_details": {"hazard_knowledge": "high", "fitness_level": "medium", "ring_bearer": True},
+            })
+        if json_mode:
+            return json.dumps(analysis)
+        return f"Summary of a {len(prompt.splitlines())}-line prompt."
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/chat/completions", self.handle)
+        return app
+
+    def _throttle(self) -> web.Response:
+        self.throttled += 1
+        return web.json_response(
+            {"error": {"message": "rate limited"}},
+            status=429,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            return self._throttle()
+        if self.random.random() < self.throttle_rate:
+            return self._throttle()
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.json_response({"error": {"message": "boom"}}, status=500)
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            delay = self.latency() if callable(self.latency) else self.latency
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        prompt = body["messages"][-1]["content"]
+        self.prompt_chars += len(prompt)
+        self.last_prompt = prompt
+        json_mode = body.get("response_format", {}).get("type") == "json_object"
+        content = self.respond(prompt, json_mode)
+        return web.json_response({
+            "model": body.get("model", "fake"),
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4},
+        })
+
+
+INTEREST_LEVELS = ["high", "medium", "low"]
+POTENTIAL_ISSUES = ["none", "naive", "unprepared", "ring_bearer"]
+
+
+def make_transcript(index: int, turns: int = 10, timestamp: Optional[datetime] = None) -> dict:
+    """
+    Deterministic transcript payload; fields vary with ``index`` so the
+    fast-path analyzer, priorities and sessions see a realistic mix.
+    """
+    start = timestamp or datetime.now(timezone.utc)
+    return {
+        "transcript_id": f"t{index}",
+        "session_id": f"s{index // 3}",
+        "timestamp": start.isoformat(),
+        "agent_type": "customer_service",
+        "duration_seconds": 30 * turns,
+        "participants": {"agent": "Gandalf", "customer": "Frodo"},
+        "transcript_text": [
+            {
+                "speaker": "agent" if t % 2 == 0 else "customer",
+                "text": f"Call {index}, turn {t}: one does not simply walk into Mordor without proper gear.",
+                "timestamp": (start + timedelta(seconds=30 * t)).isoformat(),
+            }
+            for t in range(turns)
+        ],
+        "metadata": {
+            "questionnaire": {
+                "purpose_of_visit_asked": True,
+                "experience_assessed": index % 2 == 0,
+                "risk_acknowledged": index % 5 != 0,
+                "gear_discussed": index % 3 == 0,
+                "any_items_to_dispose_of_asked": index % 7 == 0,
+            },
+            "visitor_interest_level": INTEREST_LEVELS[index % len(INTEREST_LEVELS)],
+            "potential_issue": POTENTIAL_ISSUES[index % len(POTENTIAL_ISSUES)],
+            "mount_doom_permit_status": "pending",
+            "language": "en",
+        },
+    }
+
+
+class FakeTranscriptsAPI:
+    """
+    The transcripts API: ``/auth``, ``/v1/transcripts/stream``,
+    ``/v1/transcripts/process`` (and ``/process/batch``), ``/v1/stats`` and
+    ``/v1/health``.
+
+    The stream emits ``total`` transcripts at ``rate`` per second (0 means as
+    fast as the client reads), then holds the connection open like the real
+    endpoint would while idle. Emission and submission times are recorded per
+    transcript_id, so ``latencies()`` gives end-to-end per-transcript latency;
+    ``done`` is set once every emitted transcript has been submitted.
+    """
+
+    def __init__(
+        self,
+        total: int,
+        turns: int = 10,
+        rate: float = 0.0,
+        token: str = "fake-token",
+        api_key: Optional[str] = None,
+    ):
+        self.total = total
+        self.turns = turns
+        self.rate = rate
+        self.token = token
+        self.api_key = api_key
+        self.emitted: Dict[str, float] = {}
+        self.submitted: Dict[str, float] = {}
+        self.duplicates = 0
+        self.auth_requests = 0
+        self.stream_connections = 0
+        self.done = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/auth", self.auth)
+        app.router.add_get("/v1/transcripts/stream", self.stream)
+        app.router.add_post("/v1/transcripts/process", self.process)
+        app.router.add_post("/v1/transcripts/process/batch", self.process_batch)
+        app.router.add_get("/v1/stats", self.stats)
+        app.router.add_get("/v1/health", self.health)
+        return app
+
+    def _authorized(self, request: web.Request) -> bool:
+        return request.headers.get("Authorization") == f"Bearer {self.token}"
+
+    async def auth(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.auth_requests += 1
+        if self.api_key is not None and body.get("api_key") != self.api_key:
+            return web.json_response({"error": "invalid api key"}, status=403)
+        return web.json_response({"token": self.token})
+
+    async def stream(self, request: web.Request) -> web.StreamResponse:
+        if not self._authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.stream_connections += 1
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        started = time.monotonic()
+        # a reconnect only gets transcripts it has not seen yet
+        for index in range(len(self.emitted), self.total):
+            if self.rate:
+                delay = started + (index - len(self.emitted)) / self.rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            data = make_transcript(index, self.turns)
+            self.emitted[data["transcript_id"]] = time.monotonic()
+            await response.write(json.dumps(data).encode() + b"\n")
+        # idle until the client hangs up, rather than ending and forcing a reconnect
+        while request.transport is not None and not request.transport.is_closing():
+            await asyncio.sleep(0.1)
+        return response
+
+    def _record(self, results: List[dict]) -> None:
+        now = time.monotonic()
+        for result in results:
+            transcript_id = result["transcript_id"]
+            if transcript_id in self.submitted:
+                self.duplicates += 1
+                continue
+            self.submitted[transcript_id] = now
+        if len(self.submitted) >= self.total:
+            self.done.set()
+
+    async def process(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self._record([await request.json()])
+        return web.json_response({"status": "accepted"})
+
+    async def process_batch(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        results = await request.json()
+        self._record(results)
+        return web.json_response({"results": [
+            {"transcript_id": result["transcript_id"], "status": "accepted"} for result in results
+        ]})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return web.json_response({
+            "streamed": len(self.emitted),
+            "processed": len(self.submitted),
+            "duplicates": self.duplicates,
+        })
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    def latencies(self) -> List[float]:
+        """
+        Seconds from emission to submission, for every submitted transcript.
+        """
+        return [self.submitted[tid] - self.emitted[tid] for tid in self.submitted if tid in self.emitted]
@@ -1,5 +1,6 @@
 import pytest
 import asyncio
+from datetime import datetime
 from storage.db import init_db, save_raw_transcript, save_processed_result, RawTranscript, ProcessedResultModel, engine
 from sqlalchemy import select
 
@@ -27,3 +28,243 @@ async def test_db_crud(tmp_path, monkeypatch):
         res2 = await session.execute(select(ProcessedResultModel).where(ProcessedResultModel.transcript_id=="t1"))
         row2 = res2.scalar_one_or_none()
         assert row2.summary == "sum"
+
+@pytest.mark.asyncio
+async def test_batch_writer_upserts(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage.writer import BatchWriter
+    await dbmod.init_db()
+    writer = BatchWriter(flush_interval=0.01)
+    raw = [await writer.save_raw({"transcript_id": "t1", "session_id": "s1"}) for _ in range(2)]
+    first = await writer.save_processed({"transcript_id": "t1", "processing_timestamp": "2025-05-01T00:00:00Z", "summary": "old", "structured_data": {}, "analysis": {}})
+    second = await writer.save_processed({"transcript_id": "t1", "processing_timestamp": "2025-05-02T00:00:00Z", "summary": "new", "structured_data": {}, "analysis": {}})
+    await asyncio.gather(*raw, first, second)
+    # a redelivery in a later flush must not raise either
+    await (await writer.save_raw({"transcript_id": "t1", "session_id": "s1"}))
+    await writer.close()
+    async with dbmod.AsyncSessionLocal() as session:
+        raws = (await session.execute(select(dbmod.RawTranscript))).scalars().all()
+        procs = (await session.execute(select(dbmod.ProcessedResultModel))).scalars().all()
+    assert len(raws) == 1
+    assert [p.summary for p in procs] == ["new"]
+
+@pytest.mark.asyncio
+async def test_batch_writer_fails_only_the_poisoned_row(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage.writer import BatchWriter
+    await dbmod.init_db()
+    writer = BatchWriter(flush_interval=0.01)
+    good = {"processing_timestamp": "2025-05-01T00:00:00Z", "summary": "ok", "structured_data": {}, "analysis": {}}
+    raw = [await writer.save_raw({"transcript_id": f"t{i}", "session_id": "s1"}) for i in range(5)]
+    processed = [await writer.save_processed(dict(good, transcript_id=f"t{i}")) for i in range(5)]
+    # summary is NOT NULL, so this row makes its transaction fail
+    poisoned = await writer.save_processed(dict(good, transcript_id="bad", summary=None))
+    await writer.close()
+    with pytest.raises(Exception):
+        poisoned.result()
+    assert all(future.exception() is None for future in raw + processed)
+    async with dbmod.AsyncSessionLocal() as session:
+        procs = (await session.execute(select(dbmod.ProcessedResultModel))).scalars().all()
+    assert sorted(p.transcript_id for p in procs) == [f"t{i}" for i in range(5)]
+
+@pytest.mark.asyncio
+async def test_seen_filter_only_queries_db_on_bloom_hit():
+    from storage.dedupe import SeenFilter
+    lookups = []
+
+    async def lookup(tid):
+        lookups.append(tid)
+        return tid == "done"
+
+    seen = SeenFilter(capacity=1000, lru_size=1, lookup=lookup)
+    seen.bloom.add("done")
+    assert await seen.seen("new") is False
+    assert lookups == []
+    assert await seen.seen("done") is True
+    assert await seen.seen("done") is True
+    assert lookups == ["done"]
+    seen.add("other")
+    assert await seen.seen("other") is True
+    # queued transcripts count as seen before their result is persisted
+    seen.reserve("queued")
+    assert await seen.seen("queued") is True
+    seen.release("queued")
+    assert await seen.seen("queued") is False
+
+@pytest.mark.asyncio
+async def test_lazy_transcript_bytes_stored_as_is(monkeypatch):
+    import json
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from api.models import LazyTranscript
+    from storage.writer import BatchWriter
+    from fakes import make_transcript
+    await dbmod.init_db()
+    data = make_transcript(1, turns=2)
+    transcript = LazyTranscript.from_bytes(json.dumps(data).encode())
+    writer = BatchWriter(flush_interval=0.01)
+    await (await writer.save_raw(transcript))
+    await writer.close()
+    assert transcript._turns is None
+    assert await dbmod.load_raw_transcript("t1") == data
+
+@pytest.mark.asyncio
+async def test_analytics_rollups_follow_upserts(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage import analytics
+    from storage.writer import BatchWriter
+    await dbmod.init_db()
+
+    def result(tid, ts, sentiment, permit, interest, gear):
+        return {
+            "transcript_id": tid, "processing_timestamp": ts, "summary": "s",
+            "structured_data": {"visitor_details": {"permit_status": permit}, "questionnaire_completion": {"gear_assessment": gear}},
+            "analysis": {"sentiment": sentiment, "interest_level": interest},
+        }
+
+    writer = BatchWriter(flush_interval=0.01)
+    await asyncio.gather(
+        await writer.save_processed(result("t1", "2025-05-01T10:15:00", 0.9, "approved", "high", True)),
+        await writer.save_processed(result("t2", "2025-05-01T11:30:00", 0.2, "pending", "low", False)),
+    )
+    # reprocessing t2 replaces its contribution instead of adding a second one
+    await (await writer.save_processed(result("t2", "2025-05-01T11:45:00", 0.4, "approved", "medium", True)))
+    await writer.close()
+
+    stats = await analytics.summary()
+    assert stats["results"] == 2
+    assert stats["mean_sentiment"] == pytest.approx(0.65)
+    assert stats["permit_status"] == {"approved": 2}
+    assert stats["questionnaire_completion"] == {"gear_assessment": 1.0}
+    assert stats["sentiment_histogram"] == {"0.4": 1, "0.9": 1}
+    series = await analytics.timeseries("interest_level")
+    assert [point["counts"] for point in series] == [{"high": 1}, {"medium": 1}]
+    assert (await analytics.summary(since=datetime(2025, 5, 1, 11)))["results"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_rewrites_keep_rollups_exact(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path / 'rollups.db'}")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage import analytics
+    from storage.writer import BatchWriter
+    await dbmod.init_db()
+
+    def result(tid, sentiment):
+        return {
+            "transcript_id": tid, "processing_timestamp": "2025-05-01T10:00:00", "summary": "s",
+            "structured_data": {"visitor_details": {"permit_status": "approved"}},
+            "analysis": {"sentiment": sentiment, "interest_level": "high"},
+        }
+
+    # two writers with overlapping flushes rewrite the same transcripts, as the
+    # live pipeline and a `replay --promote` run do
+    writers = [BatchWriter(flush_interval=0.001, max_batch_size=1, max_concurrent_flushes=2) for _ in range(2)]
+    saved = []
+    for round_ in range(20):
+        for i, writer in enumerate(writers):
+            for tid in ("t1", "t2"):
+                saved.append(await writer.save_processed(result(tid, (round_ + i) / 40)))
+    await asyncio.gather(*saved)
+    for writer in writers:
+        await writer.close()
+
+    stats = await analytics.summary()
+    async with dbmod.engine.connect() as conn:
+        rows = (await conn.execute(dbmod.select(dbmod.ProcessedResultModel.analysis))).scalars().all()
+    assert stats["results"] == 2
+    assert stats["permit_status"] == {"approved": 2}
+    assert stats["mean_sentiment"] == pytest.approx(sum(row["sentiment"] for row in rows) / 2)
+    await dbmod.engine.dispose()
+
+@pytest.mark.asyncio
+async def test_session_states_keep_the_longest_transcript(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage.writer import BatchWriter
+    from processing.sessions import SessionStore
+    await dbmod.init_db()
+    writer = BatchWriter(flush_interval=0.01)
+    state = {"session_id": "s1", "transcript_id": "t2", "turn_count": 8, "fingerprint": "f" * 64, "summary": "long", "analysis": {"sentiment": 0.5}}
+    await (await writer.save_session(state))
+    # an older transcript of the session arriving late does not replace it
+    await (await writer.save_session({**state, "transcript_id": "t1", "turn_count": 4, "summary": "short"}))
+    await writer.close()
+
+    store = SessionStore(persistent=True)
+    loaded = await store.get("s1")
+    assert (loaded.transcript_id, loaded.turn_count, loaded.summary) == ("t2", 8, "long")
+    assert loaded.analysis == {"sentiment": 0.5}
+    assert await store.get("s1") is loaded
+    assert store.stats["db_hits"] == 1 and store.stats["memory_hits"] == 1
+    assert await store.get("s2") is None
+
+@pytest.mark.asyncio
+async def test_llm_cache_writes_behind_the_call(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from processing.cache import LLMCache, cache_key
+    await dbmod.init_db()
+    release = asyncio.Event()
+    writes = []
+    put_entries = dbmod.put_llm_cache_entries
+
+    async def slow_put(rows):
+        writes.append(len(rows))
+        await release.wait()
+        await put_entries(rows)
+
+    monkeypatch.setattr(dbmod, "put_llm_cache_entries", slow_put)
+    cache = LLMCache()
+
+    async def call(value):
+        return value, None
+
+    # misses return while the database write is still pending
+    for i in range(3):
+        assert await asyncio.wait_for(cache.get_or_call(f"prompt {i}", "m", "v1", lambda i=i: call(f"r{i}")), 1) == f"r{i}"
+    release.set()
+    await cache.flush()
+    # entries stored during the first write go out together in the second
+    assert writes == [1, 2]
+    fresh = LLMCache()
+    assert await fresh.get(cache_key("prompt 2", "m", "v1")) == "r2"
+
+@pytest.mark.asyncio
+async def test_seen_filter_counts_transcripts_left_for_redrive(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    from storage.dedupe import SeenFilter
+    await dbmod.init_db()
+    async with dbmod.AsyncSessionLocal() as session:
+        session.add(dbmod.TranscriptProgress(transcript_id="retrying", session_id="s1"))
+        await session.commit()
+
+    seen = SeenFilter(capacity=1000, lru_size=1)
+    seen.reserve("retrying")
+    # its progress record is durable: the reservation gives way to the filter
+    seen.add("retrying")
+    assert not seen._reserved
+    seen.add("other")
+    assert await seen.seen("retrying") is True
+    assert seen.db_lookups == 1
+    seen.bloom.add("unknown")
+    assert await seen.seen("unknown") is False
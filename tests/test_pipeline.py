@@ -0,0 +1,476 @@
+import pytest
+import asyncio
+import time
+from datetime import datetime, timedelta
+from pipeline.executor import Pipeline, Stage
+
+
+def test_rejects_cycles_and_unknown_dependencies():
+    async def noop(ctx):
+        return None
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", noop, depends_on=["b"]), Stage("b", noop, depends_on=["a"])])
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", noop, depends_on=["missing"])])
+
+@pytest.mark.asyncio
+async def test_independent_stages_run_concurrently():
+    async def slow(ctx):
+        await asyncio.sleep(0.1)
+        return ctx["n"]
+
+    async def join(ctx):
+        return ctx["left"] + ctx["right"]
+
+    done = []
+
+    async def on_complete(ctx):
+        done.append(ctx["join"])
+
+    pipeline = Pipeline(
+        [Stage("left", slow, concurrency=4), Stage("right", slow, concurrency=4), Stage("join", join, depends_on=["left", "right"])],
+        on_complete=on_complete,
+    )
+    pipeline.start()
+    started = time.monotonic()
+    for n in range(4):
+        await pipeline.submit({"n": n})
+    await pipeline.drain()
+    elapsed = time.monotonic() - started
+    await pipeline.stop()
+    assert sorted(done) == [0, 2, 4, 6]
+    assert elapsed < 0.3
+    assert pipeline.report()["left"]["processed"] == 4
+
+@pytest.mark.asyncio
+async def test_failed_item_is_reported_once_and_skips_downstream():
+    ran = []
+
+    async def ok(ctx):
+        await asyncio.sleep(0.01)
+
+    async def boom(ctx):
+        raise RuntimeError("boom")
+
+    async def sink(ctx):
+        ran.append(ctx)
+
+    errors = []
+
+    async def on_error(ctx, stage, exc):
+        errors.append(stage)
+
+    pipeline = Pipeline(
+        [Stage("a", ok), Stage("b", boom), Stage("sink", sink, depends_on=["a", "b"])],
+        on_error=on_error,
+    )
+    pipeline.start()
+    await pipeline.submit({})
+    await asyncio.wait_for(pipeline.drain(), 1)
+    await pipeline.stop()
+    assert errors == ["b"] and ran == []
+    assert pipeline.report()["b"]["failed"] == 1
+
+@pytest.mark.asyncio
+async def test_worker_survives_failing_callbacks():
+    async def work(ctx):
+        if ctx["n"] % 2:
+            raise RuntimeError("stage")
+        return ctx["n"]
+
+    calls = []
+
+    async def on_complete(ctx):
+        calls.append(("complete", ctx["n"]))
+        raise RuntimeError("db down")
+
+    async def on_error(ctx, stage, exc):
+        calls.append(("error", ctx["n"]))
+        raise RuntimeError("db down")
+
+    # one worker, so a callback that killed it would strand the rest
+    pipeline = Pipeline([Stage("work", work, concurrency=1)], on_complete=on_complete, on_error=on_error)
+    pipeline.start()
+    for n in range(4):
+        await pipeline.submit({"n": n})
+    await asyncio.wait_for(pipeline.drain(), 1)
+    assert pipeline.concurrency("work") == 1
+    await pipeline.stop()
+    assert calls == [("complete", 0), ("error", 1), ("complete", 2), ("error", 3)]
+
+def test_redrive_policy_backs_off_then_poisons():
+    from pipeline.redrive import RedrivePolicy
+    policy = RedrivePolicy(base_delay=10, max_delay=25, max_attempts=3)
+    first, second = policy.next_attempt(1), policy.next_attempt(2)
+    assert first is not None and second is not None
+    assert first - datetime.utcnow() <= timedelta(seconds=10)
+    assert second - datetime.utcnow() > timedelta(seconds=9)
+    assert policy.next_attempt(3) is None
+
+@pytest.mark.asyncio
+async def test_failed_submission_is_redriven_without_new_llm_calls(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    await dbmod.init_db()
+    import app
+    from api.models import Transcript, TranscriptTurn, Metadata, MetadataQuestionnaire, Analysis
+    from processing.extractor import extract_structured_data
+    from storage.dedupe import SeenFilter
+    from storage.writer import BatchWriter
+    from workqueue.queue import AsyncQueue
+
+    llm_calls = []
+
+    async def process_transcript(transcript, combined=True):
+        llm_calls.append(transcript.transcript_id)
+        analysis = Analysis(sentiment=0.5, interest_level="high", preparedness_level="high", action_items=[])
+        return "summary", extract_structured_data(transcript), analysis
+
+    class FlakyBatcher:
+        attempts = 0
+
+        async def submit(self, result):
+            self.attempts += 1
+            future = asyncio.get_running_loop().create_future()
+            if self.attempts == 1:
+                future.set_exception(RuntimeError("submission endpoint down"))
+            else:
+                future.set_result({"status": "ok"})
+            return future
+
+    async def never_seen(tid):
+        return False
+
+    monkeypatch.setattr(app, "PROCESSING_MODE", "combined")
+    monkeypatch.setattr(app, "process_transcript", process_transcript)
+    monkeypatch.setattr(app.redrive_policy, "base_delay", 0)
+
+    questionnaire = MetadataQuestionnaire(purpose_of_visit_asked=True, experience_assessed=True, risk_acknowledged=True, gear_discussed=True, any_items_to_dispose_of_asked=True)
+    metadata = Metadata(questionnaire=questionnaire, visitor_interest_level="high", potential_issue="none", mount_doom_permit_status="approved", language="en")
+    transcript = Transcript(
+        transcript_id="t1", session_id="s1", timestamp=datetime.utcnow(), agent_type="cs", duration_seconds=5,
+        participants={"agent": "A"}, transcript_text=[TranscriptTurn(speaker="agent", text="Hi", timestamp=datetime.utcnow())],
+        metadata=metadata,
+    )
+
+    writer = BatchWriter(flush_interval=0.01)
+    batcher = FlakyBatcher()
+    pipeline = app.build_pipeline(writer, batcher, SeenFilter(capacity=100, lookup=never_seen), AsyncQueue())
+    pipeline.start()
+    await pipeline.submit({"transcript": transcript})
+    await asyncio.wait_for(pipeline.drain(), 2)
+
+    redriver = app.build_redriver(pipeline)
+    assert await redriver.run_once() == 1
+    await asyncio.wait_for(pipeline.drain(), 2)
+    await pipeline.stop()
+    await writer.close()
+
+    assert llm_calls == ["t1"]
+    assert batcher.attempts == 2
+    async with dbmod.engine.connect() as conn:
+        row = (await conn.execute(dbmod.select(dbmod.TranscriptProgress))).one()
+    assert row.status == dbmod.PROGRESS_DONE
+    assert row.submitted and row.persisted and row.attempts == 1
+    assert row.last_stage == "submit"
+
+@pytest.mark.asyncio
+async def test_slow_submission_is_not_redriven_while_leased(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    await dbmod.init_db()
+    import app
+    from api.models import Transcript, TranscriptTurn, Metadata, MetadataQuestionnaire, Analysis
+    from processing.extractor import extract_structured_data
+    from storage.dedupe import SeenFilter
+    from storage.writer import BatchWriter
+    from workqueue.queue import AsyncQueue
+
+    async def process_transcript(transcript, combined=True):
+        analysis = Analysis(sentiment=0.5, interest_level="high", preparedness_level="high", action_items=[])
+        return "summary", extract_structured_data(transcript), analysis
+
+    class SlowBatcher:
+        def __init__(self):
+            self.accepted = asyncio.Event()
+            self.future = None
+
+        async def submit(self, result):
+            self.future = asyncio.get_running_loop().create_future()
+            self.accepted.set()
+            return self.future
+
+    async def never_seen(tid):
+        return False
+
+    monkeypatch.setattr(app, "PROCESSING_MODE", "combined")
+    monkeypatch.setattr(app, "process_transcript", process_transcript)
+    monkeypatch.setattr(app, "PROGRESS_LEASE", 0.3)
+
+    questionnaire = MetadataQuestionnaire(purpose_of_visit_asked=True, experience_assessed=True, risk_acknowledged=True, gear_discussed=True, any_items_to_dispose_of_asked=True)
+    metadata = Metadata(questionnaire=questionnaire, visitor_interest_level="high", potential_issue="none", mount_doom_permit_status="approved", language="en")
+    transcript = Transcript(
+        transcript_id="t1", session_id="s1", timestamp=datetime.utcnow(), agent_type="cs", duration_seconds=5,
+        participants={"agent": "A"}, transcript_text=[TranscriptTurn(speaker="agent", text="Hi", timestamp=datetime.utcnow())],
+        metadata=metadata,
+    )
+
+    writer = BatchWriter(flush_interval=0.01)
+    batcher = SlowBatcher()
+    leases = app.build_leases()
+    leases.start()
+    pipeline = app.build_pipeline(writer, batcher, SeenFilter(capacity=100, lookup=never_seen), AsyncQueue(), leases)
+    pipeline.start()
+    await pipeline.submit({"transcript": transcript})
+    await asyncio.wait_for(batcher.accepted.wait(), 2)
+
+    # the submission outlives several leases without the record falling due
+    await asyncio.sleep(1.0)
+    assert await dbmod.claim_due_progress(10, 0.3) == []
+
+    batcher.future.set_result({"status": "ok"})
+    await asyncio.wait_for(pipeline.drain(), 2)
+    await pipeline.stop()
+    await leases.stop()
+    await writer.close()
+    async with dbmod.engine.connect() as conn:
+        row = (await conn.execute(dbmod.select(dbmod.TranscriptProgress))).one()
+    assert row.status == dbmod.PROGRESS_DONE
+
+def test_metrics_render_in_prometheus_text_format():
+    from metrics.registry import Counter, Gauge, Histogram, Registry
+    registry = Registry()
+    requests = Counter("requests", "Requests", ["route"], registry=registry)
+    depth = Gauge("depth", "Depth", registry=registry)
+    latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+    requests.labels("a").inc()
+    requests.labels("a").inc(2)
+    depth.set_function(lambda: 7)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+    text = registry.render()
+    assert 'requests_total{route="a"} 3' in text
+    assert "depth 7" in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="1"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    with pytest.raises(ValueError):
+        Counter("requests", "Duplicate", registry=registry)
+
+    # text format 0.0.4: every sample belongs to the family its TYPE line declares
+    types = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+        elif not line.startswith("#"):
+            sample = line.split("{")[0].split(" ")[0]
+            family = next(
+                (name for name in types if sample == name or (types[name] == "histogram" and sample in (f"{name}_bucket", f"{name}_sum", f"{name}_count"))),
+                None,
+            )
+            assert family is not None, f"sample {sample} has no matching TYPE line"
+    assert types == {"requests_total": "counter", "depth": "gauge", "latency_seconds": "histogram"}
+    # a metric type must say how to create children and render them
+    from metrics.registry import _Metric
+    with pytest.raises(TypeError):
+        _Metric("bare", "Bare", registry=registry)
+
+@pytest.mark.asyncio
+async def test_replay_writes_versioned_results_without_submitting(monkeypatch):
+    import argparse
+    monkeypatch.setenv("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+    from importlib import reload
+    import storage.db as dbmod
+    reload(dbmod)
+    await dbmod.init_db()
+    import app
+    import replay
+    from api.models import Analysis
+    from processing.extractor import extract_structured_data
+    from fakes import make_transcript
+
+    async def process_transcript(transcript, combined=True):
+        analysis = Analysis(sentiment=0.5, interest_level="high", preparedness_level="high", action_items=[])
+        return f"summary of {transcript.transcript_id}", extract_structured_data(transcript), analysis
+
+    monkeypatch.setattr(app, "process_transcript", process_transcript)
+    # replay switches session reuse off; restore it afterwards
+    monkeypatch.setattr(replay.session_store, "enabled", True)
+    async with dbmod.engine.begin() as conn:
+        await dbmod.insert_raw_transcripts(conn, [
+            dict(make_transcript(i, turns=1), agent_type="sales" if i == 2 else "customer_service") for i in range(5)
+        ])
+
+    args = argparse.Namespace(
+        since=None, until=None, session=None, agent_type="customer_service", rate=0.0, version="v2",
+        mode="combined", submit=False, promote=False, page_size=2, progress_interval=60,
+    )
+    progress = await replay.replay(args)
+    assert (progress.total, progress.done, progress.failed) == (4, 4, 0)
+    async with dbmod.engine.connect() as conn:
+        rows = (await conn.execute(dbmod.select(dbmod.ProcessedResultVersion))).all()
+        live = (await conn.execute(dbmod.select(dbmod.ProcessedResultModel))).all()
+    assert sorted(row.transcript_id for row in rows) == ["t0", "t1", "t3", "t4"]
+    assert {row.version for row in rows} == {"v2"}
+    assert live == []
+
+
+def test_replay_version_follows_every_prompt_and_threshold(monkeypatch):
+    import replay
+    from processing import analyzer, summarizer
+    combined = replay.default_version("combined")
+    assert combined != replay.default_version("separate")
+    monkeypatch.setattr(summarizer, "REDUCE_PROMPT_VERSION", "summary-reduce-v2")
+    reduced = replay.default_version("combined")
+    assert reduced != combined
+    monkeypatch.setattr(analyzer, "ANALYSIS_CONFIDENCE_THRESHOLD", 0.9)
+    assert replay.default_version("combined") not in (combined, reduced)
+
+@pytest.mark.asyncio
+async def test_sampled_items_are_traced_per_stage(tmp_path, monkeypatch):
+    import json
+    from metrics.tracing import JsonLinesExporter, tracer
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracer, "exporter", JsonLinesExporter(str(path)))
+    monkeypatch.setattr(tracer, "sample_rate", 1.0)
+
+    async def fetch(ctx):
+        with tracer.span("api.request", url="/v1/x"):
+            await asyncio.sleep(0.01)
+
+    async def boom(ctx):
+        if ctx["n"]:
+            raise RuntimeError("boom")
+
+    async def on_error(ctx, stage, exc):
+        pass
+
+    pipeline = Pipeline(
+        [Stage("fetch", fetch), Stage("check", boom, depends_on=["fetch"])],
+        on_error=on_error,
+        trace_attributes=lambda ctx: {"item": ctx["n"]},
+    )
+    pipeline.start()
+    for n in range(2):
+        await pipeline.submit({"n": n})
+    await pipeline.drain()
+    await pipeline.stop()
+    await tracer.close()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    roots = {span["attributes"]["item"]: span for span in spans if span["name"] == "pipeline"}
+    assert set(roots) == {0, 1} and all(not root["parentSpanId"] for root in roots.values())
+    assert roots[0]["status"]["code"] == "OK" and roots[1]["status"]["code"] == "ERROR"
+    children = [span for span in spans if span["parentSpanId"] == roots[1]["spanId"]]
+    assert sorted(span["name"] for span in children) == ["check", "fetch"]
+    fetch_span = next(span for span in children if span["name"] == "fetch")
+    request = next(span for span in spans if span["parentSpanId"] == fetch_span["spanId"])
+    assert request["name"] == "api.request" and request["traceId"] == roots[1]["traceId"]
+    assert request["endTimeUnixNano"] - request["startTimeUnixNano"] >= 10_000_000
+
+@pytest.mark.asyncio
+async def test_loop_monitor_reports_blocking_calls():
+    from metrics.loop import LoopMonitor
+    monitor = LoopMonitor(interval=0.02, stall_threshold=0.15)
+    monitor.start()
+    await asyncio.sleep(0.05)
+
+    def parse_synchronously():
+        time.sleep(0.4)
+
+    parse_synchronously()
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    assert monitor.summary()["max_lag"] >= 0.3
+    assert monitor.summary()["stalls"] == 1
+    assert "parse_synchronously" in monitor.recent_stalls()[0]["stack"]
+
+@pytest.mark.asyncio
+async def test_resize_shrinks_without_dropping_items():
+    done = []
+
+    async def work(ctx):
+        await asyncio.sleep(0.05)
+        return ctx["n"]
+
+    async def on_complete(ctx):
+        done.append(ctx["work"])
+
+    pipeline = Pipeline([Stage("work", work, concurrency=8)], on_complete=on_complete)
+    pipeline.start()
+    for n in range(20):
+        await pipeline.submit({"n": n})
+    await asyncio.sleep(0.01)
+    pipeline.resize("work", 2)
+    assert pipeline.concurrency("work") == 2
+    await asyncio.wait_for(pipeline.drain(), 2)
+    assert sorted(done) == list(range(20))
+    pipeline.resize("work", 5)
+    assert pipeline.concurrency("work") == 5
+    await pipeline.stop()
+
+@pytest.mark.asyncio
+async def test_autoscaler_follows_backlog_within_bounds():
+    from pipeline.autoscaler import Autoscaler, ScalingPolicy
+
+    async def work(ctx):
+        await asyncio.sleep(0.02)
+
+    pipeline = Pipeline([Stage("work", work, concurrency=1), Stage("slow", work, depends_on=["work"])])
+    pipeline.start()
+    autoscaler = Autoscaler(pipeline, {
+        "work": ScalingPolicy(min_workers=1, max_workers=8, up_cooldown=0, down_cooldown=0, max_shrink=0.5),
+        # the dependency behind this stage already takes longer than it may
+        "slow": ScalingPolicy(max_workers=8, latency_ceiling=0.01, up_cooldown=0),
+    }, interval=60)
+    autoscaler._snapshot()
+    for n in range(40):
+        await pipeline.submit({"n": n})
+    await asyncio.sleep(0.1)
+    assert autoscaler.tick() == {"work": 8, "slow": 1}
+    await asyncio.wait_for(pipeline.drain(), 5)
+
+    # idle again: shrink by at most half per decision
+    await asyncio.sleep(0.05)
+    assert autoscaler.tick()["work"] == 4
+    assert [(d["stage"], d["from"], d["to"]) for d in autoscaler.decisions] == [("work", 1, 8), ("work", 8, 4)]
+    await pipeline.stop()
+
+def test_autoscaler_shares_dependency_capacity_across_stages():
+    from pipeline.autoscaler import Autoscaler, ScalingPolicy
+
+    async def work(ctx):
+        pass
+
+    limit = {"value": 12.0}
+    llm = ScalingPolicy(min_workers=2, max_workers=64, capacity=lambda: limit["value"])
+    pipeline = Pipeline([Stage("summarize", work), Stage("analyze", work), Stage("persist", work)])
+    autoscaler = Autoscaler(pipeline, {"summarize": llm, "analyze": llm, "persist": ScalingPolicy(max_workers=64)})
+    # slot waits inflate time per item; together the LLM stages stay within the limit
+    wanted = {"summarize": 30, "analyze": 10, "persist": 40}
+    assert autoscaler.share_capacity(wanted) == {"summarize": 9, "analyze": 3, "persist": 40}
+    limit["value"] = 3.0
+    assert autoscaler.share_capacity(wanted) == {"summarize": 2, "analyze": 2, "persist": 40}
+    assert autoscaler.share_capacity({"summarize": 4, "analyze": 2, "persist": 1}) == {"summarize": 2, "analyze": 2, "persist": 1}
+
+def test_shard_stops_waiting_once_ingest_is_gone(monkeypatch):
+    import queue
+    import sharded
+
+    class Gone:
+        def is_alive(self):
+            return False
+
+    inbox = queue.Queue()
+    inbox.put(["record"])
+    monkeypatch.setattr(sharded, "SHARD_MONITOR_INTERVAL", 0.01)
+    monkeypatch.setattr(sharded.mp, "parent_process", Gone)
+    assert sharded._next_batch(inbox) == ["record"]
+    # no end-of-stream sentinel will come
+    assert sharded._next_batch(inbox) is None
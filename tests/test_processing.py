@@ -1,19 +1,43 @@
 import pytest
+import pytest_asyncio
+import asyncio
+import itertools
+import time
 from datetime import datetime
+from aiohttp.test_utils import TestServer
 from api.models import Transcript, TranscriptTurn, Metadata, MetadataQuestionnaire
 from processing.summarizer import summarize_transcript
 from processing.extractor import extract_structured_data
 from processing.analyzer import analyze_transcript
+from processing.cache import llm_cache
+from processing.llm import LLMClient
+from processing.scheduler import LLMScheduler, TokenBucket, llm_scheduler
+from processing.router import Backend, LLMRouter
+from processing.sessions import SessionStore, session_store
+from fakes import FakeLLM
 
 @pytest.fixture
 def sample_transcript():
     turns = [TranscriptTurn(speaker="agent", text="Hello", timestamp=datetime.utcnow())]
-    md_q = MetadataQuestionnaire(True, True, True, True, True)
+    md_q = MetadataQuestionnaire(purpose_of_visit_asked=True, experience_assessed=True, risk_acknowledged=True, gear_discussed=True, any_items_to_dispose_of_asked=True)
     md = Metadata(questionnaire=md_q, visitor_interest_level="high", potential_issue="naive", mount_doom_permit_status="pending", language="en")
     return Transcript(transcript_id="t1", session_id="s1", timestamp=datetime.utcnow(), agent_type="cs", duration_seconds=5, participants={"agent":"A","customer":"C"}, transcript_text=turns, metadata=md)
 
+@pytest_asyncio.fixture
+async def fake_llm(monkeypatch):
+    fake = FakeLLM()
+    server = TestServer(fake.app())
+    await server.start_server()
+    client = LLMClient(base_url=str(server.make_url("")))
+    monkeypatch.setattr(llm_scheduler, "client", client)
+    monkeypatch.setattr(llm_cache, "persistent", False)
+    monkeypatch.setattr(session_store, "persistent", False)
+    yield fake, client
+    await client.close()
+    await server.close()
+
 @pytest.mark.asyncio
-async def test_summarizer_stub(sample_transcript):
+async def test_summarizer_stub(sample_transcript, fake_llm):
     summary = await summarize_transcript(sample_transcript)
     assert isinstance(summary, str)
     assert summary
@@ -23,8 +47,255 @@ def test_extractor(sample_transcript):
     assert structured.visitor_details.permit_status == "pending"
 
 @pytest.mark.asyncio
-async def test_analyzer_stub(sample_transcript):
+async def test_analyzer_stub(sample_transcript, fake_llm):
     analysis = await analyze_transcript(sample_transcript)
     assert 0.0 <= analysis.sentiment <= 1.0
     assert isinstance(analysis.action_items, list)
 
+
+@pytest.mark.asyncio
+async def test_llm_cache_tiers_and_counters():
+    from processing.cache import LLMCache
+    cache = LLMCache(max_entries=1, persistent=False)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return "summary", None
+
+    # concurrent requests for the same input share one call
+    results = await asyncio.gather(*(cache.get_or_call("a  b", "m", "v1", call) for _ in range(3)))
+    assert results == ["summary"] * 3 and len(calls) == 1
+    # whitespace-normalized input hits the cache; another prompt version does not
+    await cache.get_or_call("a b", "m", "v1", call)
+    await cache.get_or_call("a b", "m", "v2", call)
+    assert len(calls) == 2
+    assert cache.stats["memory_hits"] == 1
+    assert cache.stats["evictions"] == 1
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)
+    started = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire(1)
+    assert time.monotonic() - started >= 0.18
+
+@pytest.mark.asyncio
+async def test_scheduler_backs_off_on_throttling(fake_llm):
+    fake, client = fake_llm
+    fake.max_concurrency = 2
+    scheduler = LLMScheduler(client, initial_concurrency=8, decrease_cooldown=0, base_backoff=0.01)
+    fake.latency = 0.02
+    responses = await asyncio.gather(*(scheduler.call(f"prompt {i}") for i in range(12)))
+    assert len(responses) == 12
+    assert fake.throttled > 0
+    assert scheduler.stats["throttled"] == fake.throttled
+    assert scheduler.limit < 8
+
+@pytest.mark.asyncio
+async def test_combined_processing_uses_one_call(sample_transcript, fake_llm):
+    from processing.combined import process_transcript
+    fake, _ = fake_llm
+    llm_cache._entries.clear()
+    summary, structured, analysis = await process_transcript(sample_transcript)
+    assert fake.requests == 1
+    assert summary
+    assert structured.visitor_details.ring_bearer is True
+    assert structured.visitor_details.permit_status == "pending"
+    assert analysis.interest_level == "high"
+
+@pytest.mark.asyncio
+async def test_combined_processing_falls_back_on_invalid_output(sample_transcript, fake_llm, monkeypatch):
+    from processing.combined import process_transcript
+    fake, _ = fake_llm
+    llm_cache._entries.clear()
+    original = fake.respond
+    monkeypatch.setattr(fake, "respond", lambda prompt, json_mode: '{"summary": ""}' if '"visitor_details"' in prompt else original(prompt, json_mode))
+    summary, structured, analysis = await process_transcript(sample_transcript)
+    assert fake.requests == 3
+    assert summary and analysis.preparedness_level == "high"
+
+def test_local_scoring_confidence_tracks_evidence(sample_transcript):
+    from processing.scoring import score_transcript
+    happy = sample_transcript.copy(update={"transcript_text": [
+        TranscriptTurn(speaker="customer", text="Thanks, this is great! I'm ready and excited, the plan is clear.", timestamp=datetime.utcnow()),
+    ]})
+    unhappy = sample_transcript.copy(update={"transcript_text": [
+        TranscriptTurn(speaker="customer", text="This is terrible, I'm worried and not happy with the permit problem.", timestamp=datetime.utcnow()),
+    ]})
+    neutral, positive, negative = (score_transcript(t) for t in (sample_transcript, happy, unhappy))
+    assert neutral.analysis.sentiment == 0.5 and neutral.confidence == 0.0
+    assert positive.analysis.sentiment > 0.8 and positive.confidence > 0.6
+    assert negative.analysis.sentiment < 0.3
+    # every questionnaire flag set, permit pending
+    assert positive.analysis.preparedness_level == "high"
+    assert "Follow up on the pending permit" in positive.analysis.action_items
+
+@pytest.mark.asyncio
+async def test_confident_transcripts_skip_llm_analysis(sample_transcript, fake_llm, monkeypatch):
+    import processing.analyzer as analyzer
+    fake, _ = fake_llm
+    llm_cache._entries.clear()
+    happy = sample_transcript.copy(update={"transcript_text": [
+        TranscriptTurn(speaker="customer", text="Thanks, this is great! I'm ready and excited, the plan is clear.", timestamp=datetime.utcnow()),
+    ]})
+    await analyze_transcript(happy)
+    assert fake.requests == 0
+    monkeypatch.setattr(analyzer, "ANALYSIS_CONFIDENCE_THRESHOLD", 1.01)
+    await analyze_transcript(happy)
+    assert fake.requests == 1
+
+def test_chunk_turns_respects_budget():
+    from processing.prompts import chunk_turns, count_tokens
+    turns = [TranscriptTurn(speaker="agent", text=f"turn {i} " + "word " * 20, timestamp=datetime.utcnow()) for i in range(10)]
+    turns.append(TranscriptTurn(speaker="customer", text="long " * 200, timestamp=datetime.utcnow()))
+    chunks = chunk_turns(turns, budget=60)
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    assert chunks[0].startswith("agent: turn 0 word word")
+    assert "".join(chunks).count("long") == 200
+
+def test_whole_and_chunked_prompts_render_turns_alike():
+    from processing.prompts import chunk_turns, render_turns
+    turns = [TranscriptTurn(speaker="customer", text="my  gear\n is\tready ", timestamp=datetime.utcnow())] * 3
+    assert render_turns(turns) == "\n".join(chunk_turns(turns)) == "\n".join(["customer: my gear is ready"] * 3)
+
+@pytest.mark.asyncio
+async def test_long_transcripts_are_summarized_in_parallel_chunks(sample_transcript, fake_llm, monkeypatch):
+    import processing.summarizer as summarizer
+    fake, _ = fake_llm
+    fake.latency = 0.05
+    llm_cache._entries.clear()
+    monkeypatch.setattr(summarizer, "PROMPT_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(summarizer, "CHUNK_TOKEN_BUDGET", 60)
+    long_call = sample_transcript.copy(update={"transcript_text": [
+        TranscriptTurn(speaker="customer", text=f"turn {i} " + "gear " * 20, timestamp=datetime.utcnow()) for i in range(12)
+    ]})
+    summary = await summarize_transcript(long_call)
+    assert summary
+    # one call per chunk, run concurrently, plus the reduce call
+    assert fake.requests > 2 and fake.peak_in_flight > 1
+    # the analysis prompt reuses the cached chunk summaries
+    requests = fake.requests
+    await summarizer.condense_conversation(long_call)
+    assert fake.requests == requests
+
+@pytest_asyncio.fixture
+async def fake_backends():
+    fakes = [FakeLLM(seed=1), FakeLLM(seed=2)]
+    servers = [TestServer(fake.app()) for fake in fakes]
+    for server in servers:
+        await server.start_server()
+    clients = [LLMClient(base_url=str(server.make_url(""))) for server in servers]
+    yield fakes, clients
+    for client in clients:
+        await client.close()
+    for server in servers:
+        await server.close()
+
+@pytest.mark.asyncio
+async def test_router_hedges_slow_requests(fake_backends):
+    (primary, secondary), clients = fake_backends
+    # every 25th request stalls on the primary backend
+    calls = itertools.count(1)
+    primary.latency = lambda: 2.0 if next(calls) % 25 == 0 else 0.01
+    router = LLMRouter([Backend("a", clients[0]), Backend("b", clients[1])], hedge_budget=0.1, min_samples=20, min_hedge_delay=0.05)
+    started = time.monotonic()
+    for i in range(60):
+        await router.call(f"prompt {i}")
+    assert time.monotonic() - started < 2
+    assert router.stats["hedge_wins"] == 2
+    assert router.stats["hedges"] <= 0.1 * router.stats["requests"] + 1
+    assert secondary.requests == router.stats["hedges"]
+    # losing requests are cancelled rather than left running
+    await asyncio.sleep(0.05)
+    assert primary.in_flight == 0
+    # and still count towards the hedge delay, with the time they had run
+    latencies = router.backends[0].latencies
+    assert len(latencies) == 60 and sum(latency >= 0.05 for latency in latencies) >= 2
+
+@pytest.mark.asyncio
+async def test_router_hedges_spend_scheduler_budgets(fake_backends):
+    (primary, secondary), clients = fake_backends
+    router = LLMRouter([Backend("a", clients[0]), Backend("b", clients[1])], hedge_budget=1.0, min_samples=1, min_hedge_delay=0.01)
+    scheduler = LLMScheduler(router, requests_per_minute=60)
+    for i in range(20):
+        await scheduler.call(f"warm up {i}")
+    primary.latency = 0.1
+    # the request budget is spent, so the straggler is not duplicated
+    scheduler.requests.tokens = 1
+    await scheduler.call("slow")
+    assert router.stats["hedges"] == 0 and secondary.requests == 0
+    scheduler.requests.tokens = 2
+    await scheduler.call("slow")
+    assert router.stats["hedges"] == 1 and scheduler.requests.tokens < 1
+
+@pytest.mark.asyncio
+async def test_router_counts_failed_requests_in_hedge_delay(fake_backends):
+    (primary, secondary), clients = fake_backends
+    primary.latency = 0.05
+    primary.error_rate = 1.0
+    router = LLMRouter([Backend("a", clients[0]), Backend("b", clients[1])], max_failures=10)
+    await router.call("prompt")
+    assert len(router.backends[0].latencies) == 1
+
+@pytest.mark.asyncio
+async def test_router_fails_over_and_marks_backend_down(fake_backends):
+    (primary, secondary), clients = fake_backends
+    primary.error_rate = 1.0
+    router = LLMRouter([Backend("a", clients[0]), Backend("b", clients[1])], max_failures=2, cooldown=60)
+    responses = [await router.call(f"prompt {i}") for i in range(5)]
+    assert all(response.text for response in responses)
+    assert primary.requests == 2 and secondary.requests == 5
+    assert router.stats["failovers"] == 2
+    assert [response.backend for response in responses] == ["b"] * 5
+    # lookups now go by the backend requests are sent to first
+    assert router.model == clients[1].model
+
+@pytest.mark.asyncio
+async def test_failed_over_responses_are_cached_under_the_serving_model(fake_backends):
+    from processing.cache import LLMCache, cache_key
+    (primary, secondary), clients = fake_backends
+    primary.error_rate = 1.0
+    router = LLMRouter([Backend("a", clients[0], model="model-a"), Backend("b", clients[1], model="model-b")], max_failures=5)
+    cache = LLMCache(persistent=False)
+
+    async def call():
+        response = await router.call("prompt")
+        return response.text, response.backend_model
+
+    text = await cache.get_or_call("prompt", router.model, "v1", call)
+    assert cache._get_memory(cache_key("prompt", "model-b", "v1")) == text
+    assert cache._get_memory(cache_key("prompt", "model-a", "v1")) is None
+
+@pytest.mark.asyncio
+async def test_session_continuations_only_send_new_turns(sample_transcript, fake_llm, monkeypatch):
+    import processing.summarizer as summarizer
+    fake, _ = fake_llm
+    store = SessionStore(persistent=False)
+    monkeypatch.setattr(summarizer, "session_store", store)
+    turns = [TranscriptTurn(speaker="customer", text=f"turn {i} about my gear", timestamp=datetime.utcnow()) for i in range(30)]
+    first = sample_transcript.copy(update={"transcript_id": "t1", "transcript_text": turns[:20]})
+    second = sample_transcript.copy(update={"transcript_id": "t2", "transcript_text": turns})
+    analysis = {"sentiment": 0.8, "preparedness_level": "high", "action_items": ["Check permit"]}
+    summary = await summarize_transcript(first)
+    assert store.record(first, summary, analysis) is not None
+    full_chars = fake.prompt_chars
+
+    await summarize_transcript(second)
+    prompt = fake.last_prompt
+    assert summary in prompt and "Check permit" in prompt
+    assert "turn 5 about" not in prompt and "turn 25 about" in prompt
+    assert fake.prompt_chars - full_chars < full_chars
+    assert store.stats["incremental"] == 1 and store.stats["turns_reused"] == 20
+    # the analysis prompt of the same transcript reuses the lookup rather than counting it again
+    await asyncio.gather(store.previous(second), store.previous(second))
+    assert store.stats["incremental"] == 1 and store.stats["full"] == 1
+
+    # a transcript that does not repeat the recorded turns is summarized from scratch
+    await summarize_transcript(sample_transcript.copy(update={"transcript_id": "t3", "transcript_text": turns[1:25]}))
+    assert "turn 5 about" in fake.last_prompt
+    # an older, shorter transcript does not replace the longer session state
+    assert store.record(second, "summary", analysis) is not None
+    assert store.record(first, "older summary") is None
@@ -0,0 +1,54 @@
+import pytest
+import asyncio
+from workqueue.queue import AsyncQueue
+
+
+@pytest.mark.asyncio
+async def test_priority_order_with_fifo_ties():
+    q = AsyncQueue(priority=lambda item: item[0])
+    for item in [(2, "a"), (0, "b"), (1, "c"), (0, "d")]:
+        await q.put(item)
+    assert [(await q.get())[1] for _ in range(4)] == ["b", "d", "c", "a"]
+
+@pytest.mark.asyncio
+async def test_aging_bounds_how_long_low_priority_waits():
+    q = AsyncQueue(priority=lambda item: item[0], priority_aging=0.01)
+    await q.put((5, "old-low"))
+    await asyncio.sleep(0.1)
+    await q.put((0, "new-high"))
+    assert (await q.get())[1] == "old-low"
+
+@pytest.mark.asyncio
+async def test_watermarks_pause_and_resume_producer():
+    q = AsyncQueue(max_bytes=100, low_watermark=30, size=len)
+    await q.put(b"x" * 60)
+    await q.put(b"x" * 40)  # reaches the high watermark
+    assert q.paused
+
+    blocked = asyncio.create_task(q.put(b"x" * 10))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    await q.get()  # 40 bytes left: still above the low watermark
+    await asyncio.sleep(0.01)
+    assert not blocked.done() and q.paused
+
+    await q.get()
+    await asyncio.wait_for(blocked, 1)
+    assert not q.paused
+    stats = q.stats()
+    assert stats["pauses"] == 1 and stats["depth"] == 1 and stats["bytes"] == 10
+
+@pytest.mark.asyncio
+async def test_oversized_item_is_admitted_into_empty_queue_and_join_waits():
+    q = AsyncQueue(maxsize=1, max_bytes=10, size=len)
+    await asyncio.wait_for(q.put(b"x" * 50), 1)
+    assert q.full()
+    joined = asyncio.create_task(q.join())
+    await q.get()
+    await asyncio.sleep(0)
+    assert not joined.done()
+    q.task_done()
+    await asyncio.wait_for(joined, 1)
+    with pytest.raises(ValueError):
+        q.task_done()